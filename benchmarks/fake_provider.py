@@ -0,0 +1,96 @@
+"""Local stand-in for the Google AI Studio image endpoints.
+
+Serves ``:predict``, ``:generateContent``, ``:generateImages`` and the
+``/models`` listing used by key validation, with configurable latency, error
+rate and image size, so the proxy's real HTTP and parsing path can be load
+tested without a key or quota.
+
+    python benchmarks/fake_provider.py --port 9100 --latency 0.2 --image-kb 256
+"""
+
+import argparse
+import asyncio
+import base64
+import os
+import random
+from typing import Any, Dict
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+def create_app(
+    latency: float = 0.2,
+    jitter: float = 0.0,
+    error_rate: float = 0.0,
+    image_bytes: int = 256 * 1024,
+    seed: int = 0,
+) -> FastAPI:
+    app = FastAPI(title="Fake AI Studio")
+    rng = random.Random(seed)
+    # Random bytes do not compress, like real PNG/JPEG output; one blob is
+    # shared by every response so the server itself stays cheap.
+    image_b64 = base64.b64encode(os.urandom(image_bytes)).decode("ascii")
+    stats = {"requests": 0, "errors": 0, "images": 0}
+    app.state.stats = stats
+
+    def images_for(count: int) -> int:
+        return max(1, min(int(count or 1), 8))
+
+    def body_for(action: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if action == "predict":
+            count = images_for((payload.get("parameters") or {}).get("sampleCount", 1))
+            stats["images"] += count
+            return {
+                "predictions": [{"bytesBase64Encoded": image_b64, "mimeType": "image/png"} for _ in range(count)]
+            }
+        if action == "generateContent":
+            count = images_for((payload.get("generationConfig") or {}).get("candidateCount", 1))
+            stats["images"] += count
+            return {
+                "candidates": [
+                    {"content": {"parts": [{"inlineData": {"mimeType": "image/png", "data": image_b64}}]}}
+                    for _ in range(count)
+                ]
+            }
+        count = images_for((payload.get("generationConfig") or {}).get("numberOfImages", 1))
+        stats["images"] += count
+        return {"generatedImages": [{"bytesBase64Encoded": image_b64} for _ in range(count)]}
+
+    @app.get("/{version}/models")
+    async def list_models(version: str) -> Dict[str, Any]:
+        return {"models": [{"name": "models/imagen-4.0-fast-generate-001"}, {"name": "models/gemini-2.5-flash-image"}]}
+
+    @app.post("/{version}/models/{target}")
+    async def generate(version: str, target: str, request: Request) -> Response:
+        stats["requests"] += 1
+        _, _, action = target.partition(":")
+        await asyncio.sleep(max(0.0, latency + rng.uniform(-jitter, jitter)))
+        if rng.random() < error_rate:
+            stats["errors"] += 1
+            return JSONResponse({"error": {"code": 503, "message": "fake overload"}}, status_code=503)
+        if action not in {"predict", "generateContent", "generateImages"}:
+            return JSONResponse({"error": {"code": 404, "message": f"unknown action {action!r}"}}, status_code=404)
+        return JSONResponse(body_for(action, await request.json()))
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+/- seconds of uniform latency noise")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with 503")
+    parser.add_argument("--image-kb", type=int, default=256, help="raw size of each returned image")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    app = create_app(args.latency, args.jitter, args.error_rate, args.image_kb * 1024)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning", access_log=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""Drive /api/generate against the fake provider and report latency, throughput and cost.
+
+Each scenario starts a fresh fake provider and proxy process, sends an
+open-loop request stream at the target QPS (arrivals do not wait for earlier
+responses, so queueing shows up as latency), then reports throughput,
+p50/p95/p99 latency, the proxy's peak RSS and its CPU time per image.
+
+    python benchmarks/load.py                          # all scenarios
+    python benchmarks/load.py -s predict-single --duration 5
+    python benchmarks/load.py --save benchmarks/baseline.json
+    python benchmarks/load.py --baseline benchmarks/baseline.json --threshold 0.15
+
+With ``--baseline`` the exit status is 1 when any scenario's throughput
+drops, or its p95 latency or CPU per image grows, by more than the threshold.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "src" / "backend"
+FAKE_PROVIDER = Path(__file__).resolve().parent / "fake_provider.py"
+
+
+@dataclass
+class Scenario:
+    name: str
+    model: str
+    qps: float
+    duration: float = 10.0
+    prompts: int = 1
+    count: int = 1
+    latency: float = 0.2
+    jitter: float = 0.05
+    error_rate: float = 0.0
+    image_kb: int = 256
+    return_type: str = "base64"
+
+
+# The model name picks the endpoint style exactly as build_endpoint does.
+SCENARIOS = {
+    scenario.name: scenario
+    for scenario in (
+        Scenario("predict-single", "imagen-4.0-fast-generate-001", qps=20, image_kb=128),
+        Scenario("content-batch", "gemini-2.5-flash-image", qps=5, prompts=4, count=2, image_kb=512),
+        Scenario("images-large", "imagegen-bench", qps=2, prompts=2, count=4, image_kb=2048),
+        Scenario("predict-flaky", "imagen-4.0-fast-generate-001", qps=10, prompts=2, error_rate=0.1, image_kb=128),
+    )
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile; 0.0 for an empty sample."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(pct / 100.0 * len(ordered))))
+    return ordered[rank - 1]
+
+
+def proc_cpu_seconds(pid: int) -> Optional[float]:
+    try:
+        fields = Path(f"/proc/{pid}/stat").read_text().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    # utime and stime are fields 14 and 15 of /proc/<pid>/stat.
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def proc_peak_rss_mb(pid: int) -> Optional[float]:
+    try:
+        for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    return None
+
+
+def spawn(args: List[str], env: Dict[str, str], cwd: Path) -> subprocess.Popen:
+    return subprocess.Popen(args, env={**os.environ, **env}, cwd=str(cwd), stdout=subprocess.DEVNULL)
+
+
+async def wait_ready(client: httpx.AsyncClient, url: str, timeout: float = 20.0) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            if (await client.get(url)).status_code < 500:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"{url} did not come up within {timeout:.0f}s")
+        await asyncio.sleep(0.1)
+
+
+async def drive(client: httpx.AsyncClient, url: str, scenario: Scenario) -> List[Tuple[float, int, int]]:
+    """Fire requests on an open-loop schedule; return (latency, status, images) per request."""
+    samples: List[Tuple[float, int, int]] = []
+    total = max(1, int(scenario.qps * scenario.duration))
+    start = time.perf_counter()
+
+    async def one(seq: int) -> None:
+        body = {
+            "prompts": [f"bench {scenario.name} {seq}-{i}" for i in range(scenario.prompts)],
+            "count": scenario.count,
+            "return_type": scenario.return_type,
+        }
+        sent = time.perf_counter()
+        try:
+            response = await client.post(url, json=body, headers={"X-Model": scenario.model})
+            # Counting entries in the raw body keeps the driver from spending
+            # its own event loop decoding multi-megabyte JSON.
+            images = response.content.count(b'"mime":')
+            samples.append((time.perf_counter() - sent, response.status_code, images))
+        except httpx.HTTPError:
+            samples.append((time.perf_counter() - sent, 0, 0))
+
+    tasks = []
+    for seq in range(total):
+        delay = start + seq / scenario.qps - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.ensure_future(one(seq)))
+    await asyncio.gather(*tasks)
+    return samples
+
+
+async def run_scenario(scenario: Scenario) -> Dict[str, Any]:
+    provider_port, proxy_port = free_port(), free_port()
+    provider = spawn(
+        [
+            sys.executable,
+            str(FAKE_PROVIDER),
+            f"--port={provider_port}",
+            f"--latency={scenario.latency}",
+            f"--jitter={scenario.jitter}",
+            f"--error-rate={scenario.error_rate}",
+            f"--image-kb={scenario.image_kb}",
+        ],
+        {},
+        ROOT,
+    )
+    workdir = tempfile.TemporaryDirectory(prefix="nano-bench-")
+    proxy = spawn(
+        [sys.executable, "-m", "uvicorn", "app:app", f"--port={proxy_port}", "--log-level=warning", "--no-access-log"],
+        {
+            "GOOGLE_AI_STUDIO_API_KEY": "bench-key",
+            "GOOGLE_AI_STUDIO_BASE_URL": f"http://127.0.0.1:{provider_port}/v1beta",
+            "USE_MOCK": "false",
+            "USE_PLACEHOLDER_ON_ERROR": "false",
+            "RATE_LIMIT_PER_MIN": "1000000",
+            "RATE_LIMIT_BACKEND": "memory",
+            "RESULT_CACHE_ENABLED": "false",
+            "JOB_DB_PATH": os.path.join(workdir.name, "jobs.sqlite3"),
+            "LOG_LEVEL": "WARNING",
+        },
+        BACKEND_PATH,
+    )
+    try:
+        limits = httpx.Limits(max_connections=1000, max_keepalive_connections=100)
+        async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+            await wait_ready(client, f"http://127.0.0.1:{provider_port}/v1beta/models")
+            await wait_ready(client, f"http://127.0.0.1:{proxy_port}/api/health")
+            cpu_before = proc_cpu_seconds(proxy.pid)
+            wall_start = time.perf_counter()
+            samples = await drive(client, f"http://127.0.0.1:{proxy_port}/api/generate", scenario)
+            wall = time.perf_counter() - wall_start
+            cpu_after = proc_cpu_seconds(proxy.pid)
+            peak_rss = proc_peak_rss_mb(proxy.pid)
+    finally:
+        for process in (proxy, provider):
+            process.terminate()
+        for process in (proxy, provider):
+            process.wait(timeout=10)
+        workdir.cleanup()
+
+    latencies = [latency for latency, status, _ in samples if status == 200]
+    images = sum(count for _, status, count in samples if status == 200)
+    cpu = None if cpu_before is None or cpu_after is None else cpu_after - cpu_before
+    return {
+        "scenario": scenario.name,
+        "requests": len(samples),
+        "ok": len(latencies),
+        "errors": len(samples) - len(latencies),
+        "images": images,
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "images_per_s": round(images / wall, 2),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "peak_rss_mb": None if peak_rss is None else round(peak_rss, 1),
+        "cpu_ms_per_image": None if cpu is None or not images else round(cpu * 1000 / images, 2),
+    }
+
+
+def find_regressions(results: List[Dict[str, Any]], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    problems = []
+    for result in results:
+        base = baseline.get(result["scenario"])
+        if not base:
+            continue
+        checks = (
+            ("throughput_rps", -1),
+            ("p95_ms", 1),
+            ("cpu_ms_per_image", 1),
+        )
+        for metric, direction in checks:
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old * direction
+            if change > threshold:
+                problems.append(f"{result['scenario']}: {metric} {old} -> {new} ({change:+.0%} worse)")
+    return problems
+
+
+def print_table(results: List[Dict[str, Any]]) -> None:
+    columns = [
+        "scenario",
+        "ok",
+        "errors",
+        "throughput_rps",
+        "images_per_s",
+        "p50_ms",
+        "p95_ms",
+        "p99_ms",
+        "peak_rss_mb",
+        "cpu_ms_per_image",
+    ]
+    widths = {column: max(len(column), *(len(str(result[column])) for result in results)) for column in columns}
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    for result in results:
+        print("  ".join(str(result[column]).ljust(widths[column]) for column in columns))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="repeatable; default all")
+    parser.add_argument("--duration", type=float, help="override every scenario's duration in seconds")
+    parser.add_argument("--qps", type=float, help="override every scenario's target QPS")
+    parser.add_argument("--save", help="write results to this JSON file (usable as a later --baseline)")
+    parser.add_argument("--baseline", help="JSON file from an earlier --save run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed regression fraction (default 0.10)")
+    args = parser.parse_args()
+
+    results = []
+    for name in args.scenario or list(SCENARIOS):
+        scenario = SCENARIOS[name]
+        overrides = {"duration": args.duration, "qps": args.qps}
+        scenario = Scenario(**{**asdict(scenario), **{k: v for k, v in overrides.items() if v is not None}})
+        print(f"running {scenario.name} ({scenario.qps:g} qps for {scenario.duration:g}s)...", file=sys.stderr)
+        results.append(asyncio.run(run_scenario(scenario)))
+
+    print_table(results)
+    if args.save:
+        Path(args.save).write_text(json.dumps({result["scenario"]: result for result in results}, indent=2) + "\n")
+    if args.baseline:
+        problems = find_regressions(results, json.loads(Path(args.baseline).read_text()), args.threshold)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
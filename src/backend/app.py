@@ -1,47 +1,78 @@
+import asyncio
+import hashlib
 import logging
+import math
 import os
 import time
-from collections import defaultdict, deque
-from typing import Any, Dict, List, Optional
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel, Field
 
 try:
+    from .blobstore import load_blob_store, parse_range
+    from .budget import BudgetExhausted, estimate_response_bytes, load_byte_budget
+    from .cache import load_key_status_cache, load_result_cache, load_single_flight
+    from .encoding import FastJSONResponse, dumps, encode_generate_response
+    from .jobs import Job, Recorder, load_job_queue
+    from .metrics import http_request_seconds, http_response_bytes, memory_budget_decisions, placeholder_fallbacks
+    from .metrics import rate_limit_rejections
+    from .metrics import render_metrics
     from .nano_banana import (
-        encode_base64,
-        generate_images,
+        breakers,
+        build_provider_request,
+        close_async_clients,
+        close_blocking_clients,
+        generate_images_async,
+        generation_cache_key,
+        governor,
+        is_placeholder_result,
         load_config,
-        make_placeholder_svg,
-        validate_key,
+        normalize_return_type,
+        placeholder_images,
+        pool_stats,
+        validate_key_async,
+        warm_up,
     )
+    from .postprocess import ProcessOptions, load_image_processor, make_options
+    from .prefetch import load_prefetcher
+    from .ratelimit import load_rate_limiter, load_rate_limits
+    from .scheduler import BULK, INTERACTIVE, QueueFull, load_scheduler, normalize_priority
+    from .templates import expand_matrix, load_template_registry, matrix_size
 except ImportError:
+    from blobstore import load_blob_store, parse_range
+    from budget import BudgetExhausted, estimate_response_bytes, load_byte_budget
+    from cache import load_key_status_cache, load_result_cache, load_single_flight
+    from encoding import FastJSONResponse, dumps, encode_generate_response
+    from jobs import Job, Recorder, load_job_queue
+    from metrics import http_request_seconds, http_response_bytes, memory_budget_decisions, placeholder_fallbacks
+    from metrics import rate_limit_rejections
+    from metrics import render_metrics
     from nano_banana import (
-        encode_base64,
-        generate_images,
+        breakers,
+        build_provider_request,
+        close_async_clients,
+        close_blocking_clients,
+        generate_images_async,
+        generation_cache_key,
+        governor,
+        is_placeholder_result,
         load_config,
-        make_placeholder_svg,
-        validate_key,
+        normalize_return_type,
+        placeholder_images,
+        pool_stats,
+        validate_key_async,
+        warm_up,
     )
-
-
-class RateLimiter:
-    def __init__(self, max_per_minute: int) -> None:
-        self.max_per_minute = max_per_minute
-        self.hits: Dict[str, deque] = defaultdict(deque)
-
-    def allow(self, key: str) -> bool:
-        now = time.time()
-        window = 60
-        queue = self.hits[key]
-        while queue and now - queue[0] > window:
-            queue.popleft()
-        if len(queue) >= self.max_per_minute:
-            return False
-        queue.append(now)
-        return True
+    from postprocess import ProcessOptions, load_image_processor, make_options
+    from prefetch import load_prefetcher
+    from ratelimit import load_rate_limiter, load_rate_limits
+    from scheduler import BULK, INTERACTIVE, QueueFull, load_scheduler, normalize_priority
+    from templates import expand_matrix, load_template_registry, matrix_size
 
 
 class KeyStatusRequest(BaseModel):
@@ -49,7 +80,14 @@ class KeyStatusRequest(BaseModel):
     base_url: Optional[str] = Field(default=None, description="Override base URL")
 
 
-class GenerateRequest(BaseModel):
+class ProcessingFields(BaseModel):
+    resize: bool = Field(default=False, description="Crop and scale images to exactly `size`")
+    format: Optional[str] = Field(default=None, description="Transcode to jpeg, webp, avif or png")
+    quality: Optional[int] = Field(default=None, description="Encoder quality 1-100 (default 80)")
+    thumbnail: Optional[int] = Field(default=None, description="Also return a thumbnail with this longest side")
+
+
+class GenerateRequest(ProcessingFields):
     prompt: Optional[str] = None
     prompts: Optional[List[str]] = None
     negative_prompt: Optional[str] = None
@@ -58,6 +96,16 @@ class GenerateRequest(BaseModel):
     language: Optional[str] = None
     count: int = 1
     return_type: Optional[str] = None
+    stream: bool = False
+    priority: Optional[str] = Field(default=None, description="interactive or bulk; X-Priority also works")
+
+
+class TemplateGenerateRequest(ProcessingFields):
+    variables: Dict[str, str] = Field(default_factory=dict, description="Values shared by every expansion")
+    matrix: Dict[str, List[str]] = Field(default_factory=dict, description="Values to take the cartesian product of")
+    count: int = 1
+    return_type: Optional[str] = None
+    priority: Optional[str] = Field(default=None, description="interactive or bulk; X-Priority also works")
 
 
 logging.basicConfig(
@@ -67,10 +115,50 @@ logging.basicConfig(
 logger = logging.getLogger("nano-proxy")
 
 config = load_config()
-rate_limit = int(os.getenv("RATE_LIMIT_PER_MIN", "90"))
-limiter = RateLimiter(rate_limit)
+rate_limit, key_rate_limit = load_rate_limits()
+limiter = load_rate_limiter()
+prompt_concurrency = max(1, int(os.getenv("GENERATE_PROMPT_CONCURRENCY", "32")))
+scheduler = load_scheduler()
+interactive_max_images = int(os.getenv("SCHEDULER_INTERACTIVE_MAX_IMAGES", "8"))
+prefetcher = load_prefetcher()
+prefetch_idle_headroom = float(os.getenv("PREFETCH_IDLE_HEADROOM", "0.5"))
+generate_max_prompts = max(1, int(os.getenv("GENERATE_MAX_PROMPTS", "32")))
+memory_budget = load_byte_budget()
+request_memory_limit = int(float(os.getenv("MEMORY_BUDGET_PER_REQUEST_MB", "128")) * 1024 * 1024)
+memory_budget_wait = float(os.getenv("MEMORY_BUDGET_WAIT", "5"))
+image_estimate_bytes = int(os.getenv("RESPONSE_IMAGE_ESTIMATE_KB", "1536")) * 1024
+result_cache = load_result_cache()
+single_flight = load_single_flight()
+blob_store = load_blob_store()
+key_status_cache = load_key_status_cache()
+job_queue = load_job_queue()
+template_registry = load_template_registry()
+image_processor = load_image_processor()
+template_max_expansions = max(1, int(os.getenv("TEMPLATE_MAX_EXPANSIONS", "64")))
+warm_startup = os.getenv("WARM_STARTUP", "false").lower() in {"1", "true", "yes"}
+
 
-app = FastAPI(title="Nano Banana Proxy", version="0.1.0")
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    if warm_startup:
+        # uvicorn only starts accepting once lifespan startup returns.
+        started = time.perf_counter()
+        await warm_up(config)
+        await asyncio.to_thread(image_processor.warm)
+        logger.info("Warm startup finished in %.0fms", (time.perf_counter() - started) * 1000)
+    await job_queue.start(_process_job)
+    if prefetcher is not None:
+        prefetcher.start(_prefetch, lambda: scheduler.idle(prefetch_idle_headroom))
+    yield
+    if prefetcher is not None:
+        await prefetcher.stop()
+    await job_queue.stop()
+    await close_async_clients()
+    close_blocking_clients()
+    image_processor.shutdown()
+
+
+app = FastAPI(title="Nano Banana Proxy", version="0.1.0", lifespan=lifespan, default_response_class=FastJSONResponse)
 
 allowed_origins = [origin.strip() for origin in os.getenv("ALLOW_ORIGINS", "*").split(",") if origin.strip()]
 app.add_middleware(
@@ -79,20 +167,74 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Cache", "X-Cache-Hits", "X-Cache-Misses", "X-Downgraded", "Retry-After"],
 )
 
 
+def _key_digest(api_key: str) -> str:
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:32]
+
+
+def _rate_limit_keys(request: Request) -> List[Tuple[str, int]]:
+    client_ip = request.client.host if request.client else "unknown"
+    keys = [(f"ip:{client_ip}", rate_limit)]
+    api_key = request.headers.get("X-API-Key")
+    if api_key:
+        keys.append((f"key:{_key_digest(api_key)}", key_rate_limit))
+    # A limit of 0 is off.
+    return [(key, per_minute) for key, per_minute in keys if per_minute > 0]
+
+
+def _client_id(request: Request) -> str:
+    """Who a request is scheduled as: its API key when it brings one, else its address."""
+    api_key = request.headers.get("X-API-Key")
+    if api_key:
+        return f"key:{_key_digest(api_key)}"
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+def _priority(requested: Optional[str], header: Optional[str], images: int) -> str:
+    """Large requests are bulk so they cannot crowd out single images; callers may only opt down to bulk."""
+    if images > interactive_max_images:
+        return BULK
+    return normalize_priority(requested) or normalize_priority(header) or INTERACTIVE
+
+
+def _admit(client_id: str, priority: str, calls: int) -> None:
+    try:
+        scheduler.admit(client_id, priority, calls)
+    except QueueFull as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=str(exc),
+            headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+        ) from exc
+
+
 @app.middleware("http")
 async def rate_limit_middleware(request: Request, call_next):
-    start = time.time()
-    if request.url.path.startswith("/api/"):
-        client_ip = request.client.host if request.client else "unknown"
-        if not limiter.allow(client_ip):
-            return JSONResponse(status_code=429, content={"detail": "Rate limit exceeded"})
+    start = time.perf_counter()
+    # Blob fetches are immutable static bytes; they do not count against the limit.
+    if request.url.path.startswith("/api/") and not request.url.path.startswith("/api/images/"):
+        for key, per_minute in _rate_limit_keys(request):
+            decision = await limiter.acheck(key, per_minute)
+            if not decision.allowed:
+                rate_limit_rejections.inc(scope=key.split(":", 1)[0])
+                return JSONResponse(
+                    status_code=429,
+                    content={"detail": "Rate limit exceeded"},
+                    headers={"Retry-After": str(max(1, math.ceil(decision.retry_after)))},
+                )
     response = await call_next(request)
-    duration = (time.time() - start) * 1000
+    duration = time.perf_counter() - start
     if request.url.path.startswith("/api/"):
-        logger.info("%s %s %s %.1fms", request.method, request.url.path, response.status_code, duration)
+        # The matched route template keeps label cardinality bounded (/api/jobs/{job_id}).
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        http_request_seconds.observe(duration, route=route, method=request.method, status=str(response.status_code))
+        content_length = response.headers.get("content-length")
+        if content_length is not None:
+            http_response_bytes.observe(int(content_length), route=route)
+        logger.info("%s %s %s %.1fms", request.method, request.url.path, response.status_code, duration * 1000)
     return response
 
 
@@ -102,9 +244,26 @@ async def health() -> Dict[str, Any]:
         "status": "ok",
         "provider": "nano-banana",
         "mock": config.use_mock,
+        "pools": pool_stats(),
+        "cache": result_cache.stats() if result_cache else None,
+        "single_flight": single_flight.stats() if single_flight else None,
+        "key_status_cache": key_status_cache.stats(),
+        "jobs": job_queue.stats(),
+        "governor": governor.stats(),
+        "scheduler": scheduler.stats(),
+        "prefetch": prefetcher.stats() if prefetcher else None,
+        "memory_budget": memory_budget.stats(),
+        "breakers": breakers.stats(),
+        "templates": template_registry.stats(),
+        "postprocess": image_processor.stats(),
     }
 
 
+@app.get("/api/metrics")
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/api/key/status")
 async def key_status(
     payload: KeyStatusRequest,
@@ -114,14 +273,315 @@ async def key_status(
     api_key = payload.api_key or x_api_key
     base_url = payload.base_url or x_base_url
 
+    async def check() -> Dict[str, Any]:
+        return await validate_key_async(config, override_api_key=api_key, override_base_url=base_url)
+
     try:
-        status = validate_key(config, override_api_key=api_key, override_base_url=base_url)
-        return status
+        cache_key = key_status_cache.make_key(api_key or config.api_key, base_url or config.base_url)
+        return await key_status_cache.get(cache_key, check)
     except Exception as exc:
         logger.exception("Key status error")
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
 
+def _cache_key(
+    prompt: str,
+    payload: GenerateRequest,
+    count: int,
+    return_type: Optional[str],
+    api_key: Optional[str],
+    base_url: Optional[str],
+    model: Optional[str],
+) -> Optional[str]:
+    resolved_key = api_key or config.api_key
+    if config.use_mock or not resolved_key:
+        return None
+    provider_request = build_provider_request(
+        prompt,
+        payload.negative_prompt,
+        count,
+        config,
+        resolved_key,
+        size=payload.size,
+        override_base_url=base_url,
+        override_model=model,
+    )
+    # Scoped to the effective key: a result fetched with one key must not be
+    # served to a caller whose key the provider would have rejected.
+    key = f"{generation_cache_key(provider_request, return_type)}:{_key_digest(resolved_key)[:16]}"
+    options = _process_options(payload)
+    return f"{key}:{options.key()}" if options.active else key
+
+
+def _memory_plan(calls: int, count: int, return_type: Optional[str], streaming: bool) -> Tuple[int, str, bool]:
+    """Bytes to reserve, the return type to use and whether it was downgraded.
+
+    Buffered responses hold every image until the body is serialized; streams
+    and blob-store URLs only hold the prompts in flight. A request over the
+    per-request budget is switched to blob URLs when a blob store exists, and
+    refused with 413 otherwise.
+    """
+    return_type = normalize_return_type(return_type)
+
+    def estimate(kind: str) -> int:
+        blob = kind == "url" and blob_store is not None
+        held = min(calls, prompt_concurrency) if streaming or blob else calls
+        return estimate_response_bytes(held * count, "base64" if blob else kind, image_estimate_bytes)
+
+    nbytes = estimate(return_type)
+    if nbytes <= request_memory_limit:
+        return nbytes, return_type, False
+    if blob_store is not None and estimate("url") <= request_memory_limit:
+        memory_budget_decisions.inc(decision="downgraded")
+        return estimate("url"), "url", True
+    memory_budget_decisions.inc(decision="rejected")
+    raise HTTPException(
+        status_code=413,
+        detail=(
+            f"Response would need about {nbytes // (1024 * 1024)} MB; the per-request budget is "
+            f"{request_memory_limit // (1024 * 1024)} MB. Use stream=true, fewer prompts or /api/jobs."
+        ),
+    )
+
+
+async def _reserve_memory(nbytes: int) -> int:
+    try:
+        return await memory_budget.acquire(nbytes, memory_budget_wait)
+    except BudgetExhausted as exc:
+        memory_budget_decisions.inc(decision="shed")
+        raise HTTPException(
+            status_code=503,
+            detail=str(exc),
+            headers={"Retry-After": str(max(1, math.ceil(memory_budget_wait)))},
+        ) from exc
+
+
+def _process_options(payload: GenerateRequest) -> ProcessOptions:
+    """Post-processing options of a request; raises HTTP 400 for invalid ones.
+
+    Raises HTTP 501 when processing is asked for but Pillow is not installed,
+    rather than silently returning the unprocessed images.
+    """
+    try:
+        options = make_options(payload.size, payload.resize, payload.format, payload.quality, payload.thumbnail)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if options.active and not image_processor.available:
+        raise HTTPException(status_code=501, detail="Image post-processing is unavailable: Pillow is not installed")
+    return options
+
+
+async def _generate_prompt(
+    prompt: str,
+    payload: GenerateRequest,
+    count: int,
+    return_type: Optional[str],
+    api_key: Optional[str],
+    base_url: Optional[str],
+    model: Optional[str],
+    request_slots: asyncio.Semaphore,
+    cache_bypass: bool = False,
+    client_id: str = "anonymous",
+    priority: str = INTERACTIVE,
+) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Generate one prompt of a batch; provider and storage failures are reported, never raised.
+
+    Returns the result entry and its cache outcome (``"hit"``, ``"miss"`` or None
+    when the cache does not apply).
+    """
+    cache_key = None
+    if result_cache is not None or single_flight is not None or prefetcher is not None:
+        cache_key = _cache_key(prompt, payload, count, return_type, api_key, base_url, model)
+    if cache_key and prefetcher is not None and not cache_bypass and api_key is None:
+        # Only server-key traffic is learned: prefetching spends the server's quota.
+        spec = {"prompt": prompt, "payload": payload, "count": count, "return_type": return_type}
+        prefetcher.record(cache_key, {**spec, "base_url": base_url, "model": model}, cost=count)
+    if cache_key and result_cache is not None and not cache_bypass:
+        cached = await result_cache.aget(cache_key)
+        if cached is not None:
+            return {"prompt": prompt, "count": count, "images": cached}, "hit"
+    if cache_key and prefetcher is not None and not cache_bypass:
+        pooled = prefetcher.take(cache_key)
+        if pooled is not None:
+            return {"prompt": prompt, "count": count, "images": pooled}, "hit"
+
+    async def call_provider() -> List[Dict[str, Any]]:
+        async with request_slots, scheduler.slot(client_id, priority, cost=count):
+            images = await generate_images_async(
+                prompt=prompt,
+                negative_prompt=payload.negative_prompt,
+                count=count,
+                config=config,
+                return_type=return_type,
+                size=payload.size,
+                override_api_key=api_key,
+                override_base_url=base_url,
+                override_model=model,
+            )
+        # Outside the provider slots: CPU work in the pool must not hold up provider calls.
+        return await image_processor.process(images, _process_options(payload))
+
+    try:
+        if cache_key and single_flight is not None:
+            # The cache key already carries the API key, so shared errors stay per key.
+            images = await single_flight.run(cache_key, call_provider)
+        else:
+            images = await call_provider()
+    except Exception as exc:  # provider error
+        logger.warning("Provider error: %s", exc)
+        if not config.placeholder_on_error:
+            return {
+                "prompt": prompt,
+                "count": count,
+                "images": [],
+                "error": str(exc),
+            }, None
+        placeholder_fallbacks.inc(reason="provider_error")
+        images = placeholder_images(prompt, count, normalize_return_type(return_type), payload.size)
+    if blob_store is not None and normalize_return_type(return_type) == "url":
+        try:
+            images = await asyncio.to_thread(blob_store.store_images, images)
+        except Exception as exc:
+            logger.warning("Blob store error: %s", exc)
+            return {
+                "prompt": prompt,
+                "count": count,
+                "images": [],
+                "error": f"Could not store images: {exc}",
+            }, None
+    cache_state = None
+    if cache_key and result_cache is not None:
+        cache_state = "miss"
+        if not is_placeholder_result(images):
+            try:
+                await result_cache.aset(cache_key, images)
+            except Exception as exc:
+                # The images are already in hand; a failed cache fill only costs a later refetch.
+                logger.warning("Result cache error: %s", exc)
+    return {
+        "prompt": prompt,
+        "count": count,
+        "images": images,
+    }, cache_state
+
+
+async def _prefetch(spec: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Generate one speculative result for the prefetcher; None if the provider failed."""
+    result, _ = await _generate_prompt(
+        spec["prompt"],
+        spec["payload"],
+        spec["count"],
+        spec["return_type"],
+        None,
+        spec["base_url"],
+        spec["model"],
+        asyncio.Semaphore(1),
+        cache_bypass=True,
+        client_id="prefetch",
+        priority=BULK,
+    )
+    if "error" in result or is_placeholder_result(result["images"]):
+        return None
+    return result["images"]
+
+
+@app.get("/api/images/{digest}")
+async def get_image(
+    digest: str,
+    range_header: Optional[str] = Header(default=None, alias="Range"),
+    if_none_match: Optional[str] = Header(default=None, alias="If-None-Match"),
+) -> Response:
+    blob = await asyncio.to_thread(blob_store.get, digest) if blob_store is not None else None
+    if blob is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    data, mime = blob
+    etag = f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+    if if_none_match and (if_none_match.strip() == "*" or etag in if_none_match):
+        return Response(status_code=304, headers=headers)
+    try:
+        byte_range = parse_range(range_header, len(data))
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(data)}"})
+    if byte_range is None:
+        return Response(content=data, media_type=mime, headers=headers)
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{len(data)}"
+    return Response(content=data[start : end + 1], status_code=206, media_type=mime, headers=headers)
+
+
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+
+def _stream_format(payload: GenerateRequest, accept: Optional[str]) -> Optional[str]:
+    accept = (accept or "").lower()
+    if "text/event-stream" in accept:
+        return "sse"
+    if "application/x-ndjson" in accept or payload.stream:
+        return "ndjson"
+    return None
+
+
+def _encode_event(stream_format: str, event: str, data: Dict[str, Any]) -> bytes:
+    body = dumps(data)
+    if stream_format == "sse":
+        return b"event: " + event.encode("ascii") + b"\ndata: " + body + b"\n\n"
+    return body + b"\n"
+
+
+async def _stream_results(
+    jobs: List[Awaitable[Tuple[Dict[str, Any], Optional[str]]]],
+    stream_format: str,
+    request_id: str,
+) -> AsyncIterator[bytes]:
+    """Emit each prompt's result as soon as it completes, then a closing summary."""
+
+    async def indexed(index: int, job: Awaitable[Tuple[Dict[str, Any], Optional[str]]]):
+        return index, await job
+
+    tasks = [asyncio.ensure_future(indexed(index, job)) for index, job in enumerate(jobs)]
+    errors = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            index, (result, cache_state) = await next_done
+            errors += "error" in result
+            event = {"index": index, **result}
+            if cache_state:
+                event["cache"] = cache_state
+            yield _encode_event(stream_format, "result", event)
+        summary = {
+            "status": "error" if tasks and errors == len(tasks) else "ok",
+            "provider": "nano-banana",
+            "request_id": request_id,
+            "done": True,
+            "total": len(tasks),
+            "errors": errors,
+        }
+        yield _encode_event(stream_format, "done", summary)
+    finally:
+        # The client went away mid-stream: stop the prompts nobody will read.
+        for task in tasks:
+            task.cancel()
+
+
+def _cache_headers(outcomes: List[Tuple[Dict[str, Any], Optional[str]]], cache_bypass: bool) -> Dict[str, str]:
+    headers: Dict[str, str] = {}
+    if result_cache is not None:
+        hits = sum(1 for _, state in outcomes if state == "hit")
+        misses = sum(1 for _, state in outcomes if state == "miss")
+        if cache_bypass:
+            headers["X-Cache"] = "BYPASS"
+        elif hits or misses:
+            headers["X-Cache"] = "HIT" if not misses else "MISS"
+        headers["X-Cache-Hits"] = str(hits)
+        headers["X-Cache-Misses"] = str(misses)
+    return headers
+
+
 @app.post("/api/generate")
 async def generate(
     payload: GenerateRequest,
@@ -130,69 +590,281 @@ async def generate(
     x_base_url: Optional[str] = Header(default=None, alias="X-Base-Url"),
     x_model: Optional[str] = Header(default=None, alias="X-Model"),
     x_return_type: Optional[str] = Header(default=None, alias="X-Return-Type"),
-) -> Dict[str, Any]:
+    x_cache: Optional[str] = Header(default=None, alias="X-Cache"),
+    x_priority: Optional[str] = Header(default=None, alias="X-Priority"),
+    accept: Optional[str] = Header(default=None),
+    accept_encoding: Optional[str] = Header(default=None),
+) -> Response:
     api_key = x_api_key
     base_url = x_base_url
     model = x_model
     return_type = payload.return_type or x_return_type
+    cache_bypass = (x_cache or "").strip().lower() == "bypass"
     if not payload.prompt and not payload.prompts:
         raise HTTPException(status_code=400, detail="prompt or prompts is required")
+    _process_options(payload)
     count = max(1, min(payload.count, 8))
-    prompts = payload.prompts or [payload.prompt]
-    results = []
-    for prompt in prompts:
-        if not prompt:
-            continue
-        try:
-            images = generate_images(
-                prompt=prompt,
-                negative_prompt=payload.negative_prompt,
-                count=count,
-                config=config,
-                return_type=return_type,
-                size=payload.size,
-                override_api_key=api_key,
-                override_base_url=base_url,
-                override_model=model,
+    prompts = [prompt for prompt in payload.prompts or [payload.prompt] if prompt]
+    if len(prompts) > generate_max_prompts:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{len(prompts)} prompts in one request; the limit is {generate_max_prompts}. Use /api/jobs.",
+        )
+    client_id = _client_id(request)
+    priority = _priority(payload.priority, x_priority, len(prompts) * count)
+    _admit(client_id, priority, len(prompts))
+    stream_format = _stream_format(payload, accept)
+    nbytes, return_type, downgraded = _memory_plan(len(prompts), count, return_type, stream_format is not None)
+    reserved = await _reserve_memory(nbytes)
+    # Released once the body has been sent, not when the handler returns.
+    release = BackgroundTask(memory_budget.release, reserved)
+    try:
+        request_slots = asyncio.Semaphore(prompt_concurrency)
+        jobs = [
+            _generate_prompt(
+                prompt,
+                payload,
+                count,
+                return_type,
+                api_key,
+                base_url,
+                model,
+                request_slots,
+                cache_bypass,
+                client_id,
+                priority,
             )
-        except Exception as exc:  # provider error
-            logger.warning("Provider error: %s", exc)
-            if config.placeholder_on_error:
-                images = []
-                for index in range(count):
-                    svg_bytes = make_placeholder_svg(prompt)
-                    b64 = encode_base64(svg_bytes)
-                    if (return_type or "").lower() == "url":
-                        images.append(
-                            {
-                                "index": index,
-                                "type": "url",
-                                "mime": "image/svg+xml",
-                                "url": f"data:image/svg+xml;base64,{b64}",
-                            }
-                        )
-                    else:
-                        images.append(
-                            {
-                                "index": index,
-                                "type": "base64",
-                                "mime": "image/svg+xml",
-                                "data": b64,
-                            }
-                        )
-            else:
-                raise HTTPException(status_code=502, detail=str(exc)) from exc
-        results.append(
-            {
-                "prompt": prompt,
-                "count": count,
-                "images": images,
-            }
+            for prompt in prompts
+        ]
+        request_id = request.headers.get("X-Request-Id", "")
+
+        if stream_format:
+            return StreamingResponse(
+                _stream_results(jobs, stream_format, request_id),
+                media_type=STREAM_MEDIA_TYPES[stream_format],
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+                background=release,
+            )
+
+        # gather keeps input order; each task swallows its own provider error so
+        # one failing prompt never cancels its siblings.
+        outcomes = await asyncio.gather(*jobs)
+        results = [result for result, _ in outcomes]
+        errors = [result["error"] for result in results if "error" in result]
+        if errors and len(errors) == len(results):
+            raise HTTPException(status_code=502, detail=errors[0])
+
+        body = {
+            "status": "ok",
+            "provider": "nano-banana",
+            "request_id": request_id,
+            "results": results,
+        }
+        headers = _cache_headers(outcomes, cache_bypass)
+        if downgraded:
+            headers["X-Downgraded"] = "blob-url"
+        response = encode_generate_response(body, accept, accept_encoding, headers)
+    except BaseException:
+        memory_budget.release(reserved)
+        raise
+    response.background = release
+    return response
+
+
+@app.get("/api/templates")
+async def list_templates() -> Dict[str, Any]:
+    return {"templates": [template.describe() for template in template_registry.list()]}
+
+
+@app.post("/api/templates/{template_id}/generate")
+async def generate_from_template(
+    template_id: str,
+    payload: TemplateGenerateRequest,
+    request: Request,
+    x_api_key: Optional[str] = Header(default=None, alias="X-API-Key"),
+    x_base_url: Optional[str] = Header(default=None, alias="X-Base-Url"),
+    x_model: Optional[str] = Header(default=None, alias="X-Model"),
+    x_return_type: Optional[str] = Header(default=None, alias="X-Return-Type"),
+    x_cache: Optional[str] = Header(default=None, alias="X-Cache"),
+    x_priority: Optional[str] = Header(default=None, alias="X-Priority"),
+    accept: Optional[str] = Header(default=None),
+    accept_encoding: Optional[str] = Header(default=None),
+) -> Response:
+    template = template_registry.get(template_id)
+    if template is None:
+        raise HTTPException(status_code=404, detail="Template not found")
+    expansions = matrix_size(payload.matrix)
+    if expansions == 0:
+        raise HTTPException(status_code=400, detail="matrix has an empty value list")
+    if expansions > template_max_expansions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"matrix expands to {expansions} prompts; the limit is {template_max_expansions}",
         )
+    return_type = payload.return_type or x_return_type
+    cache_bypass = (x_cache or "").strip().lower() == "bypass"
+    count = max(1, min(payload.count, 8))
+    client_id = _client_id(request)
+    priority = _priority(payload.priority, x_priority, expansions * count)
+    _admit(client_id, priority, expansions)
+    nbytes, return_type, downgraded = _memory_plan(expansions, count, return_type, streaming=False)
+    reserved = await _reserve_memory(nbytes)
+    try:
+        request_slots = asyncio.Semaphore(prompt_concurrency)
 
-    return {
-        "status": "ok",
-        "provider": "nano-banana",
-        "request_id": request.headers.get("X-Request-Id", ""),
-        "results": results,
-    }
+        # Expansion is deterministic, so combinations that produce the same prompt
+        # (e.g. a matrix axis the template never references) share one generation.
+        combinations = list(expand_matrix(payload.variables, payload.matrix))
+        unique: Dict[Tuple[str, str, str], "asyncio.Future[Tuple[Dict[str, Any], Optional[str]]]"] = {}
+        keys = []
+        for variables in combinations:
+            prompt, negative = template.expand(variables)
+            key = (prompt, negative, variables.get("size") or "")
+            keys.append(key)
+            if key not in unique and prompt:
+                prompt_payload = GenerateRequest(
+                    negative_prompt=negative or None,
+                    size=key[2] or None,
+                    **payload.model_dump(include=set(ProcessingFields.model_fields)),
+                )
+                _process_options(prompt_payload)
+                unique[key] = asyncio.ensure_future(
+                    _generate_prompt(
+                        prompt,
+                        prompt_payload,
+                        count,
+                        return_type,
+                        x_api_key,
+                        x_base_url,
+                        x_model,
+                        request_slots,
+                        cache_bypass,
+                        client_id,
+                        priority,
+                    )
+                )
+        if not unique:
+            raise HTTPException(status_code=400, detail="template expanded to an empty prompt")
+        try:
+            await asyncio.gather(*unique.values())
+        finally:
+            for task in unique.values():
+                task.cancel()
+        outcomes = {key: task.result() for key, task in unique.items()}
+
+        results = []
+        for index, (variables, key) in enumerate(zip(combinations, keys)):
+            if key not in outcomes:
+                empty = {"prompt": "", "images": [], "error": "empty prompt"}
+                results.append({"index": index, "variables": variables, **empty})
+                continue
+            result, _ = outcomes[key]
+            results.append({"index": index, "variables": variables, "negative_prompt": key[1], **result})
+        if all("error" in result for result in results):
+            raise HTTPException(status_code=502, detail=results[0]["error"])
+
+        body = {
+            "status": "ok",
+            "provider": "nano-banana",
+            "request_id": request.headers.get("X-Request-Id", ""),
+            "template": template.id,
+            "results": results,
+        }
+        headers = _cache_headers(list(outcomes.values()), cache_bypass)
+        if downgraded:
+            headers["X-Downgraded"] = "blob-url"
+        response = encode_generate_response(body, accept, accept_encoding, headers)
+    except BaseException:
+        memory_budget.release(reserved)
+        raise
+    response.background = BackgroundTask(memory_budget.release, reserved)
+    return response
+
+
+async def _process_job(job: Job, record: Recorder) -> None:
+    request = job.request
+    payload = GenerateRequest(
+        negative_prompt=request.get("negative_prompt"),
+        size=request.get("size"),
+        **{name: request[name] for name in ProcessingFields.model_fields if name in request},
+    )
+    prompts = request["prompts"]
+    request_slots = asyncio.Semaphore(prompt_concurrency)
+
+    async def run(index: int) -> None:
+        result, _ = await _generate_prompt(
+            prompts[index],
+            payload,
+            request["count"],
+            request.get("return_type"),
+            job.secrets.get("api_key"),
+            request.get("base_url"),
+            request.get("model"),
+            request_slots,
+            client_id=request.get("client") or f"job:{job.id}",
+            priority=request.get("priority") or BULK,
+        )
+        await record(index, result)
+
+    await asyncio.gather(*(run(index) for index in job.pending))
+
+
+@app.post("/api/jobs", status_code=202)
+async def create_job(
+    payload: GenerateRequest,
+    request: Request,
+    x_api_key: Optional[str] = Header(default=None, alias="X-API-Key"),
+    x_base_url: Optional[str] = Header(default=None, alias="X-Base-Url"),
+    x_model: Optional[str] = Header(default=None, alias="X-Model"),
+    x_return_type: Optional[str] = Header(default=None, alias="X-Return-Type"),
+    x_priority: Optional[str] = Header(default=None, alias="X-Priority"),
+) -> Dict[str, Any]:
+    if not payload.prompt and not payload.prompts:
+        raise HTTPException(status_code=400, detail="prompt or prompts is required")
+    _process_options(payload)
+    prompts = [prompt for prompt in payload.prompts or [payload.prompt] if prompt]
+    count = max(1, min(payload.count, 8))
+    priority = BULK
+    if len(prompts) * count <= interactive_max_images:
+        priority = normalize_priority(payload.priority) or normalize_priority(x_priority) or BULK
+    # The API key stays in memory only; everything persisted is non-secret.
+    job_id = await job_queue.submit(
+        {
+            "prompts": prompts,
+            "negative_prompt": payload.negative_prompt,
+            "size": payload.size,
+            "count": count,
+            "return_type": payload.return_type or x_return_type,
+            "base_url": x_base_url,
+            "model": x_model,
+            # Jobs are background work: bulk unless a small one asks otherwise.
+            # The client id is a key digest or address, never the key itself.
+            "client": _client_id(request),
+            "priority": priority,
+            **payload.model_dump(include=set(ProcessingFields.model_fields)),
+        },
+        {"api_key": x_api_key},
+    )
+    return {"job_id": job_id, "status": "queued", "total": len(prompts)}
+
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    offset: int = Query(default=0, ge=0),
+    limit: Optional[int] = Query(default=None, ge=1),
+) -> Dict[str, Any]:
+    # Results are paged under the same per-response budget as /generate; the
+    # stored JSON is held once as rows and once in the serialized body.
+    job = await job_queue.get(job_id, offset, limit, max(1, request_memory_limit // 2))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str) -> Dict[str, Any]:
+    status = await job_queue.cancel(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job_id": job_id, "status": status}
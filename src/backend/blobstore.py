@@ -0,0 +1,179 @@
+import base64
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class BlobStore:
+    """Content-addressed image store; each blob is written once under its SHA-256.
+
+    Blobs unused for ``max_age`` seconds are deleted, and the oldest go first
+    once the store exceeds ``max_bytes`` (``0`` disables either limit). Storing
+    an existing blob again counts as a use.
+    """
+
+    PRUNE_INTERVAL = 300.0
+    # A temp file this old belongs to a writer that died mid-write.
+    STALE_TMP_SECONDS = 3600.0
+
+    def __init__(self, root: str, public_base: str = "", max_age: float = 0, max_bytes: int = 0) -> None:
+        self.root = Path(root)
+        self.public_base = public_base.rstrip("/")
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._prune_lock = threading.Lock()
+        self._last_prune = time.monotonic()
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest
+
+    def put(self, data: bytes, mime: str) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._path(digest)
+        if path.exists():
+            try:
+                os.utime(path)
+            except OSError:  # pruned meanwhile; write it again below
+                pass
+            else:
+                return digest
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_atomic(path.with_name(f"{digest}.mime"), mime.encode("utf-8"))
+        self._write_atomic(path, data)
+        self._maybe_prune()
+        return digest
+
+    def _write_atomic(self, path: Path, data: bytes) -> None:
+        # Identical images are stored concurrently (single-flight followers,
+        # cache fills, placeholders), so every writer needs its own temp file.
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                handle.write(data)
+            os.replace(tmp_name, path)
+        except OSError:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            # Content-addressed: whoever won the race wrote the same bytes.
+            if not path.exists():
+                raise
+
+    def _maybe_prune(self) -> None:
+        if not (self.max_age or self.max_bytes) or time.monotonic() - self._last_prune < self.PRUNE_INTERVAL:
+            return
+        if not self._prune_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_prune = time.monotonic()
+            self.prune()
+        finally:
+            self._prune_lock.release()
+
+    def prune(self) -> int:
+        """Apply the retention limits now; return the number of blobs removed."""
+        now = time.time()
+        blobs: List[Tuple[float, int, Path]] = []
+        for path in self.root.glob("*/*"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if path.name.endswith(".tmp"):
+                if now - stat.st_mtime > self.STALE_TMP_SECONDS:
+                    path.unlink(missing_ok=True)
+            elif DIGEST_PATTERN.match(path.name):
+                blobs.append((stat.st_mtime, stat.st_size, path))
+        blobs.sort()
+        total = sum(size for _, size, _ in blobs)
+        removed = 0
+        for mtime, size, path in blobs:
+            expired = bool(self.max_age) and now - mtime > self.max_age
+            if not expired and (not self.max_bytes or total <= self.max_bytes):
+                break
+            path.unlink(missing_ok=True)
+            path.with_name(f"{path.name}.mime").unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def get(self, digest: str) -> Optional[Tuple[bytes, str]]:
+        if not DIGEST_PATTERN.match(digest):
+            return None
+        path = self._path(digest)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        try:
+            mime = path.with_name(f"{digest}.mime").read_text(encoding="utf-8").strip()
+        except OSError:
+            mime = "application/octet-stream"
+        return data, mime
+
+    def url_for(self, digest: str) -> str:
+        return f"{self.public_base}/api/images/{digest}"
+
+    def store_images(self, images: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Swap inline ``data:`` URLs for short blob URLs; other images pass through."""
+        stored = []
+        for image in images:
+            url = image.get("url") or ""
+            if image.get("type") != "url" or not url.startswith("data:"):
+                stored.append(image)
+                continue
+            stored_image = {**image, **self._store_data_url(url, image.get("mime"))}
+            thumbnail = image.get("thumbnail") or {}
+            if (thumbnail.get("url") or "").startswith("data:"):
+                stored_image["thumbnail"] = {**thumbnail, **self._store_data_url(thumbnail["url"], thumbnail.get("mime"))}
+            stored.append(stored_image)
+        return stored
+
+    def _store_data_url(self, url: str, mime: Optional[str]) -> Dict[str, str]:
+        _, _, b64 = url.partition(";base64,")
+        digest = self.put(base64.b64decode(b64), mime or "application/octet-stream")
+        return {"url": self.url_for(digest), "sha256": digest}
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Return an inclusive (start, end) for a single ``bytes=`` range, or None for the full body.
+
+    Raises ValueError when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        start = max(0, size - int(last))
+        end = size - 1
+    if start > end or start >= size:
+        raise ValueError("Range not satisfiable")
+    return start, end
+
+
+def load_blob_store() -> Optional[BlobStore]:
+    root = os.getenv("BLOB_STORE_DIR", "").strip()
+    if not root:
+        return None
+    return BlobStore(
+        root,
+        public_base=os.getenv("BLOB_PUBLIC_BASE", "").strip(),
+        max_age=float(os.getenv("BLOB_STORE_MAX_AGE_DAYS", "7")) * 86400,
+        max_bytes=int(float(os.getenv("BLOB_STORE_MAX_MB", "10240")) * 1024 * 1024),
+    )
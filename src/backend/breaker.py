@@ -0,0 +1,122 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker for one provider endpoint.
+
+    ``failure_threshold`` consecutive failures open the circuit; after
+    ``recovery_timeout`` seconds up to ``half_open_probes`` calls are let
+    through, and the first probe result closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30, half_open_probes: int = 1) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_probes = half_open_probes
+        self.state = "closed"
+        self.failures = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Reserve a call slot or raise :class:`CircuitOpenError`."""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.recovery_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError("Provider endpoint circuit is open")
+                self.state = "half_open"
+                self._probes = 0
+            if self.state == "half_open":
+                if self._probes >= self.half_open_probes:
+                    self.rejected += 1
+                    raise CircuitOpenError("Provider endpoint circuit is half-open; probe in flight")
+                self._probes += 1
+
+    def on_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+
+    def on_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+    def on_abandon(self) -> None:
+        """Release a half-open probe slot whose call ended without a verdict (e.g. cancelled)."""
+        with self._lock:
+            if self.state == "half_open" and self._probes:
+                self._probes -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "rejected": self.rejected}
+
+
+class BreakerRegistry:
+    """One :class:`CircuitBreaker` per endpoint URL from ``build_endpoint``.
+
+    Endpoints come from client headers, so at most ``max_breakers`` are kept.
+    The least recently used closed breakers go first; open and half-open ones
+    stay so a failing endpoint cannot be reset by flooding the registry.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30,
+        half_open_probes: int = 1,
+        max_breakers: int = 256,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_probes = half_open_probes
+        self.max_breakers = max(1, max_breakers)
+        self._breakers: "OrderedDict[str, CircuitBreaker]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, endpoint: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.recovery_timeout, self.half_open_probes)
+                self._breakers[endpoint] = breaker
+                self._evict()
+            else:
+                self._breakers.move_to_end(endpoint)
+            return breaker
+
+    def _evict(self) -> None:
+        excess = len(self._breakers) - self.max_breakers
+        if excess <= 0:
+            return
+        candidates = list(self._breakers.items())[:-1]
+        for endpoint in [endpoint for endpoint, breaker in candidates if breaker.state == "closed"][:excess]:
+            del self._breakers[endpoint]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {endpoint: breaker.stats() for endpoint, breaker in breakers.items()}
+
+
+def load_breakers() -> BreakerRegistry:
+    return BreakerRegistry(
+        failure_threshold=max(1, int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))),
+        recovery_timeout=float(os.getenv("BREAKER_RECOVERY_TIMEOUT", "30")),
+        half_open_probes=max(1, int(os.getenv("BREAKER_HALF_OPEN_PROBES", "1"))),
+        max_breakers=int(os.getenv("BREAKER_MAX_ENDPOINTS", "256")),
+    )
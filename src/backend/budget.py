@@ -0,0 +1,90 @@
+import asyncio
+import os
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+try:
+    from .metrics import memory_budget_in_use
+except ImportError:
+    from metrics import memory_budget_in_use
+
+
+class BudgetExhausted(Exception):
+    """No room in the process memory budget within the allowed wait."""
+
+
+class ByteBudget:
+    """Process-wide semaphore counted in estimated response bytes.
+
+    Waiters are served first-come first-served so one large reservation is
+    not starved by a stream of small ones. A reservation larger than the
+    whole budget is clamped to it, so it runs alone rather than never.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = max(1, capacity)
+        self.in_use = 0
+        self.shed = 0
+        self._waiters: Deque[Tuple[int, "asyncio.Future[None]"]] = deque()
+
+    def _clamp(self, nbytes: int) -> int:
+        return max(0, min(nbytes, self.capacity))
+
+    async def acquire(self, nbytes: int, timeout: float) -> int:
+        """Reserve ``nbytes`` (clamped); return the amount to pass to :meth:`release`."""
+        nbytes = self._clamp(nbytes)
+        if not self._waiters and self.in_use + nbytes <= self.capacity:
+            self._take(nbytes)
+            return nbytes
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (nbytes, waiter)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as we gave up; hand the bytes back.
+                self.release(nbytes)
+            else:
+                waiter.cancel()
+                self._waiters.remove(entry)
+                self._wake()
+            if isinstance(exc, asyncio.TimeoutError):
+                self.shed += 1
+                raise BudgetExhausted(f"memory budget busy ({self.in_use} of {self.capacity} bytes reserved)") from exc
+            raise
+        return nbytes
+
+    def release(self, nbytes: int) -> None:
+        self.in_use -= nbytes
+        memory_budget_in_use.dec(nbytes)
+        self._wake()
+
+    def _take(self, nbytes: int) -> None:
+        self.in_use += nbytes
+        memory_budget_in_use.inc(nbytes)
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_use + self._waiters[0][0] <= self.capacity:
+            nbytes, waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self._take(nbytes)
+            waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"capacity": self.capacity, "in_use": self.in_use, "waiting": len(self._waiters), "shed": self.shed}
+
+
+def estimate_response_bytes(images_held: int, return_type: str, image_bytes: int) -> int:
+    """Rough peak memory of ``images_held`` generated images on their way to the client.
+
+    Each image is held as base64 and again in the serialized body. ``url``
+    results without a blob store add a ``data:`` URI copy on top.
+    """
+    copies = 3 if return_type == "url" else 2
+    return images_held * image_bytes * copies
+
+
+def load_byte_budget() -> ByteBudget:
+    return ByteBudget(int(float(os.getenv("MEMORY_BUDGET_MB", "512")) * 1024 * 1024))
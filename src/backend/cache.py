@@ -0,0 +1,290 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("nano-proxy")
+
+def _images_size(images: List[Dict[str, Any]]) -> int:
+    return sum(len(image.get("data") or image.get("url") or "") for image in images)
+
+
+class ResultCache:
+    """LRU/TTL cache of generated image lists with an optional on-disk tier.
+
+    Keys are content hashes of the provider request (see
+    ``nano_banana.generation_cache_key``) plus a digest of the API key, so
+    identical expanded templates sent with the same key map to the same entry.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: int = 256 * 1024 * 1024,
+        ttl: float = 3600,
+        disk_dir: Optional[str] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._entries: "OrderedDict[str, Tuple[float, int, List[Dict[str, Any]]]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, _, images = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return images
+                self._drop(key)
+        images = self._disk_get(key)
+        with self._lock:
+            if images is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._store(key, images)
+        return images
+
+    def set(self, key: str, images: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._store(key, images)
+        self._disk_set(key, images)
+
+    async def aget(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        if self.disk_dir is None:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def aset(self, key: str, images: List[Dict[str, Any]]) -> None:
+        if self.disk_dir is None:
+            self.set(key, images)
+            return
+        await asyncio.to_thread(self.set, key, images)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "disk_hits": self.disk_hits,
+                "disk": bool(self.disk_dir),
+            }
+
+    def _store(self, key: str, images: List[Dict[str, Any]]) -> None:
+        size = _images_size(images)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, images)
+        self._bytes += size
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._drop(oldest)
+
+    def _drop(self, key: str) -> None:
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def _disk_path(self, key: str) -> Path:
+        assert self.disk_dir is not None
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _disk_get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        if self.disk_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            with path.open("r", encoding="utf-8") as handle:
+                record = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        # Disk entries outlive the process, so they expire on wall-clock time.
+        if record.get("expires", 0) <= time.time():
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            return None
+        return record.get("images")
+
+    def _disk_set(self, key: str, images: List[Dict[str, Any]]) -> None:
+        if self.disk_dir is None:
+            return
+        path = self._disk_path(key)
+        tmp_name = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Concurrent fills of one key (threads or workers) each need their own temp file.
+            fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                json.dump({"expires": time.time() + self.ttl, "images": images}, handle)
+            os.replace(tmp_name, path)
+        except OSError as exc:
+            if tmp_name is not None:
+                try:
+                    os.unlink(tmp_name)
+                except OSError:
+                    pass
+            # The memory tier already holds the entry; losing the disk copy only costs a refetch.
+            if not path.exists():
+                logger.warning("Result cache disk write failed for %s: %s", key[:16], exc)
+
+
+class SingleFlight:
+    """Coalesce concurrent identical provider calls onto one in-flight task.
+
+    The first caller for a key starts the call; callers arriving while it runs
+    await the same task and receive its result or exception. The task is shielded
+    so a disconnecting leader does not cancel the followers.
+    """
+
+    def __init__(self) -> None:
+        self._in_flight: Dict[str, "asyncio.Task[Any]"] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def run(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._in_flight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(call())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done, key=key: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: "asyncio.Task[Any]") -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every waiter has gone away.
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._in_flight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
+
+
+class KeyStatusCache:
+    """TTL cache for ``/api/key/status`` answers keyed by hashed API key and base URL.
+
+    Successful checks live for ``ttl`` seconds and failures for ``negative_ttl``.
+    Entries inside the last ``refresh_ahead`` fraction of their lifetime are
+    served immediately while a background task re-validates them, and
+    concurrent misses for one key share a single upstream check.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 300,
+        negative_ttl: float = 30,
+        refresh_ahead: float = 0.2,
+        max_entries: int = 1024,
+    ) -> None:
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.refresh_ahead = refresh_ahead
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, float, Dict[str, Any]]]" = OrderedDict()
+        self._pending: Dict[str, "asyncio.Task[Dict[str, Any]]"] = {}
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    @staticmethod
+    def make_key(api_key: Optional[str], base_url: Optional[str]) -> str:
+        material = f"{api_key or ''}\n{base_url or ''}".encode("utf-8")
+        return hashlib.sha256(material).hexdigest()
+
+    async def get(self, key: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        now = time.monotonic()
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, lifetime, status = entry
+            if expires > now:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                if expires - now < lifetime * self.refresh_ahead and key not in self._pending:
+                    self.refreshes += 1
+                    self._start(key, fetch)
+                return status
+        self.misses += 1
+        task = self._pending.get(key) or self._start(key, fetch)
+        return await asyncio.shield(task)
+
+    def _start(self, key: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]) -> "asyncio.Task[Dict[str, Any]]":
+        task = asyncio.ensure_future(fetch())
+        self._pending[key] = task
+        task.add_done_callback(lambda done, key=key: self._finish(key, done))
+        return task
+
+    def _finish(self, key: str, task: "asyncio.Task[Dict[str, Any]]") -> None:
+        if self._pending.get(key) is task:
+            del self._pending[key]
+        if task.cancelled() or task.exception() is not None:
+            return
+        status = task.result()
+        lifetime = self.ttl if status.get("ok") else self.negative_ttl
+        self._entries[key] = (time.monotonic() + lifetime, lifetime, status)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "refreshes": self.refreshes,
+        }
+
+
+def load_result_cache() -> Optional[ResultCache]:
+    if os.getenv("RESULT_CACHE_ENABLED", "false").lower() not in {"1", "true", "yes"}:
+        return None
+    return ResultCache(
+        max_entries=max(1, int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "256"))),
+        max_bytes=max(1, int(os.getenv("RESULT_CACHE_MAX_MB", "256"))) * 1024 * 1024,
+        ttl=float(os.getenv("RESULT_CACHE_TTL", "3600")),
+        disk_dir=os.getenv("RESULT_CACHE_DIR", "").strip() or None,
+    )
+
+
+def load_single_flight() -> Optional[SingleFlight]:
+    if os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() not in {"1", "true", "yes"}:
+        return None
+    return SingleFlight()
+
+
+def load_key_status_cache() -> KeyStatusCache:
+    return KeyStatusCache(
+        ttl=float(os.getenv("KEY_STATUS_TTL", "300")),
+        negative_ttl=float(os.getenv("KEY_STATUS_NEGATIVE_TTL", "30")),
+    )
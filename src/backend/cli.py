@@ -0,0 +1,330 @@
+"""Bulk generation straight against the provider, without the HTTP proxy.
+
+    python cli.py prompts.jsonl --out renders/
+    python cli.py variants.csv --template product-poster --out renders/ --concurrency 8
+
+Input is JSONL or CSV (by extension). A JSONL line is either a prompt
+(``{"prompt": ..., "negative_prompt": ..., "size": ..., "count": ..., "id": ...}``)
+or a template expansion (``{"template": ..., "variables": {...}, "matrix": {...}}``).
+CSV columns are prompt fields, or template variables when ``--template`` is given.
+
+Images are decoded from the provider response into ``--out`` one chunk at a
+time. Every finished item is appended to ``manifest.jsonl`` there; rerunning
+the same command skips items the manifest already records as done, so an
+interrupted run picks up where it stopped. Failed items are retried.
+
+Settings come from the environment, after applying ``--env-file`` (default:
+``SERVER_ENV_FILE``, else ``config/.env`` of the checkout when it exists).
+Without ``GOOGLE_AI_STUDIO_API_KEY`` the run is refused unless ``USE_MOCK=true``.
+"""
+
+import argparse
+import asyncio
+import binascii
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+try:
+    from . import nano_banana
+    from .breaker import load_breakers
+    from .governor import load_governor
+    from .nano_banana import (
+        ProviderConfig,
+        build_provider_request,
+        close_async_clients,
+        fetch_provider_body,
+        iter_inline_images,
+        load_config,
+        placeholder_images,
+    )
+    from .server import load_env_file
+    from .templates import DEFAULT_TEMPLATES_PATH, TemplateRegistry, expand_matrix
+except ImportError:
+    import nano_banana
+    from breaker import load_breakers
+    from governor import load_governor
+    from nano_banana import (
+        ProviderConfig,
+        build_provider_request,
+        close_async_clients,
+        fetch_provider_body,
+        iter_inline_images,
+        load_config,
+        placeholder_images,
+    )
+    from server import load_env_file
+    from templates import DEFAULT_TEMPLATES_PATH, TemplateRegistry, expand_matrix
+
+EXTENSIONS = {"image/png": "png", "image/jpeg": "jpg", "image/webp": "webp", "image/svg+xml": "svg"}
+# base64 decodes in whole 4-character groups; 1 MiB of text is 768 KiB of image.
+DECODE_CHUNK = 1024 * 1024
+MANIFEST_NAME = "manifest.jsonl"
+DEFAULT_ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "config", ".env")
+
+
+@dataclass
+class WorkItem:
+    id: str
+    prompt: str
+    negative_prompt: Optional[str] = None
+    size: Optional[str] = None
+    count: int = 1
+    variables: Dict[str, str] = field(default_factory=dict)
+
+
+def _item_id(prompt: str, negative: Optional[str], size: Optional[str], count: int) -> str:
+    material = json.dumps([prompt, negative or "", size or "", count], ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()[:16]
+
+
+def _make_item(
+    prompt: str,
+    negative: Optional[str],
+    size: Optional[str],
+    count: Any,
+    item_id: Optional[str] = None,
+    variables: Optional[Dict[str, str]] = None,
+) -> WorkItem:
+    count = max(1, min(int(count or 1), 8))
+    return WorkItem(
+        id=str(item_id) if item_id else _item_id(prompt, negative, size, count),
+        prompt=prompt,
+        negative_prompt=negative or None,
+        size=size or None,
+        count=count,
+        variables=variables or {},
+    )
+
+
+def _template_items(
+    registry: TemplateRegistry,
+    template_id: str,
+    variables: Dict[str, str],
+    matrix: Dict[str, List[str]],
+    count: Any,
+) -> Iterator[WorkItem]:
+    template = registry.get(template_id)
+    if template is None:
+        raise ValueError(f"unknown template {template_id!r}")
+    for combination in expand_matrix(variables, matrix):
+        prompt, negative = template.expand(combination)
+        if prompt:
+            yield _make_item(prompt, negative, combination.get("size"), count, variables=combination)
+
+
+def _rows(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, newline="", encoding="utf-8") as handle:
+        if path.lower().endswith(".csv"):
+            yield from csv.DictReader(handle)
+            return
+        for line_number, line in enumerate(handle, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"{path}:{line_number}: {exc}") from exc
+
+
+def read_items(
+    path: str,
+    registry: Optional[TemplateRegistry] = None,
+    template_id: Optional[str] = None,
+    count: int = 1,
+) -> Iterator[WorkItem]:
+    """Yield work items lazily so inputs of any size stream through."""
+    for row in _rows(path):
+        row_count = row.get("count") or count
+        template = row.get("template") or template_id
+        if template and not row.get("prompt"):
+            if registry is None:
+                raise ValueError("template rows need a template registry")
+            variables = row.get("variables") if isinstance(row.get("variables"), dict) else None
+            if variables is None:
+                # Flat CSV/JSONL row: every other column is a variable.
+                variables = {key: value for key, value in row.items() if key not in {"template", "count", "matrix"}}
+            yield from _template_items(registry, template, variables, row.get("matrix") or {}, row_count)
+        elif row.get("prompt"):
+            yield _make_item(row["prompt"], row.get("negative_prompt"), row.get("size"), row_count, row.get("id"))
+
+
+def load_manifest(path: str) -> Set[str]:
+    """Ids already completed by an earlier run; a torn last line is ignored."""
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get("status") == "ok":
+                done.add(entry["id"])
+    return done
+
+
+def write_payload(path: str, payload: memoryview) -> int:
+    """Decode base64 ``payload`` into ``path`` chunk by chunk; return the bytes written."""
+    tmp = f"{path}.part"
+    written = 0
+    with open(tmp, "wb") as handle:
+        for offset in range(0, len(payload), DECODE_CHUNK):
+            chunk = binascii.a2b_base64(payload[offset : offset + DECODE_CHUNK])
+            handle.write(chunk)
+            written += len(chunk)
+    # Only complete files ever carry the final name.
+    os.replace(tmp, path)
+    return written
+
+
+def write_images(payloads: Iterable[Tuple[int, str, memoryview]], out_dir: str, item_id: str) -> List[str]:
+    files = []
+    for index, mime, payload in payloads:
+        name = f"{item_id}-{index}.{EXTENSIONS.get(mime, 'bin')}"
+        write_payload(os.path.join(out_dir, name), payload)
+        files.append(name)
+    if not files:
+        raise RuntimeError("Provider returned no images")
+    return files
+
+
+class BulkRunner:
+    def __init__(
+        self,
+        config: ProviderConfig,
+        out_dir: str,
+        concurrency: int = 4,
+        model: Optional[str] = None,
+        base_url: Optional[str] = None,
+    ) -> None:
+        if not config.use_mock and not config.api_key:
+            # Placeholders recorded as "ok" would be skipped by every rerun.
+            raise ValueError("GOOGLE_AI_STUDIO_API_KEY is not set; set it, or USE_MOCK=true for placeholder images")
+        self.config = config
+        self.out_dir = out_dir
+        self.concurrency = max(1, concurrency)
+        self.model = model
+        self.base_url = base_url
+        self.manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+        self.completed = 0
+        self.skipped = 0
+        self.failed = 0
+
+    async def _generate(self, item: WorkItem) -> List[str]:
+        if self.config.use_mock:
+            images = placeholder_images(item.prompt, item.count, "base64", item.size)
+            payloads = [(image["index"], image["mime"], memoryview(image["data"].encode("ascii"))) for image in images]
+            return await asyncio.to_thread(write_images, payloads, self.out_dir, item.id)
+        provider_request = build_provider_request(
+            item.prompt,
+            item.negative_prompt,
+            item.count,
+            self.config,
+            self.config.api_key,
+            size=item.size,
+            override_base_url=self.base_url,
+            override_model=self.model,
+        )
+        body = await fetch_provider_body(provider_request, self.config, self.config.api_key)
+        # Decoding and disk writes happen off the loop; only the raw body is held.
+        return await asyncio.to_thread(
+            lambda: write_images(iter_inline_images(body, provider_request), self.out_dir, item.id)
+        )
+
+    async def run(self, items: Iterable[WorkItem]) -> int:
+        os.makedirs(self.out_dir, exist_ok=True)
+        done = load_manifest(self.manifest_path)
+        queue: "asyncio.Queue[Optional[WorkItem]]" = asyncio.Queue(maxsize=self.concurrency * 2)
+        manifest = open(self.manifest_path, "a", encoding="utf-8")
+
+        def record(item: WorkItem, entry: Dict[str, Any]) -> None:
+            manifest.write(json.dumps({"id": item.id, **entry}, ensure_ascii=False) + "\n")
+            manifest.flush()
+
+        async def worker() -> None:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                start = time.perf_counter()
+                try:
+                    files = await self._generate(item)
+                except Exception as exc:  # one bad prompt must not stop the run
+                    self.failed += 1
+                    record(item, {"status": "error", "prompt": item.prompt, "error": str(exc)})
+                    print(f"failed {item.id}: {exc}", file=sys.stderr)
+                    continue
+                self.completed += 1
+                record(
+                    item,
+                    {
+                        "status": "ok",
+                        **{key: value for key, value in asdict(item).items() if value and key != "id"},
+                        "files": files,
+                        "seconds": round(time.perf_counter() - start, 3),
+                    },
+                )
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        try:
+            seen: Set[str] = set()
+            for item in items:
+                if item.id in done or item.id in seen:
+                    self.skipped += 1
+                    continue
+                seen.add(item.id)
+                await queue.put(item)
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            manifest.close()
+            await close_async_clients()
+        return 1 if self.failed else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("input", help="JSONL or CSV file of prompts or template variables")
+    parser.add_argument("--out", required=True, help="directory for images and manifest.jsonl")
+    parser.add_argument("--concurrency", type=int, default=4, help="provider calls in flight (default 4)")
+    parser.add_argument("--count", type=int, default=1, help="images per prompt when a row does not say (max 8)")
+    parser.add_argument("--template", help="template id applied to rows without a prompt")
+    parser.add_argument("--templates", action="append", help="templates file or pack directory (repeatable)")
+    parser.add_argument("--model", help="override GOOGLE_AI_STUDIO_MODEL")
+    parser.add_argument("--base-url", help="override GOOGLE_AI_STUDIO_BASE_URL")
+    parser.add_argument("--env-file", help="KEY=VALUE settings applied first (default: SERVER_ENV_FILE or config/.env)")
+    args = parser.parse_args(argv)
+
+    env_file = args.env_file or os.getenv("SERVER_ENV_FILE", "").strip() or None
+    if env_file is None and os.path.exists(DEFAULT_ENV_FILE):
+        env_file = DEFAULT_ENV_FILE
+    load_env_file(env_file)
+    # Retry and breaker policies are read at import, before the env file applied.
+    nano_banana.governor = load_governor()
+    nano_banana.breakers = load_breakers()
+
+    registry = TemplateRegistry(args.templates or [DEFAULT_TEMPLATES_PATH], check_interval=0)
+    registry.load()
+    try:
+        runner = BulkRunner(load_config(), args.out, args.concurrency, model=args.model, base_url=args.base_url)
+        status = asyncio.run(runner.run(read_items(args.input, registry, args.template, args.count)))
+    except (OSError, ValueError) as exc:
+        print(f"error: {exc}", file=sys.stderr)
+        return 2
+    print(f"done: {runner.completed} generated, {runner.skipped} skipped, {runner.failed} failed", file=sys.stderr)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
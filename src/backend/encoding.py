@@ -0,0 +1,173 @@
+import asyncio
+import base64
+import json
+import os
+import uuid
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # optional fast path
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # optional binary format
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:  # optional compression
+    brotli = None
+
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+COMPRESS_CHUNK = 1024 * 1024
+# Base64 of already-compressed images only shrinks by about a quarter at any
+# level, so the cheapest settings get nearly all of the win.
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "1"))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+COMPRESSION_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024"))
+
+
+def dumps(data: Any) -> bytes:
+    """Compact JSON bytes; orjson when installed, the stdlib otherwise."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def _accepts(header: Optional[str]) -> Dict[str, float]:
+    """Parse an Accept/Accept-Encoding header into {token: q}."""
+    accepted = {}
+    for item in (header or "").lower().split(","):
+        token, *params = [part.strip() for part in item.split(";")]
+        if not token:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[token] = q
+    return accepted
+
+
+def negotiate_format(accept: Optional[str]) -> str:
+    accepted = _accepts(accept)
+    if msgpack is not None and any(accepted.get(media, 0) > 0 for media in MSGPACK_TYPES):
+        return "msgpack"
+    if accepted.get("multipart/mixed", 0) > 0:
+        return "multipart"
+    return "json"
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    accepted = _accepts(accept_encoding)
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def _inline_images(body: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    for result in body.get("results") or []:
+        for image in result.get("images") or []:
+            if image.get("type") == "base64" and isinstance(image.get("data"), str):
+                yield image
+
+
+def _msgpack_body(body: Dict[str, Any]) -> bytes:
+    # Raw bytes instead of base64: a third smaller and no decode on the client.
+    body = _copy_results(body)
+    for image in _inline_images(body):
+        image["data"] = base64.b64decode(image["data"])
+        image["type"] = "binary"
+    return msgpack.packb(body, use_bin_type=True)
+
+
+def _copy_results(body: Dict[str, Any]) -> Dict[str, Any]:
+    """Copy the envelope down to image dicts; the base64 strings themselves are shared."""
+    return {
+        **body,
+        "results": [
+            {**result, "images": [dict(image) for image in result.get("images") or []]}
+            for result in body.get("results") or []
+        ],
+    }
+
+
+def _multipart_parts(body: Dict[str, Any], boundary: str) -> Iterator[bytes]:
+    """A JSON manifest part followed by one raw part per inline image, referenced by Content-ID."""
+    manifest = _copy_results(body)
+    parts: List[Tuple[str, str, str]] = []
+    for image in _inline_images(manifest):
+        content_id = f"image-{len(parts)}"
+        parts.append((content_id, image.get("mime") or "application/octet-stream", image.pop("data")))
+        image["type"] = "part"
+        image["part"] = content_id
+    delimiter = f"--{boundary}\r\n".encode("ascii")
+    yield delimiter + b"Content-Type: application/json\r\n\r\n" + dumps(manifest) + b"\r\n"
+    for content_id, mime, b64 in parts:
+        data = base64.b64decode(b64)
+        headers = f"Content-Type: {mime}\r\nContent-ID: <{content_id}>\r\nContent-Length: {len(data)}\r\n\r\n"
+        yield delimiter + headers.encode("ascii") + data + b"\r\n"
+    yield f"--{boundary}--\r\n".encode("ascii")
+
+
+def _compressor(encoding: str) -> Any:
+    if encoding == "br":
+        return brotli.Compressor(quality=BROTLI_QUALITY)
+    # wbits=31 selects the gzip container.
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+
+async def _compressed(data: bytes, encoding: str) -> AsyncIterator[bytes]:
+    compressor = _compressor(encoding)
+    compress = compressor.compress if encoding == "gzip" else compressor.process
+    view = memoryview(data)
+    for start in range(0, len(view), COMPRESS_CHUNK):
+        # zlib and brotli release the GIL, so a worker thread keeps the loop free.
+        chunk = await asyncio.to_thread(compress, view[start : start + COMPRESS_CHUNK])
+        if chunk:
+            yield chunk
+    tail = compressor.flush() if encoding == "gzip" else compressor.finish()
+    if tail:
+        yield tail
+
+
+def encode_generate_response(
+    body: Dict[str, Any],
+    accept: Optional[str],
+    accept_encoding: Optional[str],
+    headers: Optional[Dict[str, str]] = None,
+) -> Response:
+    """Serialize a /api/generate body in the format and encoding the client asked for."""
+    headers = {**(headers or {}), "Vary": "Accept, Accept-Encoding"}
+    response_format = negotiate_format(accept)
+    if response_format == "msgpack":
+        return Response(_msgpack_body(body), media_type="application/msgpack", headers=headers)
+    if response_format == "multipart":
+        boundary = uuid.uuid4().hex
+        return StreamingResponse(
+            _multipart_parts(body, boundary),
+            media_type=f"multipart/mixed; boundary={boundary}",
+            headers=headers,
+        )
+    data = dumps(body)
+    encoding = negotiate_encoding(accept_encoding)
+    if encoding is None or len(data) < COMPRESSION_MIN_BYTES:
+        return Response(data, media_type="application/json", headers=headers)
+    headers["Content-Encoding"] = encoding
+    return StreamingResponse(_compressed(data, encoding), media_type="application/json", headers=headers)
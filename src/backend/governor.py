@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import os
+import random
+import time
+from collections import OrderedDict, deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+import httpx
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+THROTTLE_STATUS = {429, 503}
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AIMDLimiter:
+    """Adaptive concurrency limit: additive increase on success, multiplicative decrease on throttling.
+
+    A slow response (above ``latency_target`` seconds) counts as a mild
+    congestion signal so the limit backs off before the provider starts
+    returning 429s. Decreases are applied at most once per ``cooldown`` so a
+    burst of failures from one overloaded window halves the limit only once.
+    """
+
+    def __init__(
+        self,
+        initial: float = 4,
+        minimum: float = 1,
+        maximum: float = 64,
+        backoff: float = 0.5,
+        latency_target: float = 0,
+        cooldown: float = 1.0,
+    ) -> None:
+        self.limit = float(initial)
+        self.minimum = float(minimum)
+        self.maximum = float(maximum)
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.throttled = 0
+        self._last_decrease = 0.0
+        self._waiters: Deque["asyncio.Future[None]"] = deque()
+
+    async def acquire(self) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just before cancellation; give it back.
+                self.in_flight -= 1
+                self._wake()
+            else:
+                self._waiters.remove(waiter)
+            raise
+
+    @property
+    def idle(self) -> bool:
+        return not self.in_flight and not self._waiters
+
+    def release(self, outcome: str, latency: float = 0.0) -> None:
+        self.in_flight -= 1
+        self.record(outcome, latency)
+        self._wake()
+
+    def record(self, outcome: str, latency: float = 0.0) -> None:
+        now = time.monotonic()
+        if outcome == "throttled":
+            self.throttled += 1
+            self._decrease(now, self.backoff)
+        elif outcome == "ok" and self.latency_target and latency > self.latency_target:
+            self._decrease(now, 0.9)
+        elif outcome == "ok":
+            self.limit = min(self.maximum, self.limit + 1.0 / max(self.limit, 1.0))
+
+    def _decrease(self, now: float, factor: float) -> None:
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * factor)
+
+    def _wake(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.in_flight += 1
+            waiter.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": round(self.limit, 2),
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters),
+            "throttled": self.throttled,
+        }
+
+
+class ProviderGovernor:
+    """Retry and adaptive concurrency around provider calls.
+
+    Calls are grouped by model+action (the tail of the URL ``build_endpoint``
+    returns, so ``:generateContent``, ``:predict`` and ``:generateImages`` are
+    tracked separately) and by API key, since quotas apply per key and model.
+    Client keys are unbounded, so at most ``max_limiters`` are kept; the least
+    recently used idle ones are dropped first and start over at the initial
+    limit if they come back.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        initial_limit: float = 4,
+        min_limit: float = 1,
+        max_limit: float = 64,
+        latency_target: float = 0,
+        max_limiters: int = 1024,
+    ) -> None:
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.initial_limit = initial_limit
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.retries = 0
+        self.max_limiters = max(1, max_limiters)
+        self._limiters: "OrderedDict[str, AIMDLimiter]" = OrderedDict()
+
+    def limiter_for(self, endpoint: str, api_key: str) -> AIMDLimiter:
+        model_action = endpoint.rsplit("/models/", 1)[-1]
+        key = f"{model_action}|{hashlib.sha256(api_key.encode('utf-8')).hexdigest()[:12]}"
+        limiter = self._limiters.get(key)
+        if limiter is None:
+            limiter = AIMDLimiter(
+                initial=self.initial_limit,
+                minimum=self.min_limit,
+                maximum=self.max_limit,
+                latency_target=self.latency_target,
+            )
+            self._limiters[key] = limiter
+            self._evict()
+        else:
+            self._limiters.move_to_end(key)
+        return limiter
+
+    def _evict(self) -> None:
+        excess = len(self._limiters) - self.max_limiters
+        if excess <= 0:
+            return
+        # Oldest first, never the newest; limiters with calls in flight or queued stay.
+        candidates = list(self._limiters.items())[:-1]
+        for key in [key for key, limiter in candidates if limiter.idle][:excess]:
+            del self._limiters[key]
+
+    def _delay(self, attempt: int, retry_after: Optional[float]) -> Optional[float]:
+        """Seconds before the next attempt, or None when retrying is pointless."""
+        if attempt >= self.max_retries:
+            return None
+        if retry_after is not None:
+            # Waiting longer than max_delay would only hold the client hostage;
+            # give up and let the placeholder/502 path answer instead.
+            if retry_after > self.max_delay:
+                return None
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2**attempt)))
+
+    async def _attempt(self, limiter: AIMDLimiter, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        await limiter.acquire()
+        start = time.monotonic()
+        outcome, latency = "abandoned", 0.0
+        try:
+            response = await send()
+            latency = time.monotonic() - start
+            if response.status_code in THROTTLE_STATUS:
+                outcome = "throttled"
+            else:
+                outcome = "error" if response.status_code in RETRYABLE_STATUS else "ok"
+            return response
+        except httpx.TransportError:
+            outcome = "error"
+            raise
+        finally:
+            # Exactly one release per acquire, also when the caller is cancelled.
+            limiter.release(outcome, latency)
+
+    async def call(
+        self,
+        endpoint: str,
+        api_key: str,
+        send: Callable[[], Awaitable[httpx.Response]],
+    ) -> httpx.Response:
+        limiter = self.limiter_for(endpoint, api_key)
+        attempt = 0
+        while True:
+            try:
+                response = await self._attempt(limiter, send)
+            except httpx.TransportError:
+                delay = self._delay(attempt, None)
+                if delay is None:
+                    raise
+            else:
+                if response.status_code not in RETRYABLE_STATUS:
+                    return response
+                delay = self._delay(attempt, parse_retry_after(response.headers.get("Retry-After")))
+                if delay is None:
+                    return response
+                await response.aclose()
+            self.retries += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "retries": self.retries,
+            "limiters": {key: limiter.stats() for key, limiter in self._limiters.items()},
+        }
+
+
+def load_governor() -> ProviderGovernor:
+    return ProviderGovernor(
+        max_retries=max(0, int(os.getenv("PROVIDER_MAX_RETRIES", "3"))),
+        base_delay=float(os.getenv("PROVIDER_RETRY_BASE_DELAY", "0.5")),
+        max_delay=float(os.getenv("PROVIDER_RETRY_MAX_DELAY", "20")),
+        initial_limit=float(os.getenv("PROVIDER_AIMD_INITIAL", "4")),
+        min_limit=float(os.getenv("PROVIDER_AIMD_MIN", "1")),
+        max_limit=float(os.getenv("PROVIDER_AIMD_MAX", "64")),
+        latency_target=float(os.getenv("PROVIDER_LATENCY_TARGET", "0")),
+        max_limiters=int(os.getenv("PROVIDER_MAX_LIMITERS", "1024")),
+    )
@@ -0,0 +1,410 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger("nano-proxy")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    owner TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    result TEXT NOT NULL,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+
+Recorder = Callable[[int, Dict[str, Any]], Awaitable[None]]
+
+# Client credentials never reach the store, so a job that needs them dies with
+# the process that accepted it instead of quietly running on the server key.
+LOST_SECRETS = "The client API key for this job was held by a server process that stopped; submit the job again"
+
+
+@dataclass
+class Job:
+    id: str
+    request: Dict[str, Any]
+    owner: Optional[str] = None
+    secrets: Dict[str, Optional[str]] = field(default_factory=dict)
+    done: Set[int] = field(default_factory=set)
+
+    @property
+    def pending(self) -> List[int]:
+        return [index for index in range(len(self.request.get("prompts") or [])) if index not in self.done]
+
+
+class JobStore:
+    """SQLite persistence for generation jobs and their per-prompt results.
+
+    A running job holds a lease that its worker renews through :meth:`touch`;
+    once ``updated`` is older than ``lease`` seconds the worker is presumed dead
+    and :meth:`claim` hands the job out again. Finished jobs and their results
+    are deleted by :meth:`purge` after ``retention`` seconds (0 keeps them).
+    """
+
+    def __init__(self, path: str, lease: float = 300.0, retention: float = 0.0) -> None:
+        self.path = path
+        self.lease = lease
+        self.retention = retention
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner" not in columns:  # databases created before jobs could be pinned
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        self._lock = threading.Lock()
+
+    def create(self, request: Dict[str, Any], job_id: Optional[str] = None, owner: Optional[str] = None) -> str:
+        """Queue a job; one with an ``owner`` is only ever claimed by that owner."""
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, request, total, created, updated, owner)"
+                " VALUES (?, 'queued', ?, ?, ?, ?, ?)",
+                (job_id, json.dumps(request), len(request.get("prompts") or []), now, now, owner),
+            )
+        return job_id
+
+    def claim(self, owner: Optional[str] = None) -> Optional[Job]:
+        """Take the oldest queued job, or a running one whose lease has expired."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self._conn.execute(
+                    "SELECT id, request, owner FROM jobs"
+                    " WHERE (status = 'queued' OR (status = 'running' AND updated < ?))"
+                    " AND (owner IS NULL OR owner = ?) ORDER BY created LIMIT 1",
+                    (now - self.lease, owner),
+                ).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                job_id, request, job_owner = row
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'running', updated = ? WHERE id = ?",
+                    (now, job_id),
+                )
+                done = {
+                    index
+                    for (index,) in self._conn.execute("SELECT idx FROM job_results WHERE job_id = ?", (job_id,))
+                }
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return Job(id=job_id, request=json.loads(request), owner=job_owner, done=done)
+
+    def record_result(self, job_id: str, index: int, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_results (job_id, idx, result) VALUES (?, ?, ?)",
+                (job_id, index, json.dumps(result)),
+            )
+            self._conn.execute("UPDATE jobs SET updated = ? WHERE id = ?", (time.time(), job_id))
+
+    def touch(self, job_id: str) -> None:
+        """Renew the lease of a running job."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET updated = ? WHERE id = ? AND status = 'running'",
+                (time.time(), job_id),
+            )
+
+    def finish(self, job_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated = ? WHERE id = ? AND status = 'running'",
+                (status, error, time.time(), job_id),
+            )
+
+    def cancel(self, job_id: str) -> Optional[str]:
+        """Cancel a queued or running job; return its resulting status, or None if unknown."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', updated = ? WHERE id = ? AND status IN ('queued', 'running')",
+                (time.time(), job_id),
+            )
+            row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def requeue(self, job_id: str) -> None:
+        """Hand a running job back to the queue, e.g. when its worker shuts down."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated = ? WHERE id = ? AND status = 'running'",
+                (time.time(), job_id),
+            )
+
+    def abandon(self, owner: Optional[str] = None) -> int:
+        """Fail unfinished jobs pinned to ``owner`` (every owner when None); their keys are gone."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated = ?"
+                " WHERE status IN ('queued', 'running') AND owner IS NOT NULL AND (? IS NULL OR owner = ?)",
+                (LOST_SECRETS, time.time(), owner, owner),
+            )
+        return cursor.rowcount
+
+    def requeue_running(self) -> int:
+        """Put jobs interrupted by a restart back in the queue; finished prompts are kept.
+
+        Pinned jobs cannot resume without their client key and are failed instead.
+        """
+        self.abandon()
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', updated = ? WHERE status = 'running'",
+                (time.time(),),
+            )
+        return cursor.rowcount
+
+    def purge(self) -> int:
+        """Delete finished jobs, and their results, older than the retention period."""
+        if self.retention <= 0:
+            return 0
+        cutoff = time.time() - self.retention
+        finished = "SELECT id FROM jobs WHERE status IN ('completed', 'failed', 'cancelled') AND updated < ?"
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(f"DELETE FROM job_results WHERE job_id IN ({finished})", (cutoff,))
+                cursor = self._conn.execute(f"DELETE FROM jobs WHERE id IN ({finished})", (cutoff,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return cursor.rowcount
+
+    def get(
+        self,
+        job_id: str,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """Job status plus one page of results starting at prompt index ``offset``.
+
+        A page stops after ``limit`` results or once their stored size reaches
+        ``max_bytes``, but always holds at least one result so large images
+        still make progress. ``next_offset`` is None on the last page.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, total, error, created, updated FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            (completed,) = self._conn.execute("SELECT COUNT(*) FROM job_results WHERE job_id = ?", (job_id,)).fetchone()
+            cursor = self._conn.execute(
+                "SELECT idx, result FROM job_results WHERE job_id = ? AND idx >= ? ORDER BY idx",
+                (job_id, offset),
+            )
+            results: List[Dict[str, Any]] = []
+            size = 0
+            next_offset = None
+            for index, result in cursor:
+                over_limit = limit is not None and len(results) >= limit
+                over_bytes = max_bytes is not None and size + len(result) > max_bytes
+                if results and (over_limit or over_bytes):
+                    next_offset = index
+                    break
+                results.append({"index": index, **json.loads(result)})
+                size += len(result)
+            cursor.close()
+        status, total, error, created, updated = row
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": total,
+            "completed": completed,
+            "error": error,
+            "created": created,
+            "updated": updated,
+            "offset": offset,
+            "next_offset": next_offset,
+            "results": results,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class JobQueue:
+    """Worker pool draining a :class:`JobStore`.
+
+    ``processor`` receives a claimed :class:`Job` plus a recorder it must await
+    for every finished prompt. Client-supplied credentials are kept only in
+    memory, so a job submitted with them is pinned to this queue: other
+    processes on the same store never claim it, and it fails when this queue
+    stops. It never falls back to the server key.
+    """
+
+    POLL_INTERVAL = 1.0
+    PURGE_INTERVAL = 600.0
+
+    def __init__(
+        self,
+        store: JobStore,
+        workers: int = 2,
+        requeue_on_start: bool = True,
+        owner: Optional[str] = None,
+    ) -> None:
+        self.store = store
+        self.workers = workers
+        # With several server processes on one store only the supervisor may
+        # requeue at startup, or a new worker would steal its siblings' jobs.
+        self.requeue_on_start = requeue_on_start
+        # server.py assigns the id so it can fail this process's jobs if it dies.
+        self.owner = owner or uuid.uuid4().hex
+        self._secrets: Dict[str, Dict[str, Optional[str]]] = {}
+        self._running: Dict[str, "asyncio.Task[None]"] = {}
+        self._tasks: List["asyncio.Task[None]"] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._last_purge = 0.0
+
+    async def start(self, processor: Callable[[Job, Recorder], Awaitable[None]]) -> None:
+        if self.requeue_on_start:
+            requeued = await asyncio.to_thread(self.store.requeue_running)
+            if requeued:
+                logger.info("Requeued %d interrupted jobs", requeued)
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._worker(processor)) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        abandoned = await asyncio.to_thread(self.store.abandon, self.owner)
+        if abandoned:
+            logger.warning("Failed %d jobs whose client API key dies with this process", abandoned)
+        self._secrets.clear()
+
+    async def submit(self, request: Dict[str, Any], secrets: Dict[str, Optional[str]]) -> str:
+        job_id = uuid.uuid4().hex
+        owner = None
+        if any(secrets.values()):
+            # Secrets must be in place before the row is visible to the workers.
+            self._secrets[job_id] = secrets
+            owner = self.owner
+        await asyncio.to_thread(self.store.create, request, job_id, owner)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def get(
+        self,
+        job_id: str,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self.store.get, job_id, offset, limit, max_bytes)
+
+    async def cancel(self, job_id: str) -> Optional[str]:
+        status = await asyncio.to_thread(self.store.cancel, job_id)
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+        return status
+
+    def stats(self) -> Dict[str, Any]:
+        return {"workers": len(self._tasks), "running": len(self._running)}
+
+    async def _worker(self, processor: Callable[[Job, Recorder], Awaitable[None]]) -> None:
+        assert self._wakeup is not None
+        while True:
+            if time.monotonic() - self._last_purge >= self.PURGE_INTERVAL:
+                self._last_purge = time.monotonic()
+                purged = await asyncio.to_thread(self.store.purge)
+                if purged:
+                    logger.info("Purged %d finished jobs past retention", purged)
+            job = await asyncio.to_thread(self.store.claim, self.owner)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._run(job, processor)
+
+    async def _run(self, job: Job, processor: Callable[[Job, Recorder], Awaitable[None]]) -> None:
+        errors: List[str] = []
+
+        async def record(index: int, result: Dict[str, Any]) -> None:
+            if "error" in result:
+                errors.append(result["error"])
+            job.done.add(index)
+            await asyncio.to_thread(self.store.record_result, job.id, index, result)
+
+        if job.owner is not None and job.id not in self._secrets:
+            await asyncio.to_thread(self.store.finish, job.id, "failed", LOST_SECRETS)
+            return
+        job.secrets = self._secrets.get(job.id, {})
+        task = asyncio.ensure_future(processor(job, record))
+        self._running[job.id] = task
+        try:
+            # asyncio.wait does not raise when the job task is cancelled through
+            # the API, only when this worker itself is being stopped. Waking up
+            # well inside the lease renews it, so a live job is never reclaimed.
+            while not task.done():
+                await asyncio.wait({task}, timeout=self.store.lease / 3)
+                if not task.done():
+                    await asyncio.to_thread(self.store.touch, job.id)
+        except asyncio.CancelledError:
+            # This worker is stopping (shutdown or rolling reload): let another
+            # process pick the job up again; finished prompts are kept.
+            task.cancel()
+            await asyncio.to_thread(self.store.requeue, job.id)
+            raise
+        finally:
+            self._running.pop(job.id, None)
+        if task.cancelled():
+            self._secrets.pop(job.id, None)
+            return
+        exc = task.exception()
+        if exc is not None:
+            logger.warning("Job %s failed: %s", job.id, exc)
+            await asyncio.to_thread(self.store.finish, job.id, "failed", str(exc))
+        elif errors and len(errors) == len(job.request.get("prompts") or []):
+            await asyncio.to_thread(self.store.finish, job.id, "failed", errors[0])
+        else:
+            await asyncio.to_thread(self.store.finish, job.id, "completed")
+        self._secrets.pop(job.id, None)
+
+
+def load_job_queue() -> JobQueue:
+    return JobQueue(
+        JobStore(
+            os.getenv("JOB_DB_PATH", "/tmp/nano-jobs.sqlite3"),
+            lease=max(1.0, float(os.getenv("JOB_LEASE_SECONDS", "300"))),
+            retention=float(os.getenv("JOB_RETENTION_DAYS", "7")) * 86400,
+        ),
+        workers=max(1, int(os.getenv("JOB_WORKERS", "2"))),
+        requeue_on_start=os.getenv("JOB_REQUEUE_ON_START", "true").lower() in {"1", "true", "yes"},
+        owner=os.getenv("JOB_OWNER") or None,
+    )
@@ -0,0 +1,237 @@
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+BYTES_BUCKETS = (1024, 16 * 1024, 128 * 1024, 512 * 1024, 1024**2, 4 * 1024**2, 16 * 1024**2, 64 * 1024**2)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+        # Per label set: non-cumulative bucket counts (last slot is +Inf), sum, count.
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = ([0] * (len(self.buckets) + 1), [0.0])
+                self._values[key] = entry
+            entry[0][slot] += 1
+            entry[1][0] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        entry = self._values.get(self._key(labels))
+        return sum(entry[0]) if entry else 0
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(counts), total[0]) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {cumulative}")
+        return lines
+
+
+REGISTRY: List[_Metric] = []
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Models and styles come from client headers (X-Model, X-Base-Url); anything not
+# listed here is reported as "other" so label cardinality stays bounded.
+KNOWN_MODELS = frozenset(
+    {
+        "imagen-4.0-generate-001",
+        "imagen-4.0-fast-generate-001",
+        "imagen-4.0-ultra-generate-001",
+        "imagen-3.0-generate-002",
+        "gemini-2.5-flash-image",
+        "gemini-2.5-flash-image-preview",
+        "gemini-2.0-flash-preview-image-generation",
+    }
+    | {os.getenv("GOOGLE_AI_STUDIO_MODEL", "imagen-4.0-fast-generate-001").strip()}
+    | {model.strip() for model in os.getenv("METRICS_MODELS", "").split(",") if model.strip()}
+)
+KNOWN_STYLES = frozenset({"predict", "generateContent", "generateImages"})
+
+
+def endpoint_labels(endpoint: str) -> Dict[str, str]:
+    """Split a build_endpoint URL into model and endpoint-style labels."""
+    model, _, style = endpoint.rsplit("/models/", 1)[-1].partition(":")
+    return {
+        "model": model if model in KNOWN_MODELS else "other",
+        "style": style if style in KNOWN_STYLES else ("unknown" if not style else "other"),
+    }
+
+
+http_request_seconds = Histogram(
+    "nano_http_request_duration_seconds",
+    "Proxy request latency by route, method and status.",
+    ("route", "method", "status"),
+)
+http_response_bytes = Histogram(
+    "nano_http_response_bytes",
+    "Response payload size by route (buffered responses only).",
+    ("route",),
+    buckets=BYTES_BUCKETS,
+)
+provider_request_seconds = Histogram(
+    "nano_provider_request_duration_seconds",
+    "Provider round-trip latency including retries, by model and endpoint style.",
+    ("model", "style", "status"),
+)
+provider_parse_seconds = Histogram(
+    "nano_provider_parse_duration_seconds",
+    "Time spent parsing provider responses and encoding image entries.",
+    ("style",),
+)
+provider_in_flight = Gauge(
+    "nano_provider_in_flight",
+    "Provider calls currently awaiting a response.",
+    ("model", "style"),
+)
+placeholder_fallbacks = Counter(
+    "nano_placeholder_fallbacks_total",
+    "Placeholder images served instead of provider output, by reason.",
+    ("reason",),
+)
+rate_limit_rejections = Counter(
+    "nano_rate_limit_rejections_total",
+    "Requests rejected by the rate limiter, by limit scope.",
+    ("scope",),
+)
+scheduler_wait_seconds = Histogram(
+    "nano_scheduler_wait_seconds",
+    "Time a provider call waited for a scheduler slot, by priority class.",
+    ("priority",),
+)
+scheduler_queued = Gauge(
+    "nano_scheduler_queued",
+    "Provider calls waiting for a scheduler slot, by priority class.",
+    ("priority",),
+)
+scheduler_rejections = Counter(
+    "nano_scheduler_rejections_total",
+    "Requests refused with 503 because the scheduler queue was full, by priority and limit.",
+    ("priority", "limit"),
+)
+prefetch_events = Counter(
+    "nano_prefetch_events_total",
+    "Speculative generations by outcome: generated, failed, or served to a request.",
+    ("event",),
+)
+memory_budget_in_use = Gauge(
+    "nano_memory_budget_in_use_bytes",
+    "Estimated response bytes currently reserved against MEMORY_BUDGET_MB.",
+)
+memory_budget_decisions = Counter(
+    "nano_memory_budget_decisions_total",
+    "Generate requests downgraded or refused by the memory budget, by decision.",
+    ("decision",),
+)
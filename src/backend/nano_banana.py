@@ -1,12 +1,46 @@
+import asyncio
 import base64
+import functools
+import hashlib
+import json
 import math
 import os
+import re
+import threading
 import time
+import weakref
+from collections import OrderedDict, defaultdict
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
-from urllib.parse import urlencode
+from typing import Any, Coroutine, Dict, Iterator, List, Optional, Set, Tuple, TypeVar
+from urllib.parse import urlencode, urlsplit
 
-import requests
+import httpx
+
+try:
+    import h2  # noqa: F401  (enables httpx HTTP/2 support)
+
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    from .breaker import CircuitBreaker, load_breakers
+    from .governor import load_governor
+    from .metrics import endpoint_labels, placeholder_fallbacks, provider_in_flight, provider_parse_seconds
+    from .metrics import provider_request_seconds
+except ImportError:
+    from breaker import CircuitBreaker, load_breakers
+    from governor import load_governor
+    from metrics import endpoint_labels, placeholder_fallbacks, provider_in_flight, provider_parse_seconds
+    from metrics import provider_request_seconds
+
+
+PLACEHOLDER_MIME = "image/svg+xml"
+
+T = TypeVar("T")
+
+governor = load_governor()
+breakers = load_breakers()
 
 
 def _xml_escape(value: str) -> str:
@@ -27,6 +61,11 @@ class ProviderConfig:
     timeout: int
     use_mock: bool
     placeholder_on_error: bool
+    pool_size: int = 20
+    connect_timeout: float = 10.0
+    keepalive_expiry: float = 30.0
+    http2: bool = True
+    max_pools: int = 8
 
 
 def _normalize_base_model_action(
@@ -81,8 +120,7 @@ def build_status_endpoint(config: ProviderConfig, override_base_url: Optional[st
     return f"{base_url}/models"
 
 
-def _derive_aspect_ratio(size: Optional[str]) -> Optional[str]:
-    """Convert size strings like 1600x900 into aspect ratio format expected by the API."""
+def parse_size(size: Optional[str]) -> Optional[Tuple[int, int]]:
     if not size:
         return None
     cleaned = size.lower().replace(" ", "")
@@ -96,13 +134,27 @@ def _derive_aspect_ratio(size: Optional[str]) -> Optional[str]:
         return None
     if width <= 0 or height <= 0:
         return None
+    return width, height
+
+
+def _derive_aspect_ratio(size: Optional[str]) -> Optional[str]:
+    """Convert size strings like 1600x900 into aspect ratio format expected by the API."""
+    parsed = parse_size(size)
+    if not parsed:
+        return None
+    width, height = parsed
     divisor = math.gcd(width, height) or 1
     return f"{width // divisor}:{height // divisor}"
 
 
-def make_placeholder_svg(prompt: str, width: int = 1024, height: int = 768) -> bytes:
-    safe_prompt = _xml_escape(prompt[:120])
-    timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+_PROMPT_SLOT = "\x00prompt\x00"
+_STAMP_SLOT = "\x00stamp\x00"
+PLACEHOLDER_CACHE_SIZE = 256
+
+
+@functools.lru_cache(maxsize=32)
+def _placeholder_frame(width: int, height: int) -> Tuple[bytes, bytes, bytes]:
+    """Render the static SVG around the prompt and timestamp slots once per size."""
     svg = f"""<svg xmlns=\"http://www.w3.org/2000/svg\" width=\"{width}\" height=\"{height}\">
 <defs>
   <linearGradient id=\"bg\" x1=\"0\" x2=\"1\" y1=\"0\" y2=\"1\">
@@ -114,11 +166,37 @@ def make_placeholder_svg(prompt: str, width: int = 1024, height: int = 768) -> b
 <rect x=\"60\" y=\"60\" width=\"{width - 120}\" height=\"{height - 120}\" rx=\"28\" fill=\"rgba(255,255,255,0.08)\" stroke=\"rgba(255,255,255,0.35)\"/>
 <text x=\"90\" y=\"150\" fill=\"#f6f6f6\" font-size=\"36\" font-family=\"'Avenir Next', 'Helvetica Neue', sans-serif\">Nano Banana Proxy</text>
 <text x=\"90\" y=\"210\" fill=\"#fbd38d\" font-size=\"20\" font-family=\"'Avenir Next', 'Helvetica Neue', sans-serif\">Prompt Preview</text>
-<text x=\"90\" y=\"260\" fill=\"#f6f6f6\" font-size=\"18\" font-family=\"'Avenir Next', 'Helvetica Neue', sans-serif\">{safe_prompt}</text>
-<text x=\"90\" y=\"{height - 110}\" fill=\"#9ae6b4\" font-size=\"14\" font-family=\"'Avenir Next', 'Helvetica Neue', sans-serif\">Generated locally at {timestamp}</text>
+<text x=\"90\" y=\"260\" fill=\"#f6f6f6\" font-size=\"18\" font-family=\"'Avenir Next', 'Helvetica Neue', sans-serif\">{_PROMPT_SLOT}</text>
+<text x=\"90\" y=\"{height - 110}\" fill=\"#9ae6b4\" font-size=\"14\" font-family=\"'Avenir Next', 'Helvetica Neue', sans-serif\">Generated locally at {_STAMP_SLOT}</text>
 </svg>
 """
-    return svg.encode("utf-8")
+    head, _, rest = svg.partition(_PROMPT_SLOT)
+    middle, _, tail = rest.partition(_STAMP_SLOT)
+    return head.encode("utf-8"), middle.encode("utf-8"), tail.encode("utf-8")
+
+
+def make_placeholder_svg(
+    prompt: str,
+    width: int = 1024,
+    height: int = 768,
+    timestamp: Optional[str] = None,
+) -> bytes:
+    head, middle, tail = _placeholder_frame(width, height)
+    stamp = timestamp or time.strftime("%Y-%m-%d %H:%M:%S")
+    return b"".join((head, _xml_escape(prompt[:120]).encode("utf-8"), middle, stamp.encode("utf-8"), tail))
+
+
+@functools.lru_cache(maxsize=PLACEHOLDER_CACHE_SIZE)
+def _placeholder_b64(prompt: str, width: int, height: int, stamp: str) -> str:
+    return encode_base64(make_placeholder_svg(prompt, width, height, stamp))
+
+
+def _placeholder_dimensions(size: Optional[str]) -> Tuple[int, int]:
+    parsed = parse_size(size)
+    if not parsed:
+        return 1024, 768
+    width, height = parsed
+    return max(320, min(width, 4096)), max(240, min(height, 4096))
 
 
 def encode_base64(data: bytes) -> str:
@@ -134,46 +212,60 @@ def normalize_return_type(value: Optional[str]) -> str:
     return value
 
 
-def generate_images(
+@dataclass
+class ProviderRequest:
+    endpoint: str
+    headers: Dict[str, str]
+    payload: Dict[str, Any]
+    use_generate_content: bool
+    use_predict: bool
+
+
+def _image_entry(index: int, mime: str, b64: str, return_type: str) -> Dict[str, Any]:
+    if return_type == "url":
+        return {
+            "index": index,
+            "type": "url",
+            "mime": mime,
+            "url": f"data:{mime};base64,{b64}",
+        }
+    return {
+        "index": index,
+        "type": "base64",
+        "mime": mime,
+        "data": b64,
+    }
+
+
+def placeholder_images(
+    prompt: str,
+    count: int,
+    return_type: str,
+    size: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Placeholder images for one prompt; every index shares one cached base64 blob.
+
+    Cached renders are stamped to the minute so the LRU stays useful during an
+    outage while the footer still shows roughly when the fallback happened.
+    """
+    width, height = _placeholder_dimensions(size)
+    b64 = _placeholder_b64(prompt[:120], width, height, time.strftime("%Y-%m-%d %H:%M"))
+    entry = _image_entry(0, PLACEHOLDER_MIME, b64, return_type)
+    return [{**entry, "index": index} for index in range(count)]
+
+
+def build_provider_request(
     prompt: str,
     negative_prompt: Optional[str],
     count: int,
     config: ProviderConfig,
-    return_type: Optional[str] = None,
+    api_key: str,
     size: Optional[str] = None,
-    override_api_key: Optional[str] = None,
     override_base_url: Optional[str] = None,
     override_model: Optional[str] = None,
-) -> List[Dict[str, Any]]:
-    return_type = normalize_return_type(return_type)
-    api_key = override_api_key or config.api_key
+) -> ProviderRequest:
+    """Build the endpoint, headers and JSON payload for one provider call."""
     aspect_ratio = _derive_aspect_ratio(size)
-
-    if config.use_mock or not api_key:
-        images = []
-        for index in range(count):
-            svg_bytes = make_placeholder_svg(prompt)
-            b64 = encode_base64(svg_bytes)
-            if return_type == "url":
-                images.append(
-                    {
-                        "index": index,
-                        "type": "url",
-                        "mime": "image/svg+xml",
-                        "url": f"data:image/svg+xml;base64,{b64}",
-                    }
-                )
-            else:
-                images.append(
-                    {
-                        "index": index,
-                        "type": "base64",
-                        "mime": "image/svg+xml",
-                        "data": b64,
-                    }
-                )
-        return images
-
     endpoint = build_endpoint(config, override_base_url, override_model)
     headers = {
         "Content-Type": "application/json",
@@ -221,132 +313,271 @@ def generate_images(
         if negative_prompt:
             payload["negativePrompt"] = {"text": negative_prompt}
 
-    response = requests.post(endpoint, headers=headers, json=payload, timeout=config.timeout)
-    response.raise_for_status()
-    data = response.json()
+    return ProviderRequest(
+        endpoint=endpoint,
+        headers=headers,
+        payload=payload,
+        use_generate_content=use_generate_content,
+        use_predict=use_predict,
+    )
 
-    images = []
-    if use_generate_content:
-        candidates = data.get("candidates") or []
-        for index, candidate in enumerate(candidates):
-            content = candidate.get("content") or {}
-            parts = content.get("parts") or []
-            for part in parts:
+
+def generation_cache_key(provider_request: ProviderRequest, return_type: Optional[str] = None) -> str:
+    """Content hash of a provider call; the API key header is deliberately excluded."""
+    material = {
+        "endpoint": provider_request.endpoint,
+        "payload": provider_request.payload,
+        "return_type": normalize_return_type(return_type),
+    }
+    encoded = json.dumps(material, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+def is_placeholder_result(images: List[Dict[str, Any]]) -> bool:
+    # Placeholders are the only SVG images the proxy ever emits.
+    return not images or all(image.get("mime") == PLACEHOLDER_MIME for image in images)
+
+
+# Matches the string value of any inline-image field. The value group is a plain
+# run of bytes so multi-megabyte base64 is located without building a JSON tree.
+_INLINE_PAYLOAD = re.compile(rb'"(?:data|bytesBase64Encoded|base64)"\s*:\s*"([^"\\]*(?:\\.[^"\\]*)*)"')
+_SPAN_MARKER = "\x00"
+_SPAN_MIN_BYTES = 256
+
+
+def _split_inline_spans(body: bytes) -> Tuple[Any, List[Tuple[int, int]]]:
+    """Parse a provider body with large inline payloads replaced by span markers.
+
+    Returns the small JSON skeleton plus the (start, end) offsets of every
+    payload, so the base64 itself is never copied into the decoded tree.
+    """
+    view = memoryview(body)
+    pieces: List[Any] = []
+    spans: List[Tuple[int, int]] = []
+    cursor = 0
+    for match in _INLINE_PAYLOAD.finditer(body):
+        start, end = match.span(1)
+        if end - start < _SPAN_MIN_BYTES:
+            continue
+        pieces.append(view[cursor:start])
+        pieces.append(b"\\u0000%d" % len(spans))
+        spans.append((start, end))
+        cursor = end
+    pieces.append(view[cursor:])
+    return json.loads(b"".join(pieces)), spans
+
+
+def _provider_image_fields(data: Any, provider_request: ProviderRequest) -> Iterator[Tuple[int, Any, Optional[str]]]:
+    """Yield (index, payload, mime) for each image slot in any of the three response shapes."""
+    if not isinstance(data, dict):
+        return
+    if provider_request.use_generate_content:
+        for index, candidate in enumerate(data.get("candidates") or []):
+            for part in (candidate.get("content") or {}).get("parts") or []:
                 inline = part.get("inlineData") or {}
-                b64 = inline.get("data")
-                if not b64:
-                    continue
-                mime = inline.get("mimeType") or "image/png"
-                if return_type == "url":
-                    images.append(
-                        {
-                            "index": index,
-                            "type": "url",
-                            "mime": mime,
-                            "url": f"data:{mime};base64,{b64}",
-                        }
-                    )
-                else:
-                    images.append(
-                        {
-                            "index": index,
-                            "type": "base64",
-                            "mime": mime,
-                            "data": b64,
-                        }
-                    )
-    elif use_predict:
-        predictions = data.get("predictions") or []
-        for index, prediction in enumerate(predictions):
+                yield index, inline.get("data"), inline.get("mimeType")
+    elif provider_request.use_predict:
+        for index, prediction in enumerate(data.get("predictions") or []):
             b64 = (
                 prediction.get("bytesBase64Encoded")
                 or prediction.get("base64")
                 or prediction.get("data")
                 or (prediction.get("image") or {}).get("bytesBase64Encoded")
             )
-            if not b64:
-                continue
-            mime = prediction.get("mimeType") or prediction.get("mime_type") or "image/png"
-            if return_type == "url":
-                images.append(
-                    {
-                        "index": index,
-                        "type": "url",
-                        "mime": mime,
-                        "url": f"data:{mime};base64,{b64}",
-                    }
-                )
-            else:
-                images.append(
-                    {
-                        "index": index,
-                        "type": "base64",
-                        "mime": mime,
-                        "data": b64,
-                    }
-                )
+            yield index, b64, prediction.get("mimeType") or prediction.get("mime_type")
     else:
-        generated = data.get("generatedImages") or data.get("images") or []
-        for index, item in enumerate(generated):
-            b64 = (
-                item.get("bytesBase64Encoded")
-                or item.get("base64")
-                or item.get("data")
-            )
-            if not b64:
-                continue
-            if return_type == "url":
-                images.append(
-                    {
-                        "index": index,
-                        "type": "url",
-                        "mime": "image/png",
-                        "url": f"data:image/png;base64,{b64}",
-                    }
-                )
+        for index, item in enumerate(data.get("generatedImages") or data.get("images") or []):
+            yield index, item.get("bytesBase64Encoded") or item.get("base64") or item.get("data"), None
+
+
+def iter_inline_images(body: bytes, provider_request: ProviderRequest) -> Iterator[Tuple[int, str, memoryview]]:
+    """Yield (index, mime, base64 view) straight from a raw provider response body.
+
+    The views alias ``body``; callers that only need the decoded bytes (blob
+    store, CLI) can pass them to ``base64.b64decode`` without a str copy.
+    """
+    data, spans = _split_inline_spans(body)
+    view = memoryview(body)
+    for index, value, mime in _provider_image_fields(data, provider_request):
+        if not value or not isinstance(value, str):
+            continue
+        if value.startswith(_SPAN_MARKER):
+            start, end = spans[int(value[1:])]
+            if body.find(b"\\", start, end) != -1:
+                # Escaped content (e.g. "\/") is rare; let the JSON decoder unescape it.
+                payload = memoryview(json.loads(b'"' + body[start:end] + b'"').encode("ascii"))
             else:
-                images.append(
-                    {
-                        "index": index,
-                        "type": "base64",
-                        "mime": "image/png",
-                        "data": b64,
-                    }
-                )
+                payload = view[start:end]
+        else:
+            payload = memoryview(value.encode("ascii"))
+        yield index, mime or "image/png", payload
+
+
+def parse_images(
+    body: bytes,
+    provider_request: ProviderRequest,
+    prompt: str,
+    count: int,
+    config: ProviderConfig,
+    return_type: str,
+    size: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Turn a raw provider response body into the proxy image list."""
+    with provider_parse_seconds.time(style=endpoint_labels(provider_request.endpoint)["style"]):
+        images = [
+            _image_entry(index, mime, str(payload, "ascii"), return_type)
+            for index, mime, payload in iter_inline_images(body, provider_request)
+        ]
 
     if not images:
         if not config.placeholder_on_error:
             raise RuntimeError("Provider returned no images")
         # Graceful placeholder if provider returns no inline data and placeholder mode is allowed
-        for index in range(count):
-            svg_bytes = make_placeholder_svg(prompt)
-            b64 = encode_base64(svg_bytes)
-            if return_type == "url":
-                images.append(
-                    {
-                        "index": index,
-                        "type": "url",
-                        "mime": "image/svg+xml",
-                        "url": f"data:image/svg+xml;base64,{b64}",
-                    }
-                )
-            else:
-                images.append(
-                    {
-                        "index": index,
-                        "type": "base64",
-                        "mime": "image/svg+xml",
-                        "data": b64,
-                    }
-                )
+        placeholder_fallbacks.inc(reason="empty_response")
+        images = placeholder_images(prompt, count, return_type, size)
 
     return images
 
 
+def _record_breaker(breaker: CircuitBreaker, status_code: int) -> None:
+    # Only server-side failures say the endpoint is unhealthy; 4xx (bad key,
+    # quota) is the caller's problem and is handled by the governor.
+    if status_code >= 500:
+        breaker.on_failure()
+    else:
+        breaker.on_success()
+
+
+def generate_images(
+    prompt: str,
+    negative_prompt: Optional[str],
+    count: int,
+    config: ProviderConfig,
+    return_type: Optional[str] = None,
+    size: Optional[str] = None,
+    override_api_key: Optional[str] = None,
+    override_base_url: Optional[str] = None,
+    override_model: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """Blocking variant of :func:`generate_images_async` for scripts and threads.
+
+    Runs the async implementation on a shared background loop so retries,
+    AIMD queueing, breakers and metrics behave exactly as in the server.
+    """
+    return _run_blocking(
+        generate_images_async(
+            prompt,
+            negative_prompt,
+            count,
+            config,
+            return_type=return_type,
+            size=size,
+            override_api_key=override_api_key,
+            override_base_url=override_base_url,
+            override_model=override_model,
+        )
+    )
+
+
+async def generate_images_async(
+    prompt: str,
+    negative_prompt: Optional[str],
+    count: int,
+    config: ProviderConfig,
+    return_type: Optional[str] = None,
+    size: Optional[str] = None,
+    override_api_key: Optional[str] = None,
+    override_base_url: Optional[str] = None,
+    override_model: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    return_type = normalize_return_type(return_type)
+    api_key = override_api_key or config.api_key
+
+    if config.use_mock or not api_key:
+        placeholder_fallbacks.inc(reason="mock" if config.use_mock else "no_api_key")
+        return placeholder_images(prompt, count, return_type, size)
+
+    provider_request = build_provider_request(
+        prompt,
+        negative_prompt,
+        count,
+        config,
+        api_key,
+        size=size,
+        override_base_url=override_base_url,
+        override_model=override_model,
+    )
+    body = await fetch_provider_body(provider_request, config, api_key)
+    return parse_images(body, provider_request, prompt, count, config, return_type, size)
+
+
+async def fetch_provider_body(provider_request: ProviderRequest, config: ProviderConfig, api_key: str) -> bytes:
+    """Send one provider call through the breaker and governor; return the raw response body.
+
+    Raises for HTTP errors. Callers that write images somewhere other than a
+    response (the bulk CLI) pair this with :func:`iter_inline_images`.
+    """
+    client = get_async_client(config, provider_request.endpoint)
+    breaker = breakers.get(provider_request.endpoint)
+    # Raises CircuitOpenError in microseconds while the endpoint is known to be down.
+    breaker.before_call()
+    labels = endpoint_labels(provider_request.endpoint)
+    status = "error"
+    start = time.perf_counter()
+    try:
+        with provider_in_flight.track(**labels):
+            response = await governor.call(
+                provider_request.endpoint,
+                api_key,
+                lambda: client.post(
+                    provider_request.endpoint,
+                    headers=provider_request.headers,
+                    json=provider_request.payload,
+                ),
+            )
+        status = str(response.status_code)
+    except httpx.TransportError:
+        breaker.on_failure()
+        raise
+    except BaseException:
+        status = "abandoned"
+        breaker.on_abandon()
+        raise
+    finally:
+        provider_request_seconds.observe(time.perf_counter() - start, status=status, **labels)
+    _record_breaker(breaker, response.status_code)
+    response.raise_for_status()
+    return response.content
+
+
+def _key_status_from_response(status_code: int, text: str, payload: Any) -> Dict[str, Any]:
+    if status_code != 200:
+        return {
+            "ok": False,
+            "status": status_code,
+            "message": text[:300],
+        }
+    models = (payload or {}).get("models") or []
+    return {
+        "ok": True,
+        "status": status_code,
+        "models": [model.get("name") for model in models if isinstance(model, dict)],
+    }
+
+
 def validate_key(
     config: ProviderConfig,
     override_api_key: Optional[str] = None,
     override_base_url: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Blocking variant of :func:`validate_key_async`."""
+    return _run_blocking(validate_key_async(config, override_api_key, override_base_url))
+
+
+async def validate_key_async(
+    config: ProviderConfig,
+    override_api_key: Optional[str] = None,
+    override_base_url: Optional[str] = None,
 ) -> Dict[str, Any]:
     api_key = override_api_key or config.api_key
     if config.use_mock:
@@ -358,21 +589,154 @@ def validate_key(
     params = {"key": api_key}
     headers = {"x-goog-api-key": api_key}
 
-    response = requests.get(f"{endpoint}?{urlencode(params)}", headers=headers, timeout=config.timeout)
-    if response.status_code != 200:
-        return {
-            "ok": False,
-            "status": response.status_code,
-            "message": response.text[:300],
-        }
+    client = get_async_client(config, endpoint)
+    response = await client.get(f"{endpoint}?{urlencode(params)}", headers=headers)
+    payload = response.json() if response.status_code == 200 else None
+    return _key_status_from_response(response.status_code, response.text, payload)
+
+
+def _pool_origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def _client_timeout(config: ProviderConfig) -> httpx.Timeout:
+    return httpx.Timeout(config.timeout, connect=min(config.connect_timeout, config.timeout))
+
+
+# Pools are keyed by origin so X-Base-Url overrides get their own keep-alive
+# connections. Async clients are additionally kept per event loop because httpx
+# connections are bound to the loop that opened them. Origins come from client
+# headers, so each loop keeps at most ``max_pools`` of them, least recently used
+# first out; the configured origin is never evicted.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, OrderedDict[str, httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+# Evicted clients awaiting close, so shutdown can still reach them.
+_retired_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Set[httpx.AsyncClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+_pool_requests: Dict[str, int] = defaultdict(int)
+_pool_http2: Dict[str, bool] = {}
+
+# The blocking entry points share one long-lived loop so their pooled
+# connections survive between calls.
+_blocking_loop: Optional[asyncio.AbstractEventLoop] = None
+_blocking_lock = threading.Lock()
+
+
+def _run_blocking(coro: Coroutine[Any, Any, T]) -> T:
+    global _blocking_loop
+    with _blocking_lock:
+        if _blocking_loop is None or _blocking_loop.is_closed():
+            _blocking_loop = asyncio.new_event_loop()
+            threading.Thread(target=_blocking_loop.run_forever, name="nano-blocking", daemon=True).start()
+        loop = _blocking_loop
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def close_blocking_clients() -> None:
+    """Close the pools used by the blocking entry points and stop their loop."""
+    global _blocking_loop
+    with _blocking_lock:
+        loop, _blocking_loop = _blocking_loop, None
+    if loop is None or loop.is_closed():
+        return
+    asyncio.run_coroutine_threadsafe(close_async_clients(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def get_async_client(config: ProviderConfig, url: Optional[str] = None) -> httpx.AsyncClient:
+    origin = _pool_origin(url or config.base_url)
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.setdefault(loop, OrderedDict())
+    client = clients.get(origin)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=_client_timeout(config),
+            limits=httpx.Limits(
+                max_connections=config.pool_size,
+                max_keepalive_connections=config.pool_size,
+                keepalive_expiry=config.keepalive_expiry,
+            ),
+            http2=config.http2 and HTTP2_AVAILABLE,
+        )
+        clients[origin] = client
+        _pool_http2[origin] = config.http2 and HTTP2_AVAILABLE
+        _evict_clients(loop, clients, config)
+    clients.move_to_end(origin)
+    _pool_requests[f"async {origin}"] += 1
+    return client
+
+
+def _evict_clients(
+    loop: asyncio.AbstractEventLoop,
+    clients: "OrderedDict[str, httpx.AsyncClient]",
+    config: ProviderConfig,
+) -> None:
+    pinned = _pool_origin(config.base_url)
+    excess = len(clients) - max(1, config.max_pools)
+    for origin in [origin for origin in clients if origin != pinned][: max(0, excess)]:
+        client = clients.pop(origin)
+        _pool_requests.pop(f"async {origin}", None)
+        _pool_http2.pop(origin, None)
+        retired = _retired_clients.setdefault(loop, set())
+        retired.add(client)
+        # Requests already running on the evicted client get one timeout to finish.
+        loop.call_later(config.timeout, lambda client=client: loop.create_task(_retire(loop, client)))
 
-    payload = response.json()
-    models = payload.get("models") or []
-    return {
-        "ok": True,
-        "status": response.status_code,
-        "models": [model.get("name") for model in models if isinstance(model, dict)],
-    }
+
+async def _retire(loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient) -> None:
+    _retired_clients.get(loop, set()).discard(client)
+    await client.aclose()
+
+
+WARM_PLACEHOLDER_SIZES = (None, "1024x1024", "1600x900", "900x1600", "1080x1350")
+
+
+async def warm_up(config: ProviderConfig) -> None:
+    """Open the provider connection and prime placeholder frames before serving traffic.
+
+    The keyless models request is expected to be rejected; it only exists to
+    finish DNS, TCP and TLS (and HTTP/2 negotiation) ahead of the first user.
+    """
+    for size in WARM_PLACEHOLDER_SIZES:
+        _placeholder_frame(*_placeholder_dimensions(size))
+    if config.use_mock:
+        return
+    endpoint = build_status_endpoint(config)
+    try:
+        await get_async_client(config, endpoint).get(endpoint, timeout=min(5.0, config.connect_timeout))
+    except httpx.HTTPError:
+        pass
+
+
+async def close_async_clients() -> None:
+    loop = asyncio.get_running_loop()
+    clients = list(_async_clients.pop(loop, {}).values()) + list(_retired_clients.pop(loop, set()))
+    for client in clients:
+        await client.aclose()
+
+
+def pool_stats() -> List[Dict[str, Any]]:
+    """Summarize the shared HTTP pools for health and metrics endpoints."""
+    stats: List[Dict[str, Any]] = []
+    for clients in list(_async_clients.values()):
+        for origin, client in clients.items():
+            # httpx does not expose its pool publicly; read it defensively.
+            pool = getattr(getattr(client, "_transport", None), "_pool", None)
+            open_connections = len(getattr(pool, "connections", []) or [])
+            stats.append(
+                {
+                    "kind": "async",
+                    "origin": origin,
+                    "requests": _pool_requests[f"async {origin}"],
+                    "open_connections": open_connections,
+                    "http2": _pool_http2.get(origin, False),
+                    "closed": client.is_closed,
+                }
+            )
+    return stats
 
 
 def load_config() -> ProviderConfig:
@@ -386,4 +750,9 @@ def load_config() -> ProviderConfig:
         timeout=int(os.getenv("GOOGLE_AI_STUDIO_TIMEOUT", "30")),
         use_mock=os.getenv("USE_MOCK", "false").lower() in {"1", "true", "yes"},
         placeholder_on_error=os.getenv("USE_PLACEHOLDER_ON_ERROR", "false").lower() in {"1", "true", "yes"},
+        pool_size=max(1, int(os.getenv("GOOGLE_AI_STUDIO_POOL_SIZE", "20"))),
+        connect_timeout=float(os.getenv("GOOGLE_AI_STUDIO_CONNECT_TIMEOUT", "10")),
+        keepalive_expiry=float(os.getenv("GOOGLE_AI_STUDIO_KEEPALIVE_EXPIRY", "30")),
+        http2=os.getenv("GOOGLE_AI_STUDIO_HTTP2", "true").lower() in {"1", "true", "yes"},
+        max_pools=max(1, int(os.getenv("GOOGLE_AI_STUDIO_MAX_POOLS", "8"))),
     )
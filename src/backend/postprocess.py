@@ -0,0 +1,239 @@
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional: post-processing requests are refused without Pillow
+    Image = None
+    ImageOps = None
+
+try:
+    from .cache import ResultCache
+    from .nano_banana import parse_size
+except ImportError:
+    from cache import ResultCache
+    from nano_banana import parse_size
+
+logger = logging.getLogger("nano-proxy")
+
+FORMATS = {
+    "jpeg": ("JPEG", "image/jpeg"),
+    "webp": ("WEBP", "image/webp"),
+    "avif": ("AVIF", "image/avif"),
+    "png": ("PNG", "image/png"),
+}
+FORMAT_ALIASES = {"jpg": "jpeg"}
+MAX_DIMENSION = 4096
+
+
+@dataclass(frozen=True)
+class ProcessOptions:
+    width: Optional[int] = None
+    height: Optional[int] = None
+    format: Optional[str] = None
+    quality: int = 80
+    thumbnail: Optional[int] = None
+
+    @property
+    def active(self) -> bool:
+        return bool((self.width and self.height) or self.format or self.thumbnail)
+
+    def key(self) -> str:
+        return f"{self.width}x{self.height}:{self.format}:{self.quality}:{self.thumbnail}"
+
+
+def make_options(
+    size: Optional[str],
+    resize: bool,
+    output_format: Optional[str],
+    quality: Optional[int],
+    thumbnail: Optional[int],
+) -> ProcessOptions:
+    """Validate client options; raise ValueError for an unknown format."""
+    fmt = (output_format or "").strip().lower() or None
+    fmt = FORMAT_ALIASES.get(fmt or "", fmt)
+    if fmt is not None and fmt not in FORMATS:
+        raise ValueError(f"Unsupported format {output_format!r}; use one of {', '.join(sorted(FORMATS))}")
+    parsed = parse_size(size) if resize else None
+    if resize and parsed is None:
+        raise ValueError("resize needs a size like 1600x900")
+    if parsed and max(parsed) > MAX_DIMENSION:
+        raise ValueError(f"resize is limited to {MAX_DIMENSION}px per side")
+    width, height = parsed or (None, None)
+    return ProcessOptions(
+        width=width,
+        height=height,
+        format=fmt,
+        quality=max(1, min(int(quality or 80), 100)),
+        thumbnail=max(16, min(int(thumbnail), 1024)) if thumbnail else None,
+    )
+
+
+def _encode(image: Any, fmt: str, quality: int) -> bytes:
+    pil_format, _ = FORMATS[fmt]
+    if pil_format == "JPEG" and image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    params: Dict[str, Any] = {} if pil_format == "PNG" else {"quality": quality}
+    if pil_format == "JPEG":
+        params["optimize"] = True
+    image.save(buffer, pil_format, **params)
+    return buffer.getvalue()
+
+
+def process_image(b64: str, mime: str, options: ProcessOptions) -> Tuple[str, str, Optional[Tuple[str, str]]]:
+    """Worker-process entry point: return (base64, mime, optional (thumb base64, thumb mime)).
+
+    Takes and returns base64 so decoding and encoding also stay off the event loop.
+    """
+    image = Image.open(io.BytesIO(base64.b64decode(b64)))
+    image.load()
+    fmt = options.format or next((name for name, (_, kind) in FORMATS.items() if kind == mime), "png")
+    _, out_mime = FORMATS[fmt]
+    if options.width and options.height and image.size != (options.width, options.height):
+        # Cover-crop rather than stretch: the provider only honours aspect ratio approximately.
+        image = ImageOps.fit(image, (options.width, options.height), Image.LANCZOS)
+        changed = True
+    else:
+        changed = options.format is not None and out_mime != mime
+    data = base64.b64encode(_encode(image, fmt, options.quality)).decode("ascii") if changed else b64
+    thumb = None
+    if options.thumbnail:
+        small = image.copy()
+        small.thumbnail((options.thumbnail, options.thumbnail), Image.LANCZOS)
+        thumb_fmt = options.format or "jpeg"
+        thumb_b64 = base64.b64encode(_encode(small, thumb_fmt, options.quality)).decode("ascii")
+        thumb = (thumb_b64, FORMATS[thumb_fmt][1])
+    return data, (out_mime if changed else mime), thumb
+
+
+def _inline_b64(image: Dict[str, Any]) -> Optional[str]:
+    if image.get("type") == "base64":
+        return image.get("data")
+    url = image.get("url") or ""
+    if url.startswith("data:") and ";base64," in url:
+        return url.partition(";base64,")[2]
+    return None
+
+
+def _with_payload(image: Dict[str, Any], b64: str, mime: str) -> Dict[str, Any]:
+    if image.get("type") == "base64":
+        return {**image, "mime": mime, "data": b64}
+    return {**image, "mime": mime, "url": f"data:{mime};base64,{b64}"}
+
+
+class ImageProcessor:
+    """Resize/transcode/thumbnail generated images in a process pool, caching each variant."""
+
+    def __init__(self, workers: int = 2, cache: Optional[ResultCache] = None) -> None:
+        self.workers = workers
+        self.cache = cache
+        self.processed = 0
+        self.failed = 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def available(self) -> bool:
+        return Image is not None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: forking a process that runs an event loop and thread pools is unsafe.
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _reset_pool(self, broken: ProcessPoolExecutor) -> None:
+        # Every call in flight sees the same broken pool; only the first one replaces it.
+        if self._executor is broken:
+            self._executor = None
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    async def _run(self, b64: str, mime: str, options: ProcessOptions) -> Tuple[str, str, Optional[Tuple[str, str]]]:
+        """Run :func:`process_image` in the pool, rebuilding it once if a worker died."""
+        loop = asyncio.get_running_loop()
+        for _ in range(2):
+            executor = self._pool()
+            try:
+                return await loop.run_in_executor(executor, process_image, b64, mime, options)
+            except BrokenProcessPool as exc:
+                # A crashed worker (OOM killer, Pillow on a malformed image)
+                # breaks the whole pool; without a reset every later call fails.
+                logger.warning("Post-processing pool broke; restarting it")
+                self._reset_pool(executor)
+                error = exc
+        raise error
+
+    def warm(self) -> None:
+        """Start the worker processes now instead of on the first request."""
+        if self.available:
+            for future in [self._pool().submit(int, "0") for _ in range(self.workers)]:
+                future.result()
+
+    async def process(self, images: List[Dict[str, Any]], options: ProcessOptions) -> List[Dict[str, Any]]:
+        if not options.active or not self.available:
+            return images
+        return list(await asyncio.gather(*(self._one(image, options) for image in images)))
+
+    async def _one(self, image: Dict[str, Any], options: ProcessOptions) -> Dict[str, Any]:
+        b64 = _inline_b64(image)
+        mime = image.get("mime") or "image/png"
+        # Placeholders are SVG, which Pillow cannot rasterise; blob URLs are already final.
+        if b64 is None or not mime.startswith("image/") or mime == "image/svg+xml":
+            return image
+        digest = hashlib.sha256(b64.encode("ascii")).hexdigest()
+        key = f"{digest}:{image.get('type')}:{options.key()}"
+        if self.cache is not None:
+            cached = await self.cache.aget(key)
+            if cached:
+                return {**cached[0], "index": image.get("index")}
+        try:
+            data, out_mime, thumb = await self._run(b64, mime, options)
+        except Exception as exc:  # undecodable provider output: serve it unprocessed
+            self.failed += 1
+            logger.warning("Image post-processing failed: %s", exc)
+            return image
+        self.processed += 1
+        result = _with_payload(image, data, out_mime)
+        if thumb is not None:
+            result["thumbnail"] = _with_payload({"type": image.get("type")}, *thumb)
+        if self.cache is not None:
+            await self.cache.aset(key, [result])
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "available": self.available,
+            "workers": self.workers,
+            "processed": self.processed,
+            "failed": self.failed,
+            "cache": self.cache.stats() if self.cache else None,
+        }
+
+
+def load_image_processor() -> ImageProcessor:
+    if Image is None:
+        logger.warning("Pillow is not installed; image post-processing requests are refused with 501")
+    cache_entries = int(os.getenv("POSTPROCESS_CACHE_ENTRIES", "256"))
+    cache = None
+    if cache_entries > 0:
+        cache = ResultCache(
+            max_entries=cache_entries,
+            max_bytes=int(float(os.getenv("POSTPROCESS_CACHE_MAX_MB", "128")) * 1024 * 1024),
+            ttl=float(os.getenv("POSTPROCESS_CACHE_TTL", "3600")),
+        )
+    workers = int(os.getenv("POSTPROCESS_WORKERS") or min(4, os.cpu_count() or 1))
+    return ImageProcessor(workers=max(1, workers), cache=cache)
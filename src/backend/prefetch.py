@@ -0,0 +1,202 @@
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+try:
+    from .metrics import prefetch_events
+except ImportError:
+    from metrics import prefetch_events
+
+logger = logging.getLogger("nano-proxy")
+
+Images = List[Dict[str, Any]]
+
+
+class CountMinSketch:
+    """Approximate per-key counts in fixed memory; estimates never undercount."""
+
+    def __init__(self, width: int = 2048, depth: int = 4) -> None:
+        self.width = width
+        self.depth = depth
+        self._rows = [[0] * width for _ in range(depth)]
+
+    def _slots(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8 * self.depth).digest()
+        return [int.from_bytes(digest[8 * row : 8 * row + 8], "little") % self.width for row in range(self.depth)]
+
+    def add(self, key: str) -> int:
+        """Count one occurrence and return the new estimate (conservative update)."""
+        slots = self._slots(key)
+        estimate = min(row[slot] for row, slot in zip(self._rows, slots)) + 1
+        for row, slot in zip(self._rows, slots):
+            if row[slot] < estimate:
+                row[slot] = estimate
+        return estimate
+
+    def estimate(self, key: str) -> int:
+        return min(row[slot] for row, slot in zip(self._rows, self._slots(key)))
+
+    def decay(self) -> None:
+        """Halve every counter so yesterday's favourites fade out."""
+        for row in self._rows:
+            for index, value in enumerate(row):
+                row[index] = value >> 1
+
+
+class Prefetcher:
+    """Learn the most requested generations and keep fresh results ready for them.
+
+    ``record`` feeds every eligible request into a count-min sketch and keeps
+    the ``top_k`` heaviest keys with the spec needed to regenerate them. A
+    background loop calls ``fill`` for the most popular key whose pool is not
+    full, but only while ``idle()`` reports spare provider capacity and the
+    hourly image budget allows.
+
+    By default a pooled result is handed to exactly one request, so nobody sees
+    an image another client already got. With ``allow_reuse`` the newest result
+    for a key is served to every request until it expires.
+    """
+
+    def __init__(
+        self,
+        top_k: int = 32,
+        min_hits: int = 3,
+        pool_depth: int = 1,
+        budget_per_hour: int = 100,
+        ttl: float = 3600,
+        allow_reuse: bool = False,
+        interval: float = 1.0,
+        decay_interval: float = 3600,
+        sketch: Optional[CountMinSketch] = None,
+    ) -> None:
+        self.top_k = top_k
+        self.min_hits = min_hits
+        self.pool_depth = max(1, pool_depth)
+        self.budget_per_hour = budget_per_hour
+        self.ttl = ttl
+        self.allow_reuse = allow_reuse
+        self.interval = interval
+        self.decay_interval = decay_interval
+        self.sketch = sketch or CountMinSketch()
+        self.served = 0
+        self.generated = 0
+        self.failed = 0
+        # key -> (estimated hits, images per generation, spec for ``fill``)
+        self._candidates: Dict[str, Tuple[int, int, Any]] = {}
+        self._pools: Dict[str, Deque[Tuple[float, Images]]] = {}
+        self._spent: Deque[Tuple[float, int]] = deque()
+        self._last_decay = time.monotonic()
+        self._task: Optional["asyncio.Task[None]"] = None
+
+    def record(self, key: str, spec: Any, cost: int = 1) -> None:
+        estimate = self.sketch.add(key)
+        if key in self._candidates or len(self._candidates) < self.top_k:
+            self._candidates[key] = (estimate, cost, spec)
+            return
+        coldest = min(self._candidates, key=lambda candidate: self._candidates[candidate][0])
+        if estimate > self._candidates[coldest][0]:
+            del self._candidates[coldest]
+            self._pools.pop(coldest, None)
+            self._candidates[key] = (estimate, cost, spec)
+
+    def take(self, key: str) -> Optional[Images]:
+        pool = self._pools.get(key)
+        now = time.monotonic()
+        while pool and now - pool[0][0] > self.ttl:
+            pool.popleft()
+        if not pool:
+            return None
+        self.served += 1
+        prefetch_events.inc(event="served")
+        return pool[-1][1] if self.allow_reuse else pool.popleft()[1]
+
+    def _budget_left(self, now: float) -> int:
+        while self._spent and now - self._spent[0][0] > 3600:
+            self._spent.popleft()
+        return self.budget_per_hour - sum(images for _, images in self._spent)
+
+    def _next_candidate(self, now: float) -> Optional[Tuple[str, int, Any]]:
+        ranked = sorted(self._candidates.items(), key=lambda item: item[1][0], reverse=True)
+        for key, (estimate, cost, spec) in ranked:
+            if estimate < self.min_hits:
+                break
+            fresh = [entry for entry in self._pools.get(key) or () if now - entry[0] <= self.ttl]
+            if len(fresh) < self.pool_depth:
+                return key, cost, spec
+        return None
+
+    async def step(self, fill: Callable[[Any], Awaitable[Optional[Images]]], idle: Callable[[], bool]) -> bool:
+        """Generate one pooled result if there is demand, capacity and budget; True if one was added."""
+        now = time.monotonic()
+        if now - self._last_decay >= self.decay_interval:
+            self._last_decay = now
+            self.sketch.decay()
+            self._candidates = {key: (estimate >> 1, *rest) for key, (estimate, *rest) in self._candidates.items()}
+        candidate = self._next_candidate(now)
+        if candidate is None or not idle():
+            return False
+        key, cost, spec = candidate
+        if self._budget_left(now) < cost:
+            return False
+        self._spent.append((now, cost))
+        images = await fill(spec)
+        if not images:
+            self.failed += 1
+            prefetch_events.inc(event="failed")
+            return False
+        self.generated += 1
+        prefetch_events.inc(event="generated")
+        if key in self._candidates:
+            pool = self._pools.setdefault(key, deque())
+            pool.append((time.monotonic(), images))
+            while len(pool) > self.pool_depth:
+                pool.popleft()
+        return True
+
+    async def _run(self, fill: Callable[[Any], Awaitable[Optional[Images]]], idle: Callable[[], bool]) -> None:
+        while True:
+            try:
+                await self.step(fill, idle)
+            except Exception as exc:  # never let one bad generation stop the loop
+                logger.warning("Prefetch failed: %s", exc)
+            await asyncio.sleep(self.interval)
+
+    def start(self, fill: Callable[[Any], Awaitable[Optional[Images]]], idle: Callable[[], bool]) -> None:
+        self._task = asyncio.ensure_future(self._run(fill, idle))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "tracked": len(self._candidates),
+            "pooled": sum(len(pool) for pool in self._pools.values()),
+            "served": self.served,
+            "generated": self.generated,
+            "failed": self.failed,
+            "budget_left": self._budget_left(now),
+            "allow_reuse": self.allow_reuse,
+        }
+
+
+def load_prefetcher() -> Optional[Prefetcher]:
+    if os.getenv("PREFETCH_ENABLED", "false").lower() not in {"1", "true", "yes"}:
+        return None
+    return Prefetcher(
+        top_k=int(os.getenv("PREFETCH_TOP_K", "32")),
+        min_hits=int(os.getenv("PREFETCH_MIN_HITS", "3")),
+        pool_depth=int(os.getenv("PREFETCH_POOL_DEPTH", "1")),
+        budget_per_hour=int(os.getenv("PREFETCH_BUDGET_PER_HOUR", "100")),
+        ttl=float(os.getenv("PREFETCH_TTL", "3600")),
+        allow_reuse=os.getenv("PREFETCH_ALLOW_VARIATION_REUSE", "false").lower() in {"1", "true", "yes"},
+        interval=float(os.getenv("PREFETCH_INTERVAL", "1")),
+        decay_interval=float(os.getenv("PREFETCH_DECAY_INTERVAL", "3600")),
+    )
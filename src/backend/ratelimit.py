@@ -0,0 +1,174 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # optional shared backend
+    redis_asyncio = None
+
+
+@dataclass
+class RateDecision:
+    allowed: bool
+    retry_after: float = 0.0
+
+
+def _gcra(tat: Optional[float], now: float, per_minute: int) -> Tuple[RateDecision, float]:
+    """One GCRA step: return the decision and the new theoretical arrival time.
+
+    A key may burst ``per_minute`` requests and then refills at one request per
+    ``60 / per_minute`` seconds, which matches the old sliding-window limit while
+    keeping a single float of state per key.
+    """
+    interval = 60.0 / per_minute
+    tat = max(tat or now, now)
+    new_tat = tat + interval
+    # Same as new_tat - per_minute * interval, without the float round trip
+    # that could reject the first request of an idle key (see the Redis script).
+    allow_at = tat - (per_minute - 1) * interval
+    if now < allow_at:
+        return RateDecision(False, allow_at - now), tat
+    return RateDecision(True), new_tat
+
+
+class RateLimiter:
+    """In-process GCRA limiter with O(1) state per key and idle-key eviction."""
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self.max_keys = max_keys
+        self._tats: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def check(self, key: str, per_minute: int) -> RateDecision:
+        now = time.monotonic()
+        with self._lock:
+            decision, tat = _gcra(self._tats.get(key), now, per_minute)
+            self._tats[key] = tat
+            self._tats.move_to_end(key)
+            self._evict(now)
+        return decision
+
+    async def acheck(self, key: str, per_minute: int) -> RateDecision:
+        return self.check(key, per_minute)
+
+    def allow(self, key: str, per_minute: int) -> bool:
+        return self.check(key, per_minute).allowed
+
+    def __len__(self) -> int:
+        return len(self._tats)
+
+    def _evict(self, now: float) -> None:
+        # Keys are ordered by last use; a key whose TAT has passed is fully
+        # refilled and indistinguishable from a brand-new one, so it can go.
+        while self._tats:
+            oldest, tat = next(iter(self._tats.items()))
+            if tat > now and len(self._tats) <= self.max_keys:
+                break
+            del self._tats[oldest]
+
+
+class SQLiteRateLimiter(RateLimiter):
+    """GCRA state in a local SQLite file, shared by every worker on the host."""
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        # WAL only needs an fsync at checkpoints; FULL would sync every check.
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS gcra (key TEXT PRIMARY KEY, tat REAL NOT NULL)")
+        self._checks = 0
+
+    def check(self, key: str, per_minute: int) -> RateDecision:
+        # Wall-clock time: monotonic clocks are not comparable across processes.
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute("SELECT tat FROM gcra WHERE key = ?", (key,)).fetchone()
+                decision, tat = _gcra(row[0] if row else None, now, per_minute)
+                if decision.allowed:
+                    self._conn.execute(
+                        "INSERT INTO gcra (key, tat) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET tat = excluded.tat",
+                        (key, tat),
+                    )
+                self._checks += 1
+                if self._checks % self.PURGE_EVERY == 0:
+                    self._conn.execute("DELETE FROM gcra WHERE tat < ?", (now,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return decision
+
+    async def acheck(self, key: str, per_minute: int) -> RateDecision:
+        return await asyncio.to_thread(self.check, key, per_minute)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM gcra").fetchone()[0]
+
+
+_REDIS_GCRA = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or ARGV[1])
+if tat < now then tat = now end
+local new_tat = tat + interval
+-- Same form as _gcra: new_tat - burst * interval can round above now for an idle key.
+local allow_at = tat - (burst - 1) * interval
+if now < allow_at then return {0, tostring(allow_at - now)} end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, '0'}
+"""
+
+
+class RedisRateLimiter(RateLimiter):
+    """GCRA in a Redis-protocol store; keys expire on their own once refilled."""
+
+    def __init__(self, url: str, prefix: str = "nano:rl:") -> None:
+        super().__init__()
+        if redis_asyncio is None:
+            raise RuntimeError("RATE_LIMIT_BACKEND=redis requires the 'redis' package")
+        self.prefix = prefix
+        self._client = redis_asyncio.from_url(url)
+        self._script = self._client.register_script(_REDIS_GCRA)
+
+    def check(self, key: str, per_minute: int) -> RateDecision:
+        raise RuntimeError("RedisRateLimiter only supports acheck()")
+
+    async def acheck(self, key: str, per_minute: int) -> RateDecision:
+        allowed, retry_after = await self._script(
+            keys=[f"{self.prefix}{key}"],
+            args=[time.time(), 60.0 / per_minute, per_minute],
+        )
+        return RateDecision(bool(int(allowed)), float(retry_after))
+
+
+def load_rate_limits() -> Tuple[int, int]:
+    """Requests per minute per client IP and per API key; 0 turns that limit off."""
+    per_ip = int(os.getenv("RATE_LIMIT_PER_MIN", "90"))
+    per_key = int(os.getenv("RATE_LIMIT_PER_KEY_PER_MIN", str(per_ip)))
+    for name, value in (("RATE_LIMIT_PER_MIN", per_ip), ("RATE_LIMIT_PER_KEY_PER_MIN", per_key)):
+        if value < 0:
+            raise ValueError(f"{name} must be 0 (off) or a positive number of requests, not {value}")
+    return per_ip, per_key
+
+
+def load_rate_limiter() -> RateLimiter:
+    backend = os.getenv("RATE_LIMIT_BACKEND", "memory").strip().lower()
+    if backend == "sqlite":
+        return SQLiteRateLimiter(os.getenv("RATE_LIMIT_SQLITE_PATH", "/tmp/nano-ratelimit.sqlite3"))
+    if backend == "redis":
+        return RedisRateLimiter(os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+    return RateLimiter()
@@ -0,0 +1,239 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set
+
+try:
+    from .metrics import scheduler_queued, scheduler_rejections, scheduler_wait_seconds
+except ImportError:
+    from metrics import scheduler_queued, scheduler_rejections, scheduler_wait_seconds
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, BULK)
+
+
+class QueueFull(Exception):
+    """The scheduler will not queue more work; ``retry_after`` is a rough wait in seconds."""
+
+    def __init__(self, limit: str, retry_after: float) -> None:
+        super().__init__(f"Scheduler queue is full ({limit})")
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("client", "cost", "future", "queued_at")
+
+    def __init__(self, client: str, cost: int, future: "asyncio.Future[None]") -> None:
+        self.client = client
+        self.cost = cost
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+
+class _FairQueue:
+    """Deficit round-robin over per-client FIFOs.
+
+    Each time a client reaches the head of the rotation it earns ``quantum``
+    credit and is served while its head request costs no more than its
+    credit, so a client asking for 8 images per call gets the same image
+    throughput as one asking for 1, not eight times as much.
+    """
+
+    def __init__(self, quantum: int) -> None:
+        self.quantum = quantum
+        self.clients: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self.deficit: Dict[str, float] = {}
+        self._credited: Set[str] = set()
+        self.size = 0
+
+    def push(self, waiter: _Waiter) -> None:
+        queue = self.clients.get(waiter.client)
+        if queue is None:
+            queue = self.clients[waiter.client] = deque()
+            self.deficit[waiter.client] = 0.0
+        queue.append(waiter)
+        self.size += 1
+
+    def remove(self, waiter: _Waiter) -> bool:
+        """Drop a waiter that gave up; False if it had already been popped."""
+        queue = self.clients.get(waiter.client)
+        if queue is None or waiter not in queue:
+            return False
+        queue.remove(waiter)
+        self.size -= 1
+        if not queue:
+            self._forget(waiter.client)
+        return True
+
+    def pop(self) -> Optional[_Waiter]:
+        while self.clients:
+            client, queue = next(iter(self.clients.items()))
+            if client not in self._credited:
+                self.deficit[client] += self.quantum
+                self._credited.add(client)
+            head = queue[0]
+            if head.cost <= self.deficit[client]:
+                queue.popleft()
+                self.size -= 1
+                self.deficit[client] -= head.cost
+                if not queue:
+                    self._forget(client)
+                return head
+            self._credited.discard(client)
+            self.clients.move_to_end(client)
+        return None
+
+    def queued_for(self, client: str) -> int:
+        queue = self.clients.get(client)
+        return len(queue) if queue else 0
+
+    def _forget(self, client: str) -> None:
+        # An idle client does not bank credit for later bursts.
+        del self.clients[client]
+        del self.deficit[client]
+        self._credited.discard(client)
+
+
+class FairScheduler:
+    """Shared provider slots handed out by priority class, then fairly across clients.
+
+    Interactive calls always go first. Bulk calls may hold at most
+    ``bulk_share`` of the slots, so a burst of interactive traffic finds free
+    capacity instead of queueing behind a long batch. Within a class, clients
+    are served by deficit round-robin weighted by images requested.
+    """
+
+    def __init__(
+        self,
+        capacity: int = 32,
+        bulk_share: float = 0.75,
+        quantum: int = 8,
+        max_queued: int = 512,
+        max_queued_per_client: int = 64,
+    ) -> None:
+        self.capacity = max(1, capacity)
+        self.bulk_limit = max(1, min(self.capacity, math.floor(self.capacity * bulk_share)))
+        self.max_queued = max_queued
+        self.max_queued_per_client = max_queued_per_client
+        self.in_flight = {priority: 0 for priority in PRIORITIES}
+        self.granted = {priority: 0 for priority in PRIORITIES}
+        self.rejected = 0
+        self._queues = {priority: _FairQueue(quantum) for priority in PRIORITIES}
+        # Moving average of how long a slot is held, for Retry-After estimates.
+        self._hold_seconds = 1.0
+
+    def _can_start(self, priority: str) -> bool:
+        if sum(self.in_flight.values()) >= self.capacity:
+            return False
+        return priority == INTERACTIVE or self.in_flight[BULK] < self.bulk_limit
+
+    def admit(self, client: str, priority: str, calls: int = 1) -> None:
+        """Refuse a request up front when its calls would overflow the queue."""
+        queue = self._queues[priority]
+        if queue.size + calls > self.max_queued:
+            limit = "total"
+        elif queue.queued_for(client) + calls > self.max_queued_per_client:
+            limit = "client"
+        else:
+            return
+        self.rejected += 1
+        scheduler_rejections.inc(priority=priority, limit=limit)
+        raise QueueFull(limit, self.retry_after(priority))
+
+    def idle(self, headroom: float = 0.5) -> bool:
+        """True when nothing is queued and at least ``headroom`` of the slots are free."""
+        queued = sum(queue.size for queue in self._queues.values())
+        return not queued and sum(self.in_flight.values()) <= self.capacity * (1 - headroom)
+
+    def retry_after(self, priority: str) -> float:
+        slots = self.capacity if priority == INTERACTIVE else self.bulk_limit
+        return max(1.0, self._hold_seconds * self._queues[priority].size / slots)
+
+    async def acquire(self, client: str, priority: str, cost: int = 1) -> None:
+        queue = self._queues[priority]
+        ahead = queue.size + (self._queues[INTERACTIVE].size if priority == BULK else 0)
+        if not ahead and self._can_start(priority):
+            self._grant(priority, 0.0)
+            return
+        waiter = _Waiter(client, cost, asyncio.get_running_loop().create_future())
+        queue.push(waiter)
+        scheduler_queued.inc(priority=priority)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if queue.remove(waiter):
+                scheduler_queued.dec(priority=priority)
+            elif waiter.future.done() and not waiter.future.cancelled():
+                # The slot was handed over just before cancellation; give it back
+                # so _dispatch can pass it to the next waiter.
+                self.release(priority)
+            raise
+
+    def release(self, priority: str, held: Optional[float] = None) -> None:
+        self.in_flight[priority] -= 1
+        if held is not None:
+            self._hold_seconds += 0.1 * (held - self._hold_seconds)
+        self._dispatch()
+
+    def _grant(self, priority: str, waited: float) -> None:
+        self.in_flight[priority] += 1
+        self.granted[priority] += 1
+        scheduler_wait_seconds.observe(waited, priority=priority)
+
+    def _dispatch(self) -> None:
+        for priority in PRIORITIES:
+            queue = self._queues[priority]
+            while queue.size and self._can_start(priority):
+                waiter = queue.pop()
+                if waiter is None:
+                    break
+                scheduler_queued.dec(priority=priority)
+                if waiter.future.done():
+                    continue
+                self._grant(priority, time.perf_counter() - waiter.queued_at)
+                waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, client: str, priority: str, cost: int = 1) -> AsyncIterator[None]:
+        await self.acquire(client, priority, cost)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(priority, time.monotonic() - start)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "capacity": self.capacity,
+            "bulk_limit": self.bulk_limit,
+            "rejected": self.rejected,
+            "classes": {
+                priority: {
+                    "in_flight": self.in_flight[priority],
+                    "queued": self._queues[priority].size,
+                    "clients": len(self._queues[priority].clients),
+                    "granted": self.granted[priority],
+                }
+                for priority in PRIORITIES
+            },
+        }
+
+
+def normalize_priority(value: Optional[str]) -> Optional[str]:
+    value = (value or "").strip().lower()
+    return value if value in PRIORITIES else None
+
+
+def load_scheduler() -> FairScheduler:
+    return FairScheduler(
+        capacity=int(os.getenv("PROVIDER_MAX_CONCURRENCY", "32")),
+        bulk_share=float(os.getenv("SCHEDULER_BULK_SHARE", "0.75")),
+        quantum=8,
+        max_queued=int(os.getenv("SCHEDULER_MAX_QUEUED", "512")),
+        max_queued_per_client=int(os.getenv("SCHEDULER_MAX_QUEUED_PER_CLIENT", "64")),
+    )
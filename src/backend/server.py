@@ -0,0 +1,249 @@
+"""Production entry point: a pre-bound socket shared by N uvicorn worker processes.
+
+    python server.py                  # SERVER_WORKERS workers on SERVER_HOST:SERVER_PORT
+    kill -HUP <supervisor pid>        # re-read SERVER_ENV_FILE, then replace workers one by one
+
+Each worker warms its provider pool, placeholder frames and post-processing
+pool before it starts accepting, so a reload never hands traffic to a cold
+process. A replacement must report ready before the worker it replaces is
+stopped; if it fails, the old worker keeps serving.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from dotenv import dotenv_values
+
+logger = logging.getLogger("nano-proxy")
+
+
+def shared_state_env(env: Dict[str, str], workers: int) -> Dict[str, str]:
+    """Defaults that make per-process state shared once there is more than one worker.
+
+    Explicit settings always win; only unset or in-process-only choices change.
+    """
+    updates: Dict[str, str] = {"WARM_STARTUP": env.get("WARM_STARTUP") or "true", "JOB_REQUEUE_ON_START": "false"}
+    if workers > 1:
+        if (env.get("RATE_LIMIT_BACKEND") or "memory").lower() == "memory":
+            # A per-process limiter would multiply the effective limit by the worker count.
+            updates["RATE_LIMIT_BACKEND"] = "sqlite"
+        cache_on = (env.get("RESULT_CACHE_ENABLED") or "false").lower() in {"1", "true", "yes"}
+        if cache_on and not env.get("RESULT_CACHE_DIR"):
+            updates["RESULT_CACHE_DIR"] = "/tmp/nano-result-cache"
+    return updates
+
+
+def worker_env(index: int) -> Dict[str, str]:
+    """Settings for one worker slot on top of the shared environment.
+
+    Only slot 0 prefetches: every worker would otherwise learn the same popular
+    prompts and spend its own ``PREFETCH_BUDGET_PER_HOUR`` generating them.
+    """
+    return {} if index == 0 else {"PREFETCH_ENABLED": "false"}
+
+
+def load_env_file(path: Optional[str]) -> None:
+    """Apply KEY=VALUE lines from ``path`` over the current environment."""
+    if not path:
+        return
+    if not os.path.exists(path):
+        logger.warning("SERVER_ENV_FILE %s does not exist", path)
+        return
+    for key, value in dotenv_values(path).items():
+        if value is not None:
+            os.environ[key] = value
+
+
+def _serve(sock: socket.socket, ready: "multiprocessing.connection.Connection", env: Dict[str, str]) -> None:
+    os.environ.update(env)
+    import uvicorn
+
+    config = uvicorn.Config(
+        "app:app",
+        log_level=os.getenv("LOG_LEVEL", "info").lower(),
+        timeout_graceful_shutdown=int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30")),
+        proxy_headers=True,
+    )
+    server = uvicorn.Server(config)
+
+    async def run() -> None:
+        task = asyncio.ensure_future(server.serve(sockets=[sock]))
+        while not server.started and not task.done():
+            await asyncio.sleep(0.05)
+        if server.started:
+            ready.send(True)
+        ready.close()
+        await task
+
+    asyncio.run(run())
+
+
+class Supervisor:
+    def __init__(self, host: str, port: int, workers: int, env_file: Optional[str] = None) -> None:
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.env_file = env_file
+        self.ready_timeout = float(os.getenv("SERVER_READY_TIMEOUT", "60"))
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: List[multiprocessing.Process] = []
+        # Job queue owner id of each worker pid, so a dead worker's pinned jobs can be released.
+        self._owners: Dict[int, str] = {}
+        self._socket: Optional[socket.socket] = None
+        self._pending: List[int] = []
+
+    def _prepare_env(self) -> None:
+        load_env_file(self.env_file)
+        os.environ.update(shared_state_env(dict(os.environ), self.workers))
+
+    def _requeue_jobs(self) -> None:
+        # Once per supervisor start, before any worker can claim; workers skip it.
+        from jobs import JobStore
+
+        store = JobStore(os.getenv("JOB_DB_PATH", "/tmp/nano-jobs.sqlite3"))
+        try:
+            requeued = store.requeue_running()
+        finally:
+            store.close()
+        if requeued:
+            logger.info("Requeued %d interrupted jobs", requeued)
+
+    def _abandon_jobs(self, process: multiprocessing.Process) -> None:
+        # A worker that exits without a clean shutdown cannot fail its own pinned
+        # jobs, and no other worker may claim them. Their client keys are gone.
+        owner = self._owners.pop(process.pid, None)
+        if owner is None:
+            return
+        from jobs import JobStore
+
+        store = JobStore(os.getenv("JOB_DB_PATH", "/tmp/nano-jobs.sqlite3"))
+        try:
+            abandoned = store.abandon(owner)
+        finally:
+            store.close()
+        if abandoned:
+            logger.warning("Failed %d jobs pinned to worker %s", abandoned, process.pid)
+
+    def _spawn(self, index: int) -> Optional[multiprocessing.Process]:
+        receiver, sender = self._context.Pipe(duplex=False)
+        # Spawned children inherit os.environ as it is now, so a reload's new
+        # env reaches load_config() in every replacement worker.
+        owner = uuid.uuid4().hex
+        env = {**worker_env(index), "JOB_OWNER": owner}
+        process = self._context.Process(target=_serve, args=(self._socket, sender, env), daemon=False)
+        process.start()
+        self._owners[process.pid] = owner
+        sender.close()
+        deadline = time.monotonic() + self.ready_timeout
+        try:
+            while time.monotonic() < deadline and process.is_alive():
+                if receiver.poll(0.2):
+                    receiver.recv()
+                    logger.info("Worker %s ready", process.pid)
+                    return process
+        except EOFError:
+            pass
+        finally:
+            receiver.close()
+        logger.error("Worker %s did not become ready; stopping it", process.pid)
+        process.kill()
+        process.join()
+        self._abandon_jobs(process)
+        return None
+
+    def _stop(self, process: multiprocessing.Process) -> None:
+        if process.is_alive():
+            os.kill(process.pid, signal.SIGTERM)
+        process.join(float(os.getenv("SERVER_GRACEFUL_TIMEOUT", "30")) + 5)
+        if process.is_alive():
+            process.kill()
+            process.join()
+        self._abandon_jobs(process)
+
+    def reload(self) -> None:
+        """Rolling replacement: start a new worker, wait until it is warm, then retire an old one."""
+        logger.info("Reloading %d workers", len(self._processes))
+        self._prepare_env()
+        for index, old in enumerate(list(self._processes)):
+            new = self._spawn(index)
+            if new is None:
+                logger.error("Reload aborted; remaining workers keep the previous configuration")
+                return
+            self._processes[index] = new
+            self._stop(old)
+
+    def _reap(self) -> None:
+        for index, process in enumerate(self._processes):
+            if not process.is_alive():
+                logger.warning("Worker %s exited with %s; replacing it", process.pid, process.exitcode)
+                self._abandon_jobs(process)
+                replacement = self._spawn(index)
+                if replacement is not None:
+                    self._processes[index] = replacement
+
+    def run(self) -> int:
+        self._prepare_env()
+        self._requeue_jobs()
+        self._socket = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.listen(2048)
+        self._socket.set_inheritable(True)
+
+        for sig in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda received, _: self._pending.append(received))
+
+        for index in range(self.workers):
+            process = self._spawn(index)
+            if process is None:
+                self.shutdown()
+                return 1
+            self._processes.append(process)
+        logger.info("Serving on %s:%d with %d workers (pid %d)", self.host, self.port, self.workers, os.getpid())
+
+        while True:
+            while self._pending:
+                received = self._pending.pop(0)
+                if received == signal.SIGHUP:
+                    self.reload()
+                else:
+                    self.shutdown()
+                    return 0
+            self._reap()
+            time.sleep(0.5)
+
+    def shutdown(self) -> None:
+        for process in self._processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+        for process in self._processes:
+            self._stop(process)
+        self._processes = []
+        if self._socket is not None:
+            self._socket.close()
+
+
+def main() -> int:
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(asctime)s %(levelname)s %(message)s")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    env_file = os.getenv("SERVER_ENV_FILE", "").strip() or None
+    load_env_file(env_file)
+    supervisor = Supervisor(
+        host=os.getenv("SERVER_HOST", "0.0.0.0"),
+        port=int(os.getenv("SERVER_PORT", "8003")),
+        workers=max(1, int(os.getenv("SERVER_WORKERS") or os.cpu_count() or 1)),
+        env_file=env_file,
+    )
+    return supervisor.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
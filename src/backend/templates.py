@@ -0,0 +1,182 @@
+import glob
+import itertools
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Sequence, Tuple
+
+logger = logging.getLogger("nano-proxy")
+
+# The tokens the browser's replaceTokens() substitutes; anything else in braces
+# stays literal so server and client expand a template identically.
+TOKENS = ("industry", "audience", "selling", "style", "size", "language", "forbidden", "template")
+_TOKEN = re.compile(r"\{(" + "|".join(TOKENS) + r")\}")
+
+DEFAULT_TEMPLATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "config", "templates.json")
+
+
+class CompiledTemplate:
+    """A template string split once into literal runs and token slots."""
+
+    __slots__ = ("source", "_literals", "_tokens")
+
+    def __init__(self, source: str) -> None:
+        self.source = source or ""
+        self._literals = _TOKEN.split(self.source)[::2]
+        self._tokens = _TOKEN.findall(self.source)
+
+    @property
+    def tokens(self) -> Tuple[str, ...]:
+        return tuple(self._tokens)
+
+    def render(self, values: Mapping[str, str]) -> str:
+        parts = [self._literals[0]]
+        for token, literal in zip(self._tokens, self._literals[1:]):
+            parts.append(values.get(token) or "")
+            parts.append(literal)
+        return "".join(parts).strip()
+
+
+@dataclass
+class Template:
+    id: str
+    name: str
+    prompt: CompiledTemplate
+    negative: CompiledTemplate
+    meta: Dict[str, Any]
+    source: str
+
+    def expand(self, variables: Mapping[str, str]) -> Tuple[str, str]:
+        """Return (prompt, negative_prompt) exactly as app.js buildPrompt() builds them."""
+        values = {**variables, "template": self.name}
+        prompt = self.prompt.render(values)
+        size, language = values.get("size") or "", values.get("language") or ""
+        tail = " | ".join(
+            part
+            for part in (
+                f"Size: {size}" if size and size not in prompt else "",
+                f"Language: {language}" if language and language not in prompt else "",
+            )
+            if part
+        )
+        if tail:
+            prompt = f"{prompt}\n{tail}".strip()
+        negative = ", ".join(part for part in (self.negative.render(values), values.get("forbidden") or "") if part)
+        return prompt, negative
+
+    def describe(self) -> Dict[str, Any]:
+        return {**self.meta, "id": self.id, "name": self.name, "tokens": sorted(set(self.prompt.tokens))}
+
+
+def expand_matrix(variables: Mapping[str, str], matrix: Mapping[str, Sequence[str]]) -> Iterator[Dict[str, str]]:
+    """Cartesian product of ``matrix`` over the fixed ``variables``, in key order."""
+    keys = list(matrix)
+    for combination in itertools.product(*(matrix[key] for key in keys)):
+        yield {**variables, **dict(zip(keys, combination))}
+
+
+def matrix_size(matrix: Mapping[str, Sequence[str]]) -> int:
+    size = 1
+    for values in matrix.values():
+        size *= len(values)
+    return size
+
+
+class TemplateRegistry:
+    """Templates from the main file plus packs, recompiled when any source file changes.
+
+    Later sources win on duplicate ids, so a pack can override a built-in
+    template. Changes are picked up by an mtime check on access, at most every
+    ``check_interval`` seconds; a file that fails to parse keeps the previous set.
+    """
+
+    def __init__(self, paths: Sequence[str], check_interval: float = 2.0) -> None:
+        self.paths = list(paths)
+        self.check_interval = check_interval
+        self.loads = 0
+        self._templates: Dict[str, Template] = {}
+        self._mtimes: Dict[str, float] = {}
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _sources(self) -> List[str]:
+        files = []
+        for path in self.paths:
+            if os.path.isdir(path):
+                files.extend(sorted(glob.glob(os.path.join(path, "*.json"))))
+            elif os.path.exists(path):
+                files.append(path)
+        return files
+
+    def _snapshot(self) -> Dict[str, float]:
+        mtimes = {}
+        for path in self._sources():
+            try:
+                mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                continue
+        return mtimes
+
+    def load(self) -> int:
+        """(Re)compile every source now; return the number of templates."""
+        with self._lock:
+            mtimes = self._snapshot()
+            templates: Dict[str, Template] = {}
+            for path in mtimes:
+                try:
+                    with open(path, "r", encoding="utf-8") as handle:
+                        entries = json.load(handle).get("templates") or []
+                except (OSError, ValueError, AttributeError) as exc:
+                    logger.warning("Skipping template file %s: %s", path, exc)
+                    if path in self._mtimes:
+                        # Keep serving the last good copy of a file mid-edit.
+                        templates.update({t.id: t for t in self._templates.values() if t.source == path})
+                    continue
+                for entry in entries:
+                    if not isinstance(entry, dict) or not entry.get("id"):
+                        continue
+                    templates[entry["id"]] = Template(
+                        id=entry["id"],
+                        name=entry.get("name") or entry["id"],
+                        prompt=CompiledTemplate(entry.get("prompt") or ""),
+                        negative=CompiledTemplate(entry.get("negative") or ""),
+                        meta={key: value for key, value in entry.items() if key not in {"prompt", "negative"}},
+                        source=path,
+                    )
+            self._templates = templates
+            self._mtimes = mtimes
+            self._checked = time.monotonic()
+            self.loads += 1
+        return len(templates)
+
+    def maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        if self._snapshot() != self._mtimes:
+            count = self.load()
+            logger.info("Reloaded %d templates", count)
+
+    def get(self, template_id: str) -> Optional[Template]:
+        self.maybe_reload()
+        return self._templates.get(template_id)
+
+    def list(self) -> List[Template]:
+        self.maybe_reload()
+        return list(self._templates.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {"templates": len(self._templates), "sources": len(self._mtimes), "loads": self.loads}
+
+
+def load_template_registry() -> TemplateRegistry:
+    paths = [os.getenv("TEMPLATES_PATH") or DEFAULT_TEMPLATES_PATH]
+    paths.extend(path.strip() for path in os.getenv("TEMPLATE_PACKS", "").split(",") if path.strip())
+    registry = TemplateRegistry(paths, check_interval=float(os.getenv("TEMPLATES_RELOAD_INTERVAL", "2")))
+    registry.load()
+    return registry
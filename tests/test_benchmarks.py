@@ -0,0 +1,64 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "src" / "backend"
+sys.path.append(str(BACKEND_PATH))
+sys.path.append(str(ROOT / "benchmarks"))
+
+import nano_banana  # noqa: E402
+from breaker import BreakerRegistry  # noqa: E402
+from fake_provider import create_app  # noqa: E402
+from load import find_regressions, percentile  # noqa: E402
+from nano_banana import ProviderConfig, generate_images_async, validate_key_async  # noqa: E402
+
+
+@pytest.fixture
+def fake_provider(monkeypatch):
+    app = create_app(latency=0, image_bytes=3 * 1024)
+
+    def factory(config, base_url=None):
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app))
+
+    monkeypatch.setattr(nano_banana, "get_async_client", factory)
+    monkeypatch.setattr(nano_banana, "breakers", BreakerRegistry())
+    return app
+
+
+def make_config(model: str) -> ProviderConfig:
+    return ProviderConfig(
+        api_key="bench-key",
+        base_url="http://fake.test/v1beta",
+        model=model,
+        timeout=5,
+        use_mock=False,
+        placeholder_on_error=False,
+    )
+
+
+@pytest.mark.parametrize("model", ["imagen-4.0-fast-generate-001", "gemini-2.5-flash-image", "imagegen-bench"])
+def test_fake_provider_serves_every_endpoint_style(fake_provider, model):
+    images = asyncio.run(generate_images_async("bench", None, 3, make_config(model)))
+    assert len(images) == 3
+    assert all(len(image["data"]) == 4 * 1024 for image in images)
+    assert fake_provider.state.stats["images"] == 3
+
+
+def test_fake_provider_answers_key_validation(fake_provider):
+    status = asyncio.run(validate_key_async(make_config("imagen-4.0-fast-generate-001")))
+    assert status["ok"] is True
+
+
+def test_percentile_and_regression_threshold():
+    samples = [float(value) for value in range(1, 101)]
+    assert percentile(samples, 50) == 50.0
+    assert percentile(samples, 99) == 99.0
+    baseline = {"s": {"throughput_rps": 10.0, "p95_ms": 100.0, "cpu_ms_per_image": 5.0}}
+    steady = [{"scenario": "s", "throughput_rps": 9.5, "p95_ms": 105.0, "cpu_ms_per_image": 5.2}]
+    assert find_regressions(steady, baseline, 0.10) == []
+    slower = [{"scenario": "s", "throughput_rps": 10.0, "p95_ms": 130.0, "cpu_ms_per_image": 5.0}]
+    assert [problem.split(":")[1].split()[0] for problem in find_regressions(slower, baseline, 0.10)] == ["p95_ms"]
@@ -0,0 +1,74 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "src" / "backend"
+sys.path.append(str(BACKEND_PATH))
+
+import app as proxy  # noqa: E402
+from blobstore import BlobStore  # noqa: E402
+from budget import BudgetExhausted, ByteBudget  # noqa: E402
+
+
+client = TestClient(proxy.app)
+MB = 1024 * 1024
+
+
+async def fake(prompt, **kwargs):
+    return [{"index": 0, "type": "base64", "mime": "image/png", "data": prompt}]
+
+
+def test_byte_budget_is_fifo_and_sheds_after_timeout():
+    budget = ByteBudget(10)
+
+    async def scenario():
+        first = await budget.acquire(8, timeout=1)
+        with pytest.raises(BudgetExhausted):
+            await budget.acquire(5, timeout=0.01)
+        waiter = asyncio.ensure_future(budget.acquire(5, timeout=1))
+        await asyncio.sleep(0)
+        budget.release(first)
+        return await waiter
+
+    assert asyncio.run(scenario()) == 5
+    assert budget.in_use == 5 and budget.shed == 1
+    # Larger than the whole budget: clamped so it can still run alone.
+    assert asyncio.run(ByteBudget(10).acquire(50, timeout=1)) == 10
+
+
+def test_generate_rejects_too_many_prompts(monkeypatch):
+    monkeypatch.setattr(proxy, "generate_max_prompts", 2)
+    response = client.post("/api/generate", json={"prompts": ["a", "b", "c"]})
+    assert response.status_code == 413
+
+
+def test_oversized_response_is_refused_or_moved_to_blob_urls(monkeypatch, tmp_path):
+    monkeypatch.setattr(proxy, "generate_images_async", fake)
+    monkeypatch.setattr(proxy, "request_memory_limit", 40 * MB)
+    monkeypatch.setattr(proxy, "image_estimate_bytes", 1 * MB)
+    monkeypatch.setattr(proxy, "prompt_concurrency", 4)
+    body = {"prompts": [f"p{index}" for index in range(8)], "count": 4}
+    # 8 prompts x 4 images x 2 copies of 1 MB does not fit 40 MB when buffered...
+    assert client.post("/api/generate", json=body).status_code == 413
+    # ...but does when only the prompts in flight are held.
+    assert client.post("/api/generate", json={**body, "stream": True}).status_code == 200
+
+    monkeypatch.setattr(proxy, "blob_store", BlobStore(str(tmp_path)))
+    response = client.post("/api/generate", json=body)
+    assert response.status_code == 200
+    assert response.headers["X-Downgraded"] == "blob-url"
+    assert proxy.memory_budget.in_use == 0
+
+
+def test_generate_sheds_when_process_budget_is_busy(monkeypatch):
+    monkeypatch.setattr(proxy, "generate_images_async", fake)
+    monkeypatch.setattr(proxy, "memory_budget", ByteBudget(1))
+    monkeypatch.setattr(proxy, "memory_budget_wait", 0.01)
+    proxy.memory_budget.in_use = 1
+    response = client.post("/api/generate", json={"prompt": "x"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
@@ -0,0 +1,79 @@
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "src" / "backend"
+sys.path.append(str(BACKEND_PATH))
+
+from cache import KeyStatusCache, ResultCache  # noqa: E402
+
+
+def image(data: str):
+    return [{"index": 0, "type": "base64", "mime": "image/png", "data": data}]
+
+
+def test_result_cache_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2)
+    cache.set("a", image("A"))
+    cache.set("b", image("B"))
+    assert cache.get("a") == image("A")
+    cache.set("c", image("C"))
+    assert cache.get("b") is None
+    assert cache.get("a") == image("A")
+    assert cache.stats()["entries"] == 2
+
+
+def test_result_cache_expires_entries():
+    cache = ResultCache(ttl=0)
+    cache.set("a", image("A"))
+    assert cache.get("a") is None
+
+
+def test_result_cache_disk_tier_survives_restart(tmp_path):
+    ResultCache(disk_dir=str(tmp_path)).set("abcd", image("A"))
+    fresh = ResultCache(disk_dir=str(tmp_path))
+    assert fresh.get("abcd") == image("A")
+    assert fresh.stats()["disk_hits"] == 1
+
+
+def test_result_cache_disk_tier_tolerates_concurrent_and_failed_writes(tmp_path):
+    cache = ResultCache(disk_dir=str(tmp_path))
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: cache.set("ab" * 32, image("A")), range(64)))
+    assert [path.name for path in tmp_path.rglob("*") if path.is_file()] == [f"{'ab' * 32}.json"]
+    # A key whose shard directory cannot be created still lands in memory.
+    (tmp_path / "cd").write_text("not a directory")
+    cache.set("cd" * 32, image("C"))
+    assert cache.get("cd" * 32) == image("C")
+
+
+def test_key_status_cache_hits_negative_ttl_and_refresh():
+    calls = []
+
+    async def scenario():
+        cache = KeyStatusCache(ttl=60, negative_ttl=0, refresh_ahead=1.0)
+
+        async def good():
+            calls.append("good")
+            return {"ok": True}
+
+        async def bad():
+            calls.append("bad")
+            return {"ok": False}
+
+        key = cache.make_key("secret", "https://provider.test")
+        assert "secret" not in key
+        assert await cache.get(key, good) == {"ok": True}
+        # refresh_ahead=1.0 means every hit is served cached and refreshed in the background.
+        assert await cache.get(key, good) == {"ok": True}
+        await asyncio.sleep(0)
+        other = cache.make_key("wrong", "https://provider.test")
+        await cache.get(other, bad)
+        await cache.get(other, bad)
+        return cache.stats()
+
+    stats = asyncio.run(scenario())
+    assert calls == ["good", "good", "bad", "bad"]
+    assert stats["hits"] == 1 and stats["refreshes"] == 1
@@ -0,0 +1,108 @@
+import base64
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "src" / "backend"
+sys.path.append(str(BACKEND_PATH))
+
+import cli  # noqa: E402
+from nano_banana import ProviderConfig  # noqa: E402
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 64
+
+
+def provider_config(**overrides):
+    values = dict(
+        api_key="test-key",
+        base_url="https://example.invalid",
+        model="gemini-2.5-flash-image",
+        timeout=5,
+        use_mock=False,
+        placeholder_on_error=False,
+    )
+    return ProviderConfig(**{**values, **overrides})
+
+
+def write_lines(path: Path, *rows) -> None:
+    path.write_text("".join(json.dumps(row) + "\n" for row in rows))
+
+
+def test_read_items_expands_templates_from_jsonl_and_csv(tmp_path):
+    registry = cli.TemplateRegistry([str(ROOT / "config" / "templates.json")])
+    registry.load()
+    jsonl = tmp_path / "in.jsonl"
+    write_lines(
+        jsonl,
+        {"prompt": "a cat", "count": 2, "id": "cat"},
+        {"template": "product-poster", "variables": {"industry": "tea"}, "matrix": {"style": ["clean", "bold"]}},
+    )
+    items = list(cli.read_items(str(jsonl), registry))
+    assert [item.id for item in items][0] == "cat" and items[0].count == 2
+    assert len(items) == 3 and "bold" in items[2].prompt
+
+    table = tmp_path / "in.csv"
+    table.write_text("industry,style\ntea,clean\ncoffee,bold\n")
+    items = list(cli.read_items(str(table), registry, template_id="product-poster"))
+    assert [item.variables["industry"] for item in items] == ["tea", "coffee"]
+
+
+def test_run_streams_images_to_disk_and_resumes(monkeypatch, tmp_path):
+    calls = []
+
+    async def fake_fetch(provider_request, config, api_key):
+        prompt = provider_request.payload["contents"][0]["parts"][0]["text"]
+        calls.append(prompt)
+        if prompt == "broken":
+            raise RuntimeError("provider said no")
+        part = {"inlineData": {"mimeType": "image/png", "data": base64.b64encode(PNG).decode("ascii")}}
+        return json.dumps({"candidates": [{"content": {"parts": [part]}}]}).encode("ascii")
+
+    monkeypatch.setattr(cli, "fetch_provider_body", fake_fetch)
+    monkeypatch.setattr(cli, "DECODE_CHUNK", 64)
+    source = tmp_path / "prompts.jsonl"
+    write_lines(source, {"prompt": "one", "id": "one"}, {"prompt": "broken", "id": "broken"}, {"prompt": "one", "id": "one"})
+    out = tmp_path / "out"
+
+    runner = cli.BulkRunner(provider_config(), str(out), concurrency=2)
+    assert cli.asyncio.run(runner.run(cli.read_items(str(source)))) == 1
+    assert (out / "one-0.png").read_bytes() == PNG
+    assert (runner.completed, runner.failed, runner.skipped) == (1, 1, 1)
+
+    # A rerun only retries what did not finish.
+    runner = cli.BulkRunner(provider_config(), str(out), concurrency=2)
+    cli.asyncio.run(runner.run(cli.read_items(str(source))))
+    assert sorted(calls) == ["broken", "broken", "one"]
+    manifest = [json.loads(line) for line in (out / "manifest.jsonl").read_text().splitlines()]
+    assert [entry["status"] for entry in manifest if entry["id"] == "one"] == ["ok"]
+
+
+def test_mock_mode_writes_placeholders(tmp_path):
+    source = tmp_path / "prompts.csv"
+    source.write_text("prompt,count\nhello,2\n")
+    out = tmp_path / "out"
+    runner = cli.BulkRunner(provider_config(use_mock=True), str(out))
+    cli.asyncio.run(runner.run(cli.read_items(str(source))))
+    assert sorted(path.suffix for path in out.glob("*-?.svg")) == [".svg", ".svg"]
+
+
+def test_missing_api_key_is_an_error_not_placeholders(monkeypatch, tmp_path, capsys):
+    for name, value in (("GOOGLE_AI_STUDIO_API_KEY", ""), ("USE_MOCK", "false"), ("SERVER_ENV_FILE", "")):
+        monkeypatch.setenv(name, value)
+    monkeypatch.setattr(cli, "DEFAULT_ENV_FILE", str(tmp_path / "missing.env"))
+    monkeypatch.setattr(cli.nano_banana, "governor", cli.nano_banana.governor)
+    monkeypatch.setattr(cli.nano_banana, "breakers", cli.nano_banana.breakers)
+    source = tmp_path / "prompts.csv"
+    source.write_text("prompt\nhello\n")
+    out = tmp_path / "out"
+
+    assert cli.main([str(source), "--out", str(out)]) == 2
+    assert "GOOGLE_AI_STUDIO_API_KEY" in capsys.readouterr().err
+    assert not out.exists()
+
+    # The same settings file as the server can switch the run to placeholders.
+    env_file = tmp_path / "bulk.env"
+    env_file.write_text("USE_MOCK=true\n")
+    assert cli.main([str(source), "--out", str(out), "--env-file", str(env_file)]) == 0
+    assert len(list(out.glob("*-0.svg"))) == 1
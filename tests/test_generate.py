@@ -0,0 +1,193 @@
+import asyncio
+import base64
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "src" / "backend"
+sys.path.append(str(BACKEND_PATH))
+
+import app as proxy  # noqa: E402
+from blobstore import BlobStore  # noqa: E402
+from cache import ResultCache, SingleFlight  # noqa: E402
+
+
+client = TestClient(proxy.app)
+
+
+def fake_images(delays):
+    async def fake_generate_images_async(prompt, **kwargs):
+        await asyncio.sleep(delays.get(prompt, 0))
+        if prompt.startswith("fail"):
+            raise RuntimeError(f"provider rejected {prompt}")
+        return [{"index": 0, "type": "base64", "mime": "image/png", "data": prompt}]
+
+    return fake_generate_images_async
+
+
+def test_generate_fans_out_and_keeps_order(monkeypatch):
+    monkeypatch.setattr(proxy, "generate_images_async", fake_images({"slow": 0.05}))
+    monkeypatch.setattr(proxy.config, "placeholder_on_error", False)
+    response = client.post("/api/generate", json={"prompts": ["slow", "fail-1", "fast"]})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["prompt"] for result in results] == ["slow", "fail-1", "fast"]
+    assert results[0]["images"][0]["data"] == "slow"
+    assert results[1]["images"] == [] and "fail-1" in results[1]["error"]
+    assert results[2]["images"][0]["data"] == "fast"
+
+
+def test_generate_returns_502_when_every_prompt_fails(monkeypatch):
+    monkeypatch.setattr(proxy, "generate_images_async", fake_images({}))
+    monkeypatch.setattr(proxy.config, "placeholder_on_error", False)
+    response = client.post("/api/generate", json={"prompt": "fail-only"})
+    assert response.status_code == 502
+
+
+def test_generate_serves_repeats_from_result_cache(monkeypatch):
+    calls = []
+
+    async def counting(prompt, **kwargs):
+        calls.append(prompt)
+        return [{"index": 0, "type": "base64", "mime": "image/png", "data": prompt}]
+
+    monkeypatch.setattr(proxy, "generate_images_async", counting)
+    monkeypatch.setattr(proxy, "result_cache", ResultCache())
+    monkeypatch.setattr(proxy.config, "api_key", "test-key")
+    monkeypatch.setattr(proxy.config, "use_mock", False)
+
+    first = client.post("/api/generate", json={"prompt": "same"})
+    second = client.post("/api/generate", json={"prompt": "same"})
+    bypass = client.post("/api/generate", json={"prompt": "same"}, headers={"X-Cache": "bypass"})
+    other_key = client.post("/api/generate", json={"prompt": "same"}, headers={"X-API-Key": "revoked-key"})
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert bypass.headers["X-Cache"] == "BYPASS"
+    assert other_key.headers["X-Cache"] == "MISS"
+    assert second.json()["results"] == first.json()["results"]
+    assert calls == ["same", "same", "same"]
+
+
+def test_generate_coalesces_identical_in_flight_prompts(monkeypatch):
+    calls = []
+
+    async def slow(prompt, **kwargs):
+        calls.append(prompt)
+        await asyncio.sleep(0.05)
+        return [{"index": 0, "type": "base64", "mime": "image/png", "data": prompt}]
+
+    monkeypatch.setattr(proxy, "generate_images_async", slow)
+    monkeypatch.setattr(proxy, "single_flight", SingleFlight())
+    monkeypatch.setattr(proxy.config, "api_key", "test-key")
+    monkeypatch.setattr(proxy.config, "use_mock", False)
+
+    response = client.post("/api/generate", json={"prompts": ["twin", "twin", "twin", "solo"]})
+    assert response.status_code == 200
+    assert [result["images"][0]["data"] for result in response.json()["results"]] == ["twin", "twin", "twin", "solo"]
+    assert sorted(calls) == ["solo", "twin"]
+    assert proxy.single_flight.stats()["coalesced"] == 2
+
+
+def test_generate_streams_ndjson_in_completion_order(monkeypatch):
+    monkeypatch.setattr(proxy, "generate_images_async", fake_images({"slow": 0.05}))
+    monkeypatch.setattr(proxy.config, "placeholder_on_error", False)
+    response = client.post("/api/generate", json={"prompts": ["slow", "fast"], "stream": True})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [event.get("prompt") for event in events[:2]] == ["fast", "slow"]
+    assert [event["index"] for event in events[:2]] == [1, 0]
+    assert events[-1]["done"] is True and events[-1]["errors"] == 0
+
+
+def test_generate_streams_server_sent_events(monkeypatch):
+    monkeypatch.setattr(proxy, "generate_images_async", fake_images({}))
+    response = client.post("/api/generate", json={"prompt": "one"}, headers={"Accept": "text/event-stream"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.startswith("event: result\ndata: ")
+    assert "event: done" in response.text
+
+
+def test_generate_returns_blob_urls_served_with_etag_and_range(monkeypatch, tmp_path):
+    async def png(prompt, **kwargs):
+        return [{"index": 0, "type": "url", "mime": "image/png", "url": "data:image/png;base64,AAECAwQF"}]
+
+    monkeypatch.setattr(proxy, "generate_images_async", png)
+    monkeypatch.setattr(proxy, "blob_store", BlobStore(str(tmp_path)))
+    image = client.post("/api/generate", json={"prompt": "blob", "return_type": "url"}).json()["results"][0]["images"][0]
+    assert image["url"] == f"/api/images/{image['sha256']}"
+
+    full = client.get(image["url"])
+    assert full.content == bytes(range(6))
+    assert full.headers["content-type"] == "image/png"
+    assert "immutable" in full.headers["cache-control"]
+    partial = client.get(image["url"], headers={"Range": "bytes=2-3"})
+    assert partial.status_code == 206 and partial.content == bytes([2, 3])
+    cached = client.get(image["url"], headers={"If-None-Match": full.headers["etag"]})
+    assert cached.status_code == 304
+    assert client.get("/api/images/" + "0" * 64).status_code == 404
+
+
+def test_storage_failure_only_fails_its_own_prompt(monkeypatch, tmp_path):
+    class FlakyStore(BlobStore):
+        def store_images(self, images):
+            if images[0]["url"].endswith("AAAA"):
+                raise OSError("disk full")
+            return super().store_images(images)
+
+    async def png(prompt, **kwargs):
+        return [{"index": 0, "type": "url", "mime": "image/png", "url": f"data:image/png;base64,{prompt}"}]
+
+    monkeypatch.setattr(proxy, "generate_images_async", png)
+    monkeypatch.setattr(proxy, "blob_store", FlakyStore(str(tmp_path)))
+    response = client.post("/api/generate", json={"prompts": ["AAAA", "AQID"], "return_type": "url"})
+    assert response.status_code == 200
+    failed, stored = response.json()["results"]
+    assert failed["images"] == [] and "disk full" in failed["error"]
+    assert stored["images"][0]["url"].startswith("/api/images/")
+
+
+def test_blob_store_survives_concurrent_identical_writes_and_prunes(tmp_path):
+    store = BlobStore(str(tmp_path), max_bytes=10)
+    with ThreadPoolExecutor(8) as pool:
+        digests = set(pool.map(lambda _: store.put(b"same image", "image/png"), range(64)))
+    [digest] = digests
+    assert store.get(digest) == (b"same image", "image/png")
+    assert not list(tmp_path.glob("*/*.tmp"))
+
+    newer = store.put(b"newer", "image/png")
+    old_path = tmp_path / digest[:2] / digest
+    os.utime(old_path, (1, 1))
+    assert store.prune() == 1
+    assert store.get(digest) is None and store.get(newer) is not None
+
+
+def raw_images(monkeypatch):
+    async def png(prompt, **kwargs):
+        return [{"index": 0, "type": "base64", "mime": "image/png", "data": base64.b64encode(prompt.encode() * 400).decode()}]
+
+    monkeypatch.setattr(proxy, "generate_images_async", png)
+
+
+def test_generate_compresses_json_when_accepted(monkeypatch):
+    raw_images(monkeypatch)
+    response = client.post("/api/generate", json={"prompt": "zip"}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert base64.b64decode(response.json()["results"][0]["images"][0]["data"]) == b"zip" * 400
+
+
+def test_generate_multipart_carries_raw_image_parts(monkeypatch):
+    raw_images(monkeypatch)
+    response = client.post("/api/generate", json={"prompts": ["a", "b"]}, headers={"Accept": "multipart/mixed"})
+    boundary = response.headers["content-type"].split("boundary=")[1]
+    parts = response.content.split(f"--{boundary}".encode())[1:-1]
+    manifest = json.loads(parts[0].split(b"\r\n\r\n", 1)[1])
+    refs = [result["images"][0]["part"] for result in manifest["results"]]
+    assert refs == ["image-0", "image-1"]
+    headers, data = parts[2].split(b"\r\n\r\n", 1)
+    assert b"Content-ID: <image-1>" in headers and data == b"b" * 400 + b"\r\n"
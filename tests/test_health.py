@@ -8,6 +8,7 @@ BACKEND_PATH = ROOT / "src" / "backend"
 sys.path.append(str(BACKEND_PATH))
 
 from app import app  # noqa: E402
+from metrics import endpoint_labels  # noqa: E402
 
 
 client = TestClient(app)
@@ -18,3 +19,22 @@ def test_health():
     assert response.status_code == 200
     payload = response.json()
     assert payload["status"] == "ok"
+
+
+def test_metrics_exposes_route_histograms():
+    client.get("/api/health")
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert "# TYPE nano_http_request_duration_seconds histogram" in body
+    assert 'nano_http_request_duration_seconds_count{route="/api/health",method="GET",status="200"}' in body
+    assert 'le="+Inf"' in body
+
+
+def test_endpoint_labels_fold_client_chosen_models_into_other():
+    assert endpoint_labels("https://g.test/v1beta/models/imagen-4.0-fast-generate-001:predict") == {
+        "model": "imagen-4.0-fast-generate-001",
+        "style": "predict",
+    }
+    assert endpoint_labels("https://evil.test/models/random-1234:anything") == {"model": "other", "style": "other"}
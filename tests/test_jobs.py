@@ -0,0 +1,193 @@
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "src" / "backend"
+sys.path.append(str(BACKEND_PATH))
+
+import app as proxy  # noqa: E402
+from jobs import JobQueue, JobStore  # noqa: E402
+
+
+def wait_for(client, job_id, statuses, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job stuck in {job['status']}")
+
+
+def test_job_runs_batch_and_reports_results(monkeypatch, tmp_path):
+    seen_keys = []
+
+    async def fake(prompt, **kwargs):
+        seen_keys.append(kwargs["override_api_key"])
+        return [{"index": 0, "type": "base64", "mime": "image/png", "data": prompt}]
+
+    monkeypatch.setattr(proxy, "generate_images_async", fake)
+    monkeypatch.setattr(proxy, "job_queue", JobQueue(JobStore(str(tmp_path / "jobs.sqlite3"))))
+    with TestClient(proxy.app) as client:
+        created = client.post("/api/jobs", json={"prompts": ["a", "b", "c"]}, headers={"X-API-Key": "k"})
+        assert created.status_code == 202
+        job = wait_for(client, created.json()["job_id"], {"completed"})
+    assert job["completed"] == job["total"] == 3
+    assert [result["images"][0]["data"] for result in job["results"]] == ["a", "b", "c"]
+    assert seen_keys == ["k", "k", "k"]
+
+
+def test_job_can_be_cancelled(monkeypatch, tmp_path):
+    async def slow(prompt, **kwargs):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(proxy, "generate_images_async", slow)
+    monkeypatch.setattr(proxy, "job_queue", JobQueue(JobStore(str(tmp_path / "jobs.sqlite3"))))
+    with TestClient(proxy.app) as client:
+        job_id = client.post("/api/jobs", json={"prompt": "a"}).json()["job_id"]
+        wait_for(client, job_id, {"running"})
+        assert client.post(f"/api/jobs/{job_id}/cancel").json()["status"] == "cancelled"
+        assert client.get(f"/api/jobs/{job_id}").json()["status"] == "cancelled"
+        assert client.get("/api/jobs/unknown").status_code == 404
+
+
+def test_job_store_requeues_interrupted_jobs_and_keeps_results(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.create({"prompts": ["a", "b"]})
+    job = store.claim()
+    store.record_result(job.id, 0, {"prompt": "a", "images": []})
+    assert store.requeue_running() == 1
+    resumed = store.claim()
+    assert resumed.id == job_id
+    assert resumed.pending == [1]
+
+
+def test_stopping_queue_hands_running_job_back(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    queue = JobQueue(store, workers=1, requeue_on_start=False)
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def processor(job, record):
+            started.set()
+            await asyncio.sleep(10)
+
+        job_id = await queue.submit({"prompts": ["a"]}, {})
+        await queue.start(processor)
+        await asyncio.wait_for(started.wait(), timeout=5)
+        await queue.stop()
+        return job_id
+
+    job_id = asyncio.run(scenario())
+    assert store.get(job_id)["status"] == "queued"
+
+
+def test_job_with_client_key_never_runs_on_another_process(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    accepting, other, gone = (JobQueue(JobStore(path), workers=1, requeue_on_start=False) for _ in range(3))
+    seen = []
+
+    async def processor(job, record):
+        seen.append(job.secrets.get("api_key"))
+        await record(0, {"prompt": "a", "images": []})
+
+    async def until_status(job_id, status):
+        for _ in range(250):
+            if other.store.get(job_id)["status"] == status:
+                return
+            await asyncio.sleep(0.02)
+        raise AssertionError(f"job never reached {status}")
+
+    async def scenario():
+        await other.start(processor)
+        pinned = await accepting.submit({"prompts": ["a"]}, {"api_key": "client-key"})
+        shared = await accepting.submit({"prompts": ["a"]}, {"api_key": None})
+        lost = await gone.submit({"prompts": ["a"]}, {"api_key": "other-key"})
+        # The server-key job may run anywhere; the keyed one waits for its owner.
+        await until_status(shared, "completed")
+        assert seen == [None]
+        assert other.store.get(pinned)["status"] == "queued"
+        await accepting.start(processor)
+        await until_status(pinned, "completed")
+        # A process that stops takes its keys with it: its jobs fail, they do not move.
+        await gone.stop()
+        await accepting.stop()
+        await other.stop()
+        return lost
+
+    lost = asyncio.run(scenario())
+    assert seen == [None, "client-key"]
+    job = JobStore(path).get(lost)
+    assert job["status"] == "failed" and "API key" in job["error"]
+
+
+def test_job_results_are_paged_under_a_byte_budget(monkeypatch, tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.create({"prompts": ["a", "b", "c", "d"]})
+    for index in range(4):
+        store.record_result(job_id, index, {"prompt": "p", "images": [{"data": "x" * 1000}]})
+    monkeypatch.setattr(proxy, "job_queue", JobQueue(store))
+    monkeypatch.setattr(proxy, "request_memory_limit", 5000)
+    client = TestClient(proxy.app)
+
+    first = client.get(f"/api/jobs/{job_id}").json()
+    assert first["completed"] == 4
+    assert [result["index"] for result in first["results"]] == [0, 1]
+    rest = client.get(f"/api/jobs/{job_id}", params={"offset": first["next_offset"], "limit": 1}).json()
+    assert [result["index"] for result in rest["results"]] == [2] and rest["next_offset"] == 3
+    last = client.get(f"/api/jobs/{job_id}", params={"offset": 3}).json()
+    assert [result["index"] for result in last["results"]] == [3] and last["next_offset"] is None
+
+
+def test_expired_lease_is_reclaimed_but_heartbeat_keeps_it(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    store = JobStore(path, lease=0.2)
+    queue = JobQueue(store, workers=1, requeue_on_start=False)
+    rival = JobStore(path, lease=0.2)
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def processor(job, record):
+            started.set()
+            await asyncio.sleep(0.6)
+            await record(0, {"prompt": "a", "images": []})
+
+        job_id = await queue.submit({"prompts": ["a"]}, {})
+        await queue.start(processor)
+        await asyncio.wait_for(started.wait(), timeout=5)
+        # Three leases go by while the job runs; the heartbeat keeps renewing it.
+        for _ in range(6):
+            assert await asyncio.to_thread(rival.claim) is None
+            await asyncio.sleep(0.1)
+        await queue.stop()
+        return job_id
+
+    live = asyncio.run(scenario())
+    assert store.get(live)["status"] == "completed"
+
+    crashed = store.create({"prompts": ["a", "b"]})
+    store.claim()
+    store.record_result(crashed, 0, {"prompt": "a", "images": []})
+    assert rival.claim() is None
+    time.sleep(0.25)
+    reclaimed = rival.claim()
+    assert reclaimed.id == crashed and reclaimed.pending == [1]
+
+
+def test_finished_jobs_are_purged_after_retention(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), retention=0.05)
+    old = store.create({"prompts": ["a"]})
+    store.claim()
+    store.record_result(old, 0, {"prompt": "a", "images": []})
+    store.finish(old, "completed")
+    waiting = store.create({"prompts": ["b"]})
+    time.sleep(0.1)
+    assert store.purge() == 1
+    assert store.get(old) is None and store.get(waiting)["status"] == "queued"
+    assert store._conn.execute("SELECT COUNT(*) FROM job_results").fetchone() == (0,)
@@ -0,0 +1,262 @@
+import asyncio
+import base64
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "src" / "backend"
+sys.path.append(str(BACKEND_PATH))
+
+import nano_banana  # noqa: E402
+from breaker import BreakerRegistry, CircuitOpenError  # noqa: E402
+from governor import ProviderGovernor, parse_retry_after  # noqa: E402
+from nano_banana import ProviderConfig, generate_images_async  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_breakers(monkeypatch):
+    monkeypatch.setattr(nano_banana, "breakers", BreakerRegistry())
+
+
+def make_config(**overrides) -> ProviderConfig:
+    values = dict(
+        api_key="test-key",
+        base_url="https://provider.test/v1beta",
+        model="imagen-4.0-fast-generate-001",
+        timeout=5,
+        use_mock=False,
+        placeholder_on_error=False,
+    )
+    values.update(overrides)
+    return ProviderConfig(**values)
+
+
+def use_transport(monkeypatch, handler) -> None:
+    def factory(config, base_url=None):
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(nano_banana, "get_async_client", factory)
+
+
+def test_generate_images_async_predict(monkeypatch):
+    seen = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen["url"] = str(request.url)
+        return httpx.Response(200, json={"predictions": [{"bytesBase64Encoded": "QUJD", "mimeType": "image/png"}]})
+
+    use_transport(monkeypatch, handler)
+    images = asyncio.run(generate_images_async("a cat", None, 1, make_config(), size="1600x900"))
+    assert seen["url"].endswith("/models/imagen-4.0-fast-generate-001:predict")
+    assert images == [{"index": 0, "type": "base64", "mime": "image/png", "data": "QUJD"}]
+
+
+def test_blocking_generate_images_runs_the_async_path(monkeypatch):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) == 1:
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return httpx.Response(200, json={"predictions": [{"bytesBase64Encoded": "QUJD", "mimeType": "image/png"}]})
+
+    use_transport(monkeypatch, handler)
+    monkeypatch.setattr(nano_banana, "governor", ProviderGovernor(max_retries=1, base_delay=0))
+    images = nano_banana.generate_images("a cat", None, 1, make_config())
+    assert len(calls) == 2 and images[0]["data"] == "QUJD"
+    nano_banana.close_blocking_clients()
+
+
+def test_generate_images_async_generate_content_url(monkeypatch):
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = {"candidates": [{"content": {"parts": [{"inlineData": {"data": "QUJD", "mimeType": "image/jpeg"}}]}}]}
+        return httpx.Response(200, json=body)
+
+    use_transport(monkeypatch, handler)
+    config = make_config(model="gemini-2.5-flash-image")
+    images = asyncio.run(generate_images_async("a cat", None, 1, config, return_type="url"))
+    assert images[0]["url"] == "data:image/jpeg;base64,QUJD"
+
+
+def test_generate_images_async_raises_on_provider_error(monkeypatch):
+    monkeypatch.setattr(nano_banana, "governor", ProviderGovernor(max_retries=0))
+    use_transport(monkeypatch, lambda request: httpx.Response(503))
+    try:
+        asyncio.run(generate_images_async("a cat", None, 1, make_config()))
+    except httpx.HTTPStatusError as exc:
+        assert exc.response.status_code == 503
+    else:
+        raise AssertionError("expected provider error")
+
+
+def test_async_clients_are_pooled_per_origin():
+    async def scenario():
+        config = make_config()
+        first = nano_banana.get_async_client(config, "https://provider.test/v1beta/models/a:predict")
+        again = nano_banana.get_async_client(config, "https://provider.test/v1beta/models")
+        other = nano_banana.get_async_client(config, "https://proxy.example/v1beta")
+        stats = nano_banana.pool_stats()
+        await nano_banana.close_async_clients()
+        return first, again, other, stats
+
+    first, again, other, stats = asyncio.run(scenario())
+    assert first is again
+    assert first is not other
+    origins = {entry["origin"] for entry in stats if entry["kind"] == "async"}
+    assert {"https://provider.test", "https://proxy.example"} <= origins
+
+
+def test_override_pools_are_bounded_and_evicted_clients_closed():
+    async def scenario():
+        config = make_config(max_pools=2, timeout=0)
+        configured = nano_banana.get_async_client(config)
+        overrides = [nano_banana.get_async_client(config, f"https://proxy-{index}.example") for index in range(3)]
+        await asyncio.sleep(0.01)
+        origins = sorted(entry["origin"] for entry in nano_banana.pool_stats())
+        closed = [client.is_closed for client in overrides]
+        await nano_banana.close_async_clients()
+        return configured, origins, closed
+
+    configured, origins, closed = asyncio.run(scenario())
+    assert origins == ["https://provider.test", "https://proxy-2.example"]
+    assert closed == [True, True, False]
+    assert configured.is_closed
+
+
+def test_iter_inline_images_slices_large_payloads_without_copying():
+    big = "QUJD" * 200
+    body = (
+        '{"predictions": [{"bytesBase64Encoded": "%s", "mimeType": "image/webp"},'
+        ' {"image": {"bytesBase64Encoded": "QUJD"}}, {"raiFilteredReason": "blocked"}]}' % big
+    ).encode("ascii")
+    provider_request = nano_banana.build_provider_request("a cat", None, 3, make_config(), "test-key")
+    images = list(nano_banana.iter_inline_images(body, provider_request))
+    assert [(index, mime) for index, mime, _ in images] == [(0, "image/webp"), (1, "image/png")]
+    assert images[0][2].obj is body
+    assert str(images[0][2], "ascii") == big
+    assert str(images[1][2], "ascii") == "QUJD"
+
+
+def test_iter_inline_images_unescapes_escaped_payloads():
+    escaped = "ab\\/cd" * 100
+    body = ('{"generatedImages": [{"bytesBase64Encoded": "%s"}]}' % escaped).encode("ascii")
+    provider_request = nano_banana.build_provider_request("a cat", None, 1, make_config(model="custom"), "test-key")
+    [(index, mime, payload)] = list(nano_banana.iter_inline_images(body, provider_request))
+    assert str(payload, "ascii") == "ab/cd" * 100
+
+
+def test_placeholder_images_share_one_cached_render():
+    images = nano_banana.placeholder_images("a <cat>", 3, "base64", size="1600x900")
+    assert [image["index"] for image in images] == [0, 1, 2]
+    assert images[0]["data"] is images[2]["data"]
+    again = nano_banana.placeholder_images("a <cat>", 1, "base64", size="1600x900")
+    assert again[0]["data"] is images[0]["data"]
+    svg = base64.b64decode(images[0]["data"]).decode("utf-8")
+    assert 'width="1600" height="900"' in svg
+    assert "a &lt;cat&gt;" in svg
+
+
+def test_generate_images_async_retries_throttling_and_backs_off(monkeypatch):
+    governor = ProviderGovernor(max_retries=2, base_delay=0, initial_limit=8)
+    monkeypatch.setattr(nano_banana, "governor", governor)
+    replies = [
+        httpx.Response(429, headers={"Retry-After": "0"}),
+        httpx.Response(503),
+        httpx.Response(200, json={"predictions": [{"bytesBase64Encoded": "QUJD"}]}),
+    ]
+    use_transport(monkeypatch, lambda request: replies.pop(0))
+    images = asyncio.run(generate_images_async("a cat", None, 1, make_config()))
+    assert images[0]["data"] == "QUJD"
+    assert governor.retries == 2
+    [limiter] = governor.stats()["limiters"].values()
+    assert limiter["throttled"] == 2
+    assert limiter["limit"] < 8
+
+
+def test_retry_after_longer_than_budget_fails_fast(monkeypatch):
+    monkeypatch.setattr(nano_banana, "governor", ProviderGovernor(max_retries=3, max_delay=1))
+    use_transport(monkeypatch, lambda request: httpx.Response(429, headers={"Retry-After": "120"}))
+    try:
+        asyncio.run(generate_images_async("a cat", None, 1, make_config()))
+    except httpx.HTTPStatusError as exc:
+        assert exc.response.status_code == 429
+    else:
+        raise AssertionError("expected throttling error")
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+def test_cancelled_calls_release_their_governor_slot():
+    governor = ProviderGovernor(initial_limit=2, max_limit=2)
+    endpoint = "https://provider.test/v1beta/models/m:predict"
+
+    async def hang() -> httpx.Response:
+        await asyncio.sleep(60)
+
+    async def reply() -> httpx.Response:
+        return httpx.Response(200)
+
+    async def scenario():
+        calls = [asyncio.ensure_future(governor.call(endpoint, "k", hang)) for _ in range(3)]
+        await asyncio.sleep(0)
+        for task in calls:
+            task.cancel()
+        await asyncio.gather(*calls, return_exceptions=True)
+        limiter = governor.limiter_for(endpoint, "k")
+        assert (limiter.in_flight, len(limiter._waiters)) == (0, 0)
+        response = await asyncio.wait_for(governor.call(endpoint, "k", reply), 1)
+        assert response.status_code == 200
+
+    asyncio.run(scenario())
+
+
+def test_governor_keeps_a_bounded_number_of_idle_limiters():
+    governor = ProviderGovernor(max_limiters=2)
+    endpoint = "https://provider.test/v1beta/models/m:predict"
+    busy = governor.limiter_for(endpoint, "busy")
+    busy.in_flight = 1
+    for index in range(5):
+        governor.limiter_for(endpoint, f"key-{index}")
+    assert len(governor.stats()["limiters"]) == 2
+    assert governor.limiter_for(endpoint, "busy") is busy
+
+
+def test_circuit_opens_fails_fast_and_recovers_through_probe(monkeypatch):
+    registry = BreakerRegistry(failure_threshold=2, recovery_timeout=0.05)
+    monkeypatch.setattr(nano_banana, "breakers", registry)
+    monkeypatch.setattr(nano_banana, "governor", ProviderGovernor(max_retries=0))
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) <= 2:
+            return httpx.Response(500)
+        return httpx.Response(200, json={"predictions": [{"bytesBase64Encoded": "QUJD"}]})
+
+    use_transport(monkeypatch, handler)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(httpx.HTTPStatusError):
+                await generate_images_async("a cat", None, 1, make_config())
+        with pytest.raises(CircuitOpenError):
+            await generate_images_async("a cat", None, 1, make_config())
+        await asyncio.sleep(0.06)
+        return await generate_images_async("a cat", None, 1, make_config())
+
+    images = asyncio.run(scenario())
+    assert images[0]["data"] == "QUJD"
+    assert len(calls) == 3
+    [state] = registry.stats().values()
+    assert state["state"] == "closed" and state["rejected"] == 1
+
+
+def test_breaker_registry_evicts_closed_breakers_beyond_its_cap():
+    registry = BreakerRegistry(failure_threshold=1, max_breakers=2)
+    registry.get("https://down.test/models/m:predict").on_failure()
+    for index in range(4):
+        registry.get(f"https://proxy-{index}.test/models/m:predict")
+    assert set(registry.stats()) == {"https://down.test/models/m:predict", "https://proxy-3.test/models/m:predict"}
+    assert registry.get("https://down.test/models/m:predict").state == "open"
@@ -0,0 +1,107 @@
+import asyncio
+import base64
+import io
+import sys
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "src" / "backend"
+sys.path.append(str(BACKEND_PATH))
+
+import app as proxy  # noqa: E402
+from cache import ResultCache  # noqa: E402
+from postprocess import ImageProcessor, make_options, process_image  # noqa: E402
+
+
+client = TestClient(proxy.app)
+
+
+def png_b64(width: int, height: int) -> str:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 40)).save(buffer, "PNG")
+    return base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def decoded_size(b64: str):
+    from PIL import Image
+
+    return Image.open(io.BytesIO(base64.b64decode(b64))).size
+
+
+def test_make_options_validates_input():
+    assert not make_options("1600x900", False, None, None, None).active
+    options = make_options("1600x900", True, "JPG", 120, 5)
+    assert (options.width, options.height, options.format, options.quality, options.thumbnail) == (1600, 900, "jpeg", 100, 16)
+    with pytest.raises(ValueError):
+        make_options(None, False, "gif", None, None)
+    with pytest.raises(ValueError):
+        make_options("wide", True, None, None, None)
+
+
+def test_generate_rejects_unknown_format():
+    response = client.post("/api/generate", json={"prompt": "x", "format": "bmp"})
+    assert response.status_code == 400
+
+
+def test_generate_refuses_processing_without_pillow(monkeypatch):
+    monkeypatch.setattr(ImageProcessor, "available", property(lambda self: False))
+    response = client.post("/api/generate", json={"prompt": "x", "format": "webp"})
+    assert response.status_code == 501
+    assert client.post("/api/generate", json={"prompt": "x"}).status_code == 200
+
+
+def test_process_image_resizes_transcodes_and_thumbnails():
+    pytest.importorskip("PIL")
+    data, mime, thumb = process_image(png_b64(400, 300), "image/png", make_options("160x90", True, "webp", 70, 32))
+    assert mime == "image/webp"
+    assert decoded_size(data) == (160, 90)
+    assert thumb[1] == "image/webp" and decoded_size(thumb[0]) == (32, 18)
+
+
+def test_processor_runs_in_pool_and_caches_variants():
+    pytest.importorskip("PIL")
+    processor = ImageProcessor(workers=1, cache=ResultCache())
+    images = [
+        {"index": 0, "type": "url", "mime": "image/png", "url": f"data:image/png;base64,{png_b64(64, 64)}"},
+        {"index": 1, "type": "base64", "mime": "image/svg+xml", "data": "PHN2Zy8+"},
+    ]
+    options = make_options(None, False, "jpeg", None, None)
+    try:
+        first = asyncio.run(processor.process(images, options))
+        again = asyncio.run(processor.process(images, options))
+    finally:
+        processor.shutdown()
+    assert first[0]["mime"] == "image/jpeg" and first[0]["url"].startswith("data:image/jpeg;base64,")
+    assert first[1] is images[1]
+    assert again[0] == first[0]
+    assert processor.processed == 1
+
+
+class BrokenPool:
+    shut_down = False
+
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("a worker died")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+def test_processor_rebuilds_a_broken_pool_and_retries():
+    pytest.importorskip("PIL")
+    processor = ImageProcessor(workers=1)
+    broken = processor._executor = BrokenPool()
+    images = [{"index": 0, "type": "base64", "mime": "image/png", "data": png_b64(8, 8)}]
+    try:
+        [result] = asyncio.run(processor.process(images, make_options(None, False, "jpeg", None, None)))
+    finally:
+        processor.shutdown()
+    assert broken.shut_down
+    assert result["mime"] == "image/jpeg"
+    assert (processor.processed, processor.failed) == (1, 0)
@@ -0,0 +1,91 @@
+import asyncio
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "src" / "backend"
+sys.path.append(str(BACKEND_PATH))
+
+import app as proxy  # noqa: E402
+from prefetch import CountMinSketch, Prefetcher  # noqa: E402
+
+
+client = TestClient(proxy.app)
+
+
+def test_count_min_sketch_never_undercounts_and_decays():
+    sketch = CountMinSketch(width=64, depth=3)
+    for key, times in (("popular", 40), ("rare", 2)):
+        for _ in range(times):
+            sketch.add(key)
+    for index in range(200):
+        sketch.add(f"noise-{index}")
+    assert sketch.estimate("popular") >= 40
+    assert sketch.estimate("rare") >= 2
+    sketch.decay()
+    assert 20 <= sketch.estimate("popular") < 40
+
+
+def test_prefetcher_tracks_top_keys_and_respects_idle_and_budget():
+    prefetcher = Prefetcher(top_k=2, min_hits=2, budget_per_hour=4)
+    for key, times in (("a", 5), ("b", 3), ("c", 1)):
+        for _ in range(times):
+            prefetcher.record(key, {"prompt": key}, cost=2)
+    assert prefetcher.stats()["tracked"] == 2
+    filled = []
+
+    async def fill(spec):
+        filled.append(spec["prompt"])
+        return [{"index": 0, "type": "base64", "mime": "image/png", "data": spec["prompt"]}]
+
+    async def scenario():
+        assert not await prefetcher.step(fill, lambda: False)
+        assert await prefetcher.step(fill, lambda: True)
+        assert await prefetcher.step(fill, lambda: True)
+        # Both pools are full and the budget of four images is spent.
+        prefetcher.take("a")
+        assert not await prefetcher.step(fill, lambda: True)
+
+    asyncio.run(scenario())
+    assert filled == ["a", "b"]
+    assert prefetcher.take("a") is None
+    assert prefetcher.take("b")[0]["data"] == "b"
+
+
+def test_variation_reuse_serves_the_same_result_repeatedly():
+    prefetcher = Prefetcher(min_hits=1, allow_reuse=True)
+    prefetcher.record("k", {})
+
+    async def fill(spec):
+        return [{"index": 0, "type": "base64", "mime": "image/png", "data": "x"}]
+
+    asyncio.run(prefetcher.step(fill, lambda: True))
+    assert prefetcher.take("k") == prefetcher.take("k") is not None
+
+
+def test_generate_serves_prefetched_result_without_provider_call(monkeypatch):
+    calls = []
+
+    async def fake(prompt, **kwargs):
+        calls.append(prompt)
+        return [{"index": 0, "type": "base64", "mime": "image/png", "data": f"{prompt}-{len(calls)}"}]
+
+    prefetcher = Prefetcher(min_hits=2)
+    monkeypatch.setattr(proxy, "generate_images_async", fake)
+    monkeypatch.setattr(proxy, "prefetcher", prefetcher)
+    monkeypatch.setattr(proxy.config, "api_key", "test-key")
+    monkeypatch.setattr(proxy.config, "use_mock", False)
+
+    for _ in range(2):
+        client.post("/api/generate", json={"prompt": "popular"})
+    assert asyncio.run(prefetcher.step(proxy._prefetch, lambda: True))
+    assert len(calls) == 3
+
+    response = client.post("/api/generate", json={"prompt": "popular"})
+    assert response.json()["results"][0]["images"][0]["data"] == "popular-3"
+    assert len(calls) == 3
+    # The pooled result was handed out once; the next request generates again.
+    client.post("/api/generate", json={"prompt": "popular"})
+    assert len(calls) == 4
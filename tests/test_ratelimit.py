@@ -0,0 +1,76 @@
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "src" / "backend"
+sys.path.append(str(BACKEND_PATH))
+
+import app as proxy  # noqa: E402
+from ratelimit import _REDIS_GCRA, RateLimiter, SQLiteRateLimiter, _gcra, load_rate_limits  # noqa: E402
+
+
+def test_gcra_allows_burst_then_refills():
+    tat = None
+    for _ in range(3):
+        decision, tat = _gcra(tat, 100.0, 3)
+        assert decision.allowed
+    decision, tat = _gcra(tat, 100.0, 3)
+    assert not decision.allowed
+    assert decision.retry_after == 20.0
+    decision, _ = _gcra(tat, 120.0, 3)
+    assert decision.allowed
+
+
+def test_gcra_admits_idle_key_at_burst_boundary():
+    # (now + 60) - 1 * 60 rounds to just above now, which used to reject this request.
+    now, per_minute = 0.1, 1
+    assert (now + 60.0) - per_minute * 60.0 > now
+    decision, tat = _gcra(None, now, per_minute)
+    assert decision.allowed and tat == now + 60.0
+    assert not _gcra(tat, now, per_minute)[0].allowed
+    assert "tat - (burst - 1) * interval" in _REDIS_GCRA
+
+
+def test_memory_limiter_evicts_idle_and_excess_keys():
+    limiter = RateLimiter(max_keys=2)
+    for key in ("a", "b", "c"):
+        limiter.check(key, 60)
+    assert len(limiter) == 2
+
+
+def test_sqlite_limiter_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "limits.sqlite3")
+    first, second = SQLiteRateLimiter(path), SQLiteRateLimiter(path)
+    assert first.allow("ip:1", 2)
+    assert second.allow("ip:1", 2)
+    assert not first.allow("ip:1", 2)
+    assert first._conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+
+
+def test_middleware_limits_per_api_key_with_retry_after(monkeypatch):
+    monkeypatch.setattr(proxy, "limiter", RateLimiter())
+    monkeypatch.setattr(proxy, "key_rate_limit", 1)
+    client = TestClient(proxy.app)
+    assert client.get("/api/health", headers={"X-API-Key": "k1"}).status_code == 200
+    limited = client.get("/api/health", headers={"X-API-Key": "k1"})
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+    assert client.get("/api/health", headers={"X-API-Key": "k2"}).status_code == 200
+
+
+def test_zero_rate_limit_is_off_and_negative_is_rejected(monkeypatch):
+    monkeypatch.setenv("RATE_LIMIT_PER_MIN", "0")
+    monkeypatch.delenv("RATE_LIMIT_PER_KEY_PER_MIN", raising=False)
+    assert load_rate_limits() == (0, 0)
+    monkeypatch.setenv("RATE_LIMIT_PER_KEY_PER_MIN", "-1")
+    with pytest.raises(ValueError, match="RATE_LIMIT_PER_KEY_PER_MIN"):
+        load_rate_limits()
+
+    monkeypatch.setattr(proxy, "limiter", RateLimiter())
+    monkeypatch.setattr(proxy, "rate_limit", 0)
+    monkeypatch.setattr(proxy, "key_rate_limit", 0)
+    client = TestClient(proxy.app)
+    assert all(client.get("/api/health", headers={"X-API-Key": "k"}).status_code == 200 for _ in range(3))
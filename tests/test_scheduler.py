@@ -0,0 +1,120 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "src" / "backend"
+sys.path.append(str(BACKEND_PATH))
+
+import app as proxy  # noqa: E402
+from metrics import scheduler_queued  # noqa: E402
+from scheduler import BULK, INTERACTIVE, FairScheduler, QueueFull  # noqa: E402
+
+
+def run_order(scheduler, requests):
+    """Queue ``requests`` behind one held slot and return the order they are granted in."""
+    order = []
+
+    async def scenario():
+        await scheduler.acquire("holder", INTERACTIVE)
+
+        async def call(name, client, priority, cost):
+            async with scheduler.slot(client, priority, cost):
+                order.append(name)
+
+        tasks = [asyncio.ensure_future(call(*request)) for request in requests]
+        await asyncio.sleep(0)
+        scheduler.release(INTERACTIVE)
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    return order
+
+
+def test_interactive_calls_overtake_queued_bulk():
+    order = run_order(
+        FairScheduler(capacity=1),
+        [("b1", "batch", BULK, 8), ("b2", "batch", BULK, 8), ("i1", "user", INTERACTIVE, 1)],
+    )
+    assert order == ["i1", "b1", "b2"]
+
+
+def test_clients_share_slots_by_images_requested():
+    requests = [(f"big{n}", "big", BULK, 8) for n in range(3)] + [(f"small{n}", "small", BULK, 1) for n in range(16)]
+    order = run_order(FairScheduler(capacity=1, quantum=8), requests)
+    # Each round the big client spends its 8 credits on one call, the small client on eight.
+    assert order[:10] == ["big0"] + [f"small{n}" for n in range(8)] + ["big1"]
+
+
+def test_bulk_never_takes_every_slot():
+    scheduler = FairScheduler(capacity=4, bulk_share=0.5)
+
+    async def scenario():
+        for _ in range(2):
+            await scheduler.acquire("batch", BULK)
+        waiting = asyncio.ensure_future(scheduler.acquire("batch", BULK))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        await asyncio.wait_for(scheduler.acquire("user", INTERACTIVE), timeout=1)
+        waiting.cancel()
+
+    asyncio.run(scenario())
+    assert scheduler.stats()["classes"][BULK]["queued"] == 0
+
+
+def test_cancel_racing_dispatch_keeps_gauge_and_slots_consistent():
+    scheduler = FairScheduler(capacity=1)
+    queued_before = scheduler_queued.value(priority=INTERACTIVE)
+
+    async def scenario():
+        await scheduler.acquire("holder", INTERACTIVE)
+        abandoned = asyncio.ensure_future(scheduler.acquire("a", INTERACTIVE))
+        granted = asyncio.ensure_future(scheduler.acquire("b", INTERACTIVE))
+        await asyncio.sleep(0)
+        # Cancelled, then popped by _dispatch before its except block runs.
+        abandoned.cancel()
+        scheduler.release(INTERACTIVE)
+        # Granted, then cancelled before it could use the slot.
+        granted.cancel()
+        await asyncio.gather(abandoned, granted, return_exceptions=True)
+        await asyncio.wait_for(scheduler.acquire("c", INTERACTIVE), timeout=1)
+
+    asyncio.run(scenario())
+    assert scheduler_queued.value(priority=INTERACTIVE) == queued_before
+    assert scheduler.stats()["classes"][INTERACTIVE]["in_flight"] == 1
+
+
+def test_admit_rejects_when_client_queue_is_full():
+    scheduler = FairScheduler(capacity=1, max_queued_per_client=2)
+
+    async def scenario():
+        await scheduler.acquire("holder", BULK)
+        waiters = [asyncio.ensure_future(scheduler.acquire("batch", BULK)) for _ in range(2)]
+        await asyncio.sleep(0)
+        scheduler.admit("other", BULK, 2)
+        with pytest.raises(QueueFull) as excinfo:
+            scheduler.admit("batch", BULK, 1)
+        for waiter in waiters:
+            waiter.cancel()
+        return excinfo.value
+
+    error = asyncio.run(scenario())
+    assert error.limit == "client" and error.retry_after >= 1
+
+
+def test_generate_returns_503_with_retry_after_when_queue_is_full(monkeypatch):
+    monkeypatch.setattr(proxy, "scheduler", FairScheduler(capacity=1, max_queued=0))
+    response = TestClient(proxy.app).post("/api/generate", json={"prompt": "x"}, headers={"X-Priority": "bulk"})
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+
+
+def test_large_requests_default_to_bulk():
+    assert proxy._priority(None, None, 1) == INTERACTIVE
+    assert proxy._priority(None, None, 64) == BULK
+    assert proxy._priority(None, "bulk", 1) == BULK
+    # Declaring a large request interactive must not bypass the bulk lane.
+    assert proxy._priority("interactive", None, 64) == BULK
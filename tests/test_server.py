@@ -0,0 +1,61 @@
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "src" / "backend"
+sys.path.append(str(BACKEND_PATH))
+
+from jobs import JobStore  # noqa: E402
+from server import Supervisor, shared_state_env, worker_env  # noqa: E402
+
+
+def test_single_worker_keeps_in_process_state():
+    updates = shared_state_env({}, workers=1)
+    assert updates == {"WARM_STARTUP": "true", "JOB_REQUEUE_ON_START": "false"}
+
+
+def test_multiple_workers_share_rate_limits_and_cache():
+    updates = shared_state_env({"RATE_LIMIT_BACKEND": "memory", "RESULT_CACHE_ENABLED": "true"}, workers=4)
+    assert updates["RATE_LIMIT_BACKEND"] == "sqlite"
+    assert updates["RESULT_CACHE_DIR"] == "/tmp/nano-result-cache"
+
+
+def test_explicit_settings_win():
+    env = {"RATE_LIMIT_BACKEND": "redis", "RESULT_CACHE_ENABLED": "true", "RESULT_CACHE_DIR": "/data", "WARM_STARTUP": "false"}
+    updates = shared_state_env(env, workers=4)
+    assert "RATE_LIMIT_BACKEND" not in updates and "RESULT_CACHE_DIR" not in updates
+    assert updates["WARM_STARTUP"] == "false"
+
+
+def test_only_the_first_worker_prefetches():
+    assert worker_env(0) == {}
+    assert all(worker_env(index) == {"PREFETCH_ENABLED": "false"} for index in (1, 2, 7))
+
+
+class FakeProcess:
+    def __init__(self, pid, alive):
+        self.pid = pid
+        self.exitcode = None if alive else -9
+        self.alive = alive
+
+    def is_alive(self):
+        return self.alive
+
+
+def test_reaping_a_dead_worker_fails_its_pinned_jobs(monkeypatch, tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    monkeypatch.setenv("JOB_DB_PATH", path)
+    store = JobStore(path)
+    orphaned = store.create({"prompts": ["a"]}, owner="dead-owner")
+    kept = store.create({"prompts": ["b"]}, owner="live-owner")
+    shared = store.create({"prompts": ["c"]})
+
+    supervisor = Supervisor("127.0.0.1", 0, workers=2)
+    supervisor._processes = [FakeProcess(1, alive=False), FakeProcess(2, alive=True)]
+    supervisor._owners = {1: "dead-owner", 2: "live-owner"}
+    monkeypatch.setattr(supervisor, "_spawn", lambda index: FakeProcess(3, alive=True))
+    supervisor._reap()
+
+    assert [process.pid for process in supervisor._processes] == [3, 2]
+    assert store.get(orphaned)["status"] == "failed"
+    assert store.get(kept)["status"] == store.get(shared)["status"] == "queued"
@@ -0,0 +1,85 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+
+ROOT = Path(__file__).resolve().parents[1]
+BACKEND_PATH = ROOT / "src" / "backend"
+sys.path.append(str(BACKEND_PATH))
+
+import app as proxy  # noqa: E402
+from templates import CompiledTemplate, TemplateRegistry, expand_matrix  # noqa: E402
+
+
+client = TestClient(proxy.app)
+
+
+def write_templates(path: Path, *templates) -> None:
+    path.write_text(json.dumps({"templates": list(templates)}))
+
+
+def test_compiled_template_matches_browser_expansion():
+    compiled = CompiledTemplate("A {style} poster for {industry}, {unknown} kept. ")
+    assert compiled.render({"style": "bold"}) == "A bold poster for , {unknown} kept."
+    registry = TemplateRegistry([str(ROOT / "config" / "templates.json")])
+    registry.load()
+    prompt, negative = registry.get("product-poster").expand(
+        {"style": "clean", "industry": "tea", "selling": "organic", "size": "1080x1350", "forbidden": "text"}
+    )
+    assert prompt.startswith("Design a clean product poster for tea. Emphasize organic.")
+    # {language} is empty and "Size 1080x1350" is already in the prompt, so no tail is added.
+    assert "\n" not in prompt
+    assert negative == "text, text"
+
+
+def test_registry_merges_packs_and_reloads_on_change(tmp_path):
+    main, packs = tmp_path / "templates.json", tmp_path / "packs"
+    packs.mkdir()
+    write_templates(main, {"id": "a", "prompt": "{style} A"}, {"id": "b", "prompt": "B"})
+    write_templates(packs / "pack.json", {"id": "b", "prompt": "pack B"})
+    registry = TemplateRegistry([str(main), str(packs)], check_interval=0)
+    assert registry.load() == 2
+    assert registry.get("b").prompt.source == "pack B"
+
+    write_templates(main, {"id": "a", "prompt": "{style} A2"})
+    os.utime(main, (1, 1))
+    assert registry.get("a").prompt.source == "{style} A2"
+    main.write_text("{broken")
+    os.utime(main, (2, 2))
+    assert registry.get("a").prompt.source == "{style} A2"
+
+
+def test_expand_matrix_is_cartesian_in_key_order():
+    combos = list(expand_matrix({"industry": "tea"}, {"style": ["x", "y"], "audience": ["1", "2"]}))
+    assert [(c["style"], c["audience"]) for c in combos] == [("x", "1"), ("x", "2"), ("y", "1"), ("y", "2")]
+    assert all(c["industry"] == "tea" for c in combos)
+
+
+def test_template_generate_dedupes_identical_expansions(monkeypatch, tmp_path):
+    calls = []
+
+    async def fake(prompt, **kwargs):
+        calls.append((prompt, kwargs["negative_prompt"], kwargs["size"]))
+        return [{"index": 0, "type": "base64", "mime": "image/png", "data": prompt}]
+
+    main = tmp_path / "templates.json"
+    write_templates(main, {"id": "t", "name": "T", "prompt": "{style} for {industry}", "negative": "{forbidden}"})
+    registry = TemplateRegistry([str(main)])
+    registry.load()
+    monkeypatch.setattr(proxy, "template_registry", registry)
+    monkeypatch.setattr(proxy, "generate_images_async", fake)
+
+    body = {"variables": {"industry": "tea", "forbidden": "logos"}, "matrix": {"style": ["a", "b"], "audience": ["x", "y"]}}
+    response = client.post("/api/templates/t/generate", json=body)
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["index"] for result in results] == [0, 1, 2, 3]
+    assert [result["images"][0]["data"] for result in results] == ["a for tea", "a for tea", "b for tea", "b for tea"]
+    # {audience} is not in the template, so the four expansions are two prompts.
+    assert sorted(calls) == [("a for tea", "logos, logos", None), ("b for tea", "logos, logos", None)]
+
+    monkeypatch.setattr(proxy, "template_max_expansions", 3)
+    assert client.post("/api/templates/t/generate", json=body).status_code == 400
+    assert client.post("/api/templates/missing/generate", json=body).status_code == 404